@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+
+def _user_cache_key(user_id):
+    return f'jwt-user:{user_id}'
+
+
+def _user_flags(user_id):
+    return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values('is_active')
+
+
+def _status(user):
+    return (False, False) if user is None else (True, user['is_active'])
+
+
+def get_user_status(user_id):
+    """
+    ``(exists, is_active)`` of a user, cached for JWT_USER_CACHE_TTL seconds.
+    Only these two flags go to the shared cache, never the user row.
+    """
+    key = _user_cache_key(user_id)
+    status = cache.get(key)
+    if status is None:
+        status = _status(_user_flags(user_id).first())
+        cache.set(key, status, settings.JWT_USER_CACHE_TTL)
+    return tuple(status)
+
+
+async def aget_user_status(user_id):
+    key = _user_cache_key(user_id)
+    status = await cache.aget(key)
+    if status is None:
+        status = _status(await _user_flags(user_id).afirst())
+        await cache.aset(key, status, settings.JWT_USER_CACHE_TTL)
+    return tuple(status)
+
+
+def _check_user(status):
+    exists, is_active = status
+    if not exists:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+
+class TokenUserAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication for read endpoints that only need the user id.
+
+    ``request.user`` is a ``TokenUser`` built from the token claims, so views
+    must filter on ``user_id`` rather than on the user instance. Token
+    validation is unchanged: the blacklist only ever applied to refresh
+    tokens, which are still checked by the refresh and logout endpoints.
+    With ``JWT_USER_CACHE_TTL`` set, deleted and inactive users are still
+    rejected, using their cached status instead of a query per request.
+    """
+
+    def get_user(self, validated_token):
+        token_user = super().get_user(validated_token)
+        if settings.JWT_USER_CACHE_TTL:
+            _check_user(get_user_status(token_user.id))
+        return token_user
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views, on a plain Django request"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        token_user = super().get_user(validated_token)
+        if settings.JWT_USER_CACHE_TTL:
+            _check_user(await aget_user_status(token_user.id))
+        return token_user, validated_token
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    cache.delete(_user_cache_key(instance.pk))
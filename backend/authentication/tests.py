@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from datasets.models import Dataset
+from insights.models import Insight
+from predictions.models import Prediction
+from users.models import User
+
+from .authentication import TokenUserAuthentication, _user_cache_key, get_user_status
+
+
+class TokenUserAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner, self.other = [
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name, first_name=name, last_name='X', password='secret-pass',
+            )
+            for name in ('owner', 'other')
+        ]
+        self.predictions, self.insights = {}, {}
+        for user in (self.owner, self.other):
+            dataset = Dataset.objects.create(user=user, file='data.csv')
+            self.predictions[user] = Prediction.objects.create(
+                dataset=dataset, product_id='L1', prediction='Normal', confidence=0.1, features={},
+            )
+            self.insights[user] = Insight.objects.create(dataset=dataset, recommendation='ok')
+
+    def get(self, url, user):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_caches_only_the_user_status(self):
+        self.assertEqual(self.get('/api/predictions/', self.owner).status_code, 200)
+        self.assertEqual(cache.get(_user_cache_key(self.owner.pk)), (True, True))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_status(self.owner.pk), (True, True))
+
+        self.owner.save()
+        self.assertIsNone(cache.get(_user_cache_key(self.owner.pk)))
+
+    def test_rejects_deleted_and_inactive_users_at_once(self):
+        self.assertEqual(self.get('/api/predictions/', self.owner).status_code, 200)
+        self.owner.is_active = False
+        self.owner.save()
+        self.assertEqual(self.get('/api/predictions/', self.owner).status_code, 401)
+
+        self.assertEqual(self.get('/api/predictions/', self.other).status_code, 200)
+        token = AccessToken.for_user(self.other)
+        self.other.delete()
+        response = self.client.get('/api/predictions/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_ownership_filters(self):
+        own, other = self.predictions[self.owner], self.predictions[self.other]
+        self.assertEqual([row['id'] for row in self.get('/api/predictions/', self.owner).json()], [own.pk])
+        self.assertEqual(self.get(f'/api/predictions/{own.pk}/', self.owner).status_code, 200)
+        self.assertEqual(self.get(f'/api/predictions/{other.pk}/', self.owner).status_code, 404)
+
+        own, other = self.insights[self.owner], self.insights[self.other]
+        self.assertEqual([row['insight_id'] for row in self.get('/api/insights/', self.owner).json()], [own.pk])
+        self.assertEqual(self.get(f'/api/insights/{other.pk}/', self.owner).status_code, 404)
+        self.assertEqual(len(self.get(f'/api/insights/dataset/{own.dataset_id}/', self.owner).json()), 1)
+        self.assertEqual(self.get(f'/api/insights/dataset/{other.dataset_id}/', self.owner).json(), [])
+
+    async def test_aauthenticate(self):
+        authentication = TokenUserAuthentication()
+        factory = AsyncRequestFactory()
+        self.assertIsNone(await authentication.aauthenticate(factory.get('/')))
+
+        token = AccessToken.for_user(self.owner)
+        request = factory.get('/', headers={'Authorization': f'Bearer {token}'})
+        user, validated = await authentication.aauthenticate(request)
+        self.assertEqual((user.pk, str(validated)), (self.owner.pk, str(token)))
+
+        await User.objects.filter(pk=self.owner.pk).aupdate(is_active=False)
+        await cache.aclear()
+        with self.assertRaises(AuthenticationFailed):
+            await authentication.aauthenticate(request)
@@ -0,0 +1,15 @@
+"""
+Benchmarks of the prediction pipeline and the dataset and prediction APIs.
+
+Run from ``backend/``::
+
+    python -m benchmarks run --sizes 10000,100000,1000000 --output results.json
+    python -m benchmarks compare baseline.json results.json
+
+``run`` uses ``benchmarks.settings``: a fresh SQLite database and media
+directory under ``BENCHMARK_ROOT`` and eager Celery, so no Postgres, Redis
+or worker is needed. Each case is timed ``--repeat`` times after
+``--warmup`` untimed runs, then run once more under tracemalloc for its
+peak memory. ``compare`` (or ``run --baseline``) exits with status 1 when a
+case got slower or bigger than the thresholds allow.
+"""
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+def _print_comparison(rows):
+    for row in rows:
+        if row['status'] == 'new':
+            print(f"{row['case']:<20} {row['rows']:>9} rows  new")
+            continue
+        print(f"{row['case']:<20} {row['rows']:>9} rows  latency {row['latency_change']:+7.1%}  "
+              f"memory {row['memory_change']:+7.1%}  {row['status']}")
+    return any(row['status'] == 'regression' for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('--sizes', type=_sizes, default=[10_000, 100_000, 1_000_000], help='comma separated row counts')
+    run.add_argument('--cases', help='comma separated case names (default: all)')
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--warmup', type=int, default=1)
+    run.add_argument('--output', help='write the results here (default: stdout)')
+    run.add_argument('--baseline', help='compare the results with this file')
+
+    for command in (run, commands.add_parser('compare', help='compare two result files')):
+        command.add_argument('--threshold', type=float, default=0.1, help='allowed p50 latency growth (fraction)')
+        command.add_argument('--memory-threshold', type=float, default=0.2, help='allowed peak memory growth')
+    compare_parser = commands.choices['compare']
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from .cases import CASES
+    from .runner import compare, run_suite
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return int(_print_comparison(compare(baseline, current, args.threshold, args.memory_threshold)))
+
+    case_names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = [name for name in case_names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)} (available: {', '.join(CASES)})")
+
+    shutil.rmtree(settings.BENCHMARK_ROOT, ignore_errors=True)
+    settings.BENCHMARK_ROOT.mkdir(parents=True)
+    call_command('migrate', verbosity=0)
+
+    document = run_suite(
+        case_names, args.sizes, args.repeat, args.warmup, settings.BENCHMARK_ROOT,
+        log=lambda line: print(line, file=sys.stderr),
+    )
+    document['settings'] = {'repeat': args.repeat, 'warmup': args.warmup}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return int(_print_comparison(compare(baseline, document, args.threshold, args.memory_threshold)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
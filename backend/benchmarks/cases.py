@@ -0,0 +1,167 @@
+"""
+The benchmarked operations.
+
+Every case works on a ``Fixture``: a guest session owning one dataset of
+``rows`` rows. ``before`` and ``after`` run around every timed ``run`` and
+are not measured.
+"""
+import os
+import shutil
+
+from django.core.files import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework.test import APIRequestFactory
+
+from datasets import views as dataset_views
+from datasets.models import Dataset, DatasetProcessing
+from datasets.serializers import DatasetSerializer, DatasetWithDataSerializer
+from ml_model.predictors.predictor import PredictiveMaintenancePredictor
+from ml_model.tasks import process_dataset
+from predictions.models import Prediction
+from predictions.views import PredictionList
+from users.models import GuestSession
+
+CASES = {}
+
+
+def case(name):
+    def register(cls):
+        cls.name = name
+        CASES[name] = cls
+        return cls
+    return register
+
+
+class Fixture:
+    def __init__(self, rows, path):
+        self.rows = rows
+        self.path = path
+        self.session = GuestSession.objects.create()
+        self.dataset = Dataset(session=self.session)
+        with open(path, 'rb') as f:
+            self.dataset.file.save(os.path.basename(path), File(f), save=False)
+        self.dataset.file_size = self.dataset.file.size
+        self.dataset.save()
+
+    def request(self, path, **params):
+        request = APIRequestFactory().get(path, params)
+        request.guest_session = self.session
+        return request
+
+    def ensure_predictions(self):
+        if not Prediction.objects.filter(dataset=self.dataset).exists():
+            process_dataset.apply(args=[self.dataset.pk], throw=True)
+            self.dataset.refresh_from_db()
+
+    def delete_predictions(self):
+        predictions = Prediction.objects.filter(dataset=self.dataset)
+        predictions._raw_delete(predictions.db)
+        # Otherwise process_dataset skips the dataset as already processed
+        DatasetProcessing.objects.filter(dataset=self.dataset).delete()
+
+    def close(self):
+        self.delete_predictions()
+        self.dataset.file.delete(save=False)
+        self.dataset.delete()
+        self.session.delete()
+
+
+class Case:
+    def __init__(self, fixture):
+        self.fixture = fixture
+
+    def before(self):
+        pass
+
+    def run(self):
+        raise NotImplementedError
+
+    def after(self):
+        pass
+
+
+def _render(response):
+    if response.status_code != 200:
+        raise AssertionError(f'{response.status_code}: {getattr(response, "data", response.content)}')
+    response.render()
+    return response
+
+
+@case('predict')
+class Predict(Case):
+    """``PredictiveMaintenancePredictor.predict`` on the dataset file, model already loaded"""
+
+    def __init__(self, fixture):
+        super().__init__(fixture)
+        self.predictor = PredictiveMaintenancePredictor()
+
+    def run(self):
+        results = self.predictor.predict(self.fixture.path)
+        if len(results) != self.fixture.rows:
+            raise AssertionError(f'{len(results)} predictions for {self.fixture.rows} rows')
+
+
+@case('process_dataset')
+class ProcessDataset(Case):
+    """The prediction task end to end: model load, scoring and storing the predictions"""
+
+    def before(self):
+        self.fixture.delete_predictions()
+
+    def run(self):
+        process_dataset.apply(args=[self.fixture.dataset.pk], throw=True)
+
+
+@case('dataset_stats')
+class DatasetStats(Case):
+    """GET of the stats endpoint, rendered to JSON"""
+
+    def run(self):
+        pk = self.fixture.dataset.pk
+        _render(dataset_views.dataset_stats(self.fixture.request(f'/api/datasets/my/{pk}/stats/'), pk=pk))
+
+
+@case('dataset_detail')
+class DatasetDetail(Case):
+    """``DatasetWithDataSerializer`` and a page of rows from the middle of the dataset"""
+
+    def run(self):
+        dataset = self.fixture.dataset
+        request = self.fixture.request(f'/api/datasets/my/{dataset.pk}/')
+        DatasetWithDataSerializer(dataset, context={'request': request}).data
+        rows_request = self.fixture.request(
+            f'/api/datasets/my/{dataset.pk}/rows/', offset=self.fixture.rows // 2, limit=100,
+        )
+        _render(dataset_views.dataset_rows(rows_request, pk=dataset.pk))
+
+
+@case('prediction_list')
+class PredictionListCase(Case):
+    """GET of the prediction list of the dataset, rendered to JSON"""
+
+    def __init__(self, fixture):
+        super().__init__(fixture)
+        fixture.ensure_predictions()
+        self.view = PredictionList.as_view()
+
+    def run(self):
+        _render(self.view(self.fixture.request('/api/predictions/', dataset=self.fixture.dataset.pk)))
+
+
+@case('upload_validation')
+class UploadValidation(Case):
+    """``DatasetSerializer`` validation of an uploaded file, as spooled to disk by Django"""
+
+    def before(self):
+        self.upload = TemporaryUploadedFile('upload.csv', 'text/csv', os.path.getsize(self.fixture.path), None)
+        with open(self.fixture.path, 'rb') as f:
+            shutil.copyfileobj(f, self.upload)
+        self.upload.seek(0)
+
+    def run(self):
+        serializer = DatasetSerializer(data={'file': self.upload})
+        if not serializer.is_valid():
+            raise AssertionError(serializer.errors)
+
+    def after(self):
+        self.upload.close()
@@ -0,0 +1,129 @@
+import gc
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from datasets.synthetic import TelemetryModel, write_csv
+
+from .cases import CASES, Fixture
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _versions():
+    import django
+    import pandas
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'django': django.__version__,
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _once(case):
+    case.before()
+    try:
+        gc.collect()
+        start = time.perf_counter()
+        case.run()
+        return time.perf_counter() - start
+    finally:
+        case.after()
+
+
+def _peak_memory(case):
+    case.before()
+    try:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            case.run()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        case.after()
+
+
+def measure(case, rows, repeat, warmup):
+    for _ in range(warmup):
+        _once(case)
+    samples = [_once(case) for _ in range(repeat)]
+    p50 = float(np.percentile(samples, 50))
+    return {
+        'case': case.name,
+        'rows': rows,
+        'repeat': repeat,
+        'latency': {
+            'min': min(samples),
+            'mean': sum(samples) / len(samples),
+            'max': max(samples),
+            **{f'p{q}': float(np.percentile(samples, q)) for q in PERCENTILES},
+        },
+        'throughput_rows_per_s': rows / p50 if p50 else None,
+        'peak_memory_bytes': _peak_memory(case),
+    }
+
+
+def run_suite(case_names, sizes, repeat, warmup, work_dir, log=print):
+    """Run the cases on a generated dataset of every size and return the results document"""
+    results = []
+    model = TelemetryModel.fit()
+    for rows in sizes:
+        path = work_dir / f'benchmark_{rows}.csv'
+        write_csv(path, rows, model=model)
+        fixture = Fixture(rows, str(path))
+        try:
+            for name in case_names:
+                result = measure(CASES[name](fixture), rows, repeat, warmup)
+                log(f"{name:<20} {rows:>9} rows  p50 {result['latency']['p50'] * 1000:10.1f} ms  "
+                    f"peak {result['peak_memory_bytes'] / 1024 ** 2:8.1f} MiB")
+                results.append(result)
+        finally:
+            fixture.close()
+            path.unlink()
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'platform': platform.platform(),
+        'versions': _versions(),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.1, memory_threshold=0.2):
+    """
+    Each result of ``current`` against the same case and size in ``baseline``.
+
+    A case regressed when its p50 latency grew by more than ``threshold`` or
+    its peak memory by more than ``memory_threshold`` (fractions).
+    """
+    previous = {(result['case'], result['rows']): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = previous.get((result['case'], result['rows']))
+        row = {'case': result['case'], 'rows': result['rows'], 'status': 'new'}
+        if before is not None:
+            latency = result['latency']['p50'] / before['latency']['p50'] - 1
+            memory = result['peak_memory_bytes'] / max(before['peak_memory_bytes'], 1) - 1
+            regressed = latency > threshold or memory > memory_threshold
+            row.update(latency_change=latency, memory_change=memory, status='regression' if regressed else 'ok')
+        rows.append(row)
+    return rows
@@ -0,0 +1,32 @@
+# Settings of the benchmark suite: the project settings on a throwaway SQLite database
+import os
+import tempfile
+from pathlib import Path
+
+from config.settings import *  # noqa: F401,F403
+
+BENCHMARK_ROOT = Path(os.getenv('BENCHMARK_ROOT', Path(tempfile.gettempdir()) / 'machintel-benchmarks'))
+
+SECRET_KEY = 'benchmarks'
+DEBUG = False  # no query log growing with every ORM call
+ALLOWED_HOSTS = ['testserver']  # APIRequestFactory requests
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCHMARK_ROOT / 'db.sqlite3',
+    }
+}
+
+MEDIA_ROOT = BENCHMARK_ROOT / 'media'
+DATASET_CACHE_ROOT = MEDIA_ROOT / 'cache'
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+RESPONSE_CACHE_TTL = 0  # measure the views, not the response cache
+PROFILING_ENABLED = False
+USER_STORAGE_QUOTA = None
+GUEST_STORAGE_QUOTA = None
+INSIGHT_PROVIDER = 'stub'
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
@@ -7,7 +7,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 # app.autodiscover_tasks()
-app.autodiscover_tasks(['ml_model.tasks', 'users.tasks'])
+app.autodiscover_tasks(['ml_model.tasks', 'users.tasks', 'datasets.tasks'])
+
+# Task duration and stage metrics, see monitoring/task_metrics.py
+import monitoring.task_metrics  # noqa: E402,F401
 
 app.task(bind=True)
 def debug_task(self):
@@ -17,5 +20,13 @@ app.conf.beat_schedule = {
     'cleanup-guest-sessions': {
         'task': 'users.tasks.cleanup_expired_sessions',
         'schedule': crontab(hour=12, minute=14) # Daily at 3 AM
-    }
+    },
+    'reconcile-storage': {
+        'task': 'datasets.tasks.reconcile_storage',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'retrain-incrementally': {
+        'task': 'ml_model.tasks.retrain_incrementally',
+        'schedule': crontab(hour=2, minute=0),
+    },
 }
\ No newline at end of file
@@ -94,6 +94,9 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Seconds TokenUserAuthentication caches whether a user exists and is active (0 disables the check)
+JWT_USER_CACHE_TTL = 60
+
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
@@ -106,8 +109,39 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'users.middleware.GuestSessionMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
 ]
 
+# Request profiling (monitoring.middleware), off unless PROFILING_ENABLED=True
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))  # share of requests profiled in detail
+PROFILING_TRACE_MEMORY = True  # peak memory via tracemalloc, one profiled request at a time
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # clients allowed to scrape /metrics/
+
+# Redis when REDIS_CACHE_URL is set, per-process memory otherwise (tests, development)
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Seconds read responses stay in the server-side cache (datasets.response_cache), 0 to disable
+RESPONSE_CACHE_TTL = 300
+
+# Guest session lookups in GuestSessionMiddleware (see users.session_cache)
+GUEST_SESSION_CACHE_SIZE = 10000  # sessions kept per process
+GUEST_SESSION_LOCAL_TTL = 30  # seconds a process trusts its own copy
+GUEST_SESSION_CACHE_TTL = 3600  # seconds in the shared cache
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -172,16 +206,38 @@ AUTHENTICATION_BACKENDS = [
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_TIMEZONE = 'UTC'
 
+# Queues: interactive-scoring and bulk-scoring (by dataset size, see ml_model/routing.py),
+# insights and maintenance. Run workers per queue, e.g. celery -A config worker -Q bulk-scoring -c 1
+CELERY_TASK_DEFAULT_QUEUE = 'maintenance'
+CELERY_TASK_ROUTES = [
+    'ml_model.routing.route_task',
+    {
+        'insights.*': {'queue': 'insights'},
+        # Shadow scoring only ever waits for real scoring
+        'ml_model.tasks.shadow_score': {'queue': 'bulk-scoring', 'priority': 9},
+        'users.tasks.*': {'queue': 'maintenance'},
+        'datasets.tasks.*': {'queue': 'maintenance'},
+    },
+]
+SCORING_INTERACTIVE_MAX_BYTES = 20 * 1024 ** 2  # bigger datasets go to bulk-scoring
+SCORING_PRIORITY_BASE_BYTES = 64 * 1024  # datasets up to this size get the top priority
+# Tasks run for minutes: reserve one at a time and acknowledge when done, so a
+# lost worker's task is delivered again once the visibility timeout expires
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': 6 * 3600,  # longer than the longest task
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+
 # Authentication Backends
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
     'users.backends.GuestSessionBackend',
 ]
 
-# Celery Settings
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_TIMEZONE = 'UTC'
-
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -209,5 +265,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Derived per-dataset files (row offset index, sort orders)
+DATASET_CACHE_ROOT = MEDIA_ROOT / 'cache'
+DATASET_ROWS_MAX_LIMIT = 1000
+# Browser cache lifetime for responses derived from dataset files and stored predictions.
+# 0 since rows can be appended to a dataset: browsers revalidate, which mostly costs a 304
+DATASET_CACHE_MAX_AGE = 0
+
+# Rows fetched per server-side cursor batch when exporting predictions
+PREDICTION_EXPORT_BATCH_SIZE = 2000
+# Predictions inserted per bulk_create by ml_model.tasks.process_dataset
+PREDICTION_WRITE_BATCH_SIZE = 2000
+# Reasons stored with every prediction (see PredictiveMaintenancePredictor.explain); 0 stores none
+PREDICTION_EXPLANATION_TOP_K = 3
+# Model artifacts and their registry.json (see ml_model/registry.py)
+MODEL_DIR = BASE_DIR / 'ml_model' / 'predictors'
+# Labelled rows of uploads, kept for incremental retraining (see ml_model/incremental.py)
+TRAINING_STORE_DIR = BASE_DIR / 'ml_model' / 'training_store'
+INCREMENTAL_MIN_ROWS = 5000  # new rows a retraining cycle waits for
+INCREMENTAL_TREES_PER_CYCLE = 20  # trees each cycle adds, fitted on the new rows only
+INCREMENTAL_MAX_TREES = 200  # the oldest trees are dropped beyond this
+INCREMENTAL_AUTO_PROMOTE = False  # activate a retrained model that passes the promotion gates
+# Gates a trained model must pass to be promoted (see ml_model/zoo.py)
+MODEL_PROMOTION_MIN_F1 = 0.5  # on the held-out test split, and no lower than the active model's
+MODEL_PROMOTION_MIN_THROUGHPUT = 20000  # rows per second, batch scoring on one core
+
+# Seconds a processing run holds a dataset before another run may take it over
+PROCESSING_LEASE_SECONDS = 3600
+PROCESSING_MAX_RETRIES = 3  # retries after a database error
+PROCESSING_RETRY_DELAY = 30  # seconds before the first retry, doubled for each further one
+
+# Port of the metrics endpoint of Celery workers (monitoring.task_metrics), unset to disable
+WORKER_METRICS_PORT = os.getenv('WORKER_METRICS_PORT')
+# The endpoint has no access control: loopback only, unless the network in front of it restricts access
+WORKER_METRICS_HOST = os.getenv('WORKER_METRICS_HOST', '127.0.0.1')
+
+# Guest data cleanup
+GUEST_DATASET_MAX_AGE = 24 * 3600  # seconds, guest datasets older than this are deleted
+GUEST_CLEANUP_BATCH_SIZE = 200  # datasets or sessions deleted per transaction
+GUEST_CLEANUP_PAUSE = 0.5  # seconds between batches, so other queries get the tables
+GUEST_CLEANUP_MAX_SECONDS = 600  # time budget of one run, the next run continues
+
+# Serve upload, stats and dataset insights from async views (run under ASGI)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_CPU_WORKERS = 4  # threads per process for pandas work in async views
+
+# Upload storage accounting, see datasets/storage.py
+USER_STORAGE_QUOTA = 1024 ** 3  # bytes per user, None for no limit
+GUEST_STORAGE_QUOTA = 100 * 1024 ** 2  # bytes per guest session
+STORAGE_ORPHAN_GRACE = 3600  # seconds before a file without a dataset row is deleted
+
+# Insight generation
+# INSIGHT_PROVIDER: 'gemini', or 'stub' for a deterministic offline backend
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+INSIGHT_PROVIDER = os.getenv('INSIGHT_PROVIDER', 'gemini')
+INSIGHT_MODEL_NAME = 'gemini-1.5-flash'
+# Upper bound on the size of the dataset summary sent to the LLM
+INSIGHT_PROMPT_TOKEN_BUDGET = int(os.getenv('INSIGHT_PROMPT_TOKEN_BUDGET', 2000))
+INSIGHT_CACHE_TTL = 7 * 24 * 3600  # seconds, results are cached by model and prompt hash
+INSIGHT_MAX_WORKERS = 4  # concurrent LLM calls per process
+INSIGHT_TIMEOUT = 30  # seconds per call
+INSIGHT_RETRIES = 2
+INSIGHT_RETRY_BACKOFF = 1.0  # seconds, doubled after every retry
+INSIGHT_BREAKER_THRESHOLD = 5  # consecutive failures before calls are stopped
+INSIGHT_BREAKER_RESET = 60  # seconds before calls are tried again
+
 FILE_UPLOAD_MAX_MEMORY_SIZE = 26214400  # 25MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 26214400
\ No newline at end of file
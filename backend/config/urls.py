@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from monitoring.views import metrics_view
 
 
 
@@ -12,6 +13,7 @@ urlpatterns = [
     path('api/datasets/', include('datasets.urls')),
     path('api/predictions/', include('predictions.urls')),
     path('api/insights/', include('insights.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 # Serve uploaded files during development
 if settings.DEBUG:
@@ -1,4 +1,7 @@
 from django.contrib import admin
-from .models import Dataset
+from .models import Dataset, DatasetProcessing, DatasetSummary, StorageUsage
 
 admin.site.register(Dataset)
+admin.site.register(DatasetProcessing)
+admin.site.register(DatasetSummary)
+admin.site.register(StorageUsage)
@@ -0,0 +1,70 @@
+"""
+Helpers for the async views, used when ``ASYNC_VIEWS`` is on.
+
+DRF views are sync only, so the async variants are plain Django views. They
+authenticate with ``TokenUserAuthentication.aauthenticate``, use the async
+ORM where Django has it and run pandas work through ``run_cpu``: a thread
+pool of ``ASYNC_CPU_WORKERS`` threads per process. pandas releases the GIL
+in its parsers and most reductions, so threads are enough and dataframes do
+not have to be pickled across processes.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from authentication.authentication import TokenUserAuthentication
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def cpu_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.ASYNC_CPU_WORKERS, thread_name_prefix='cpu')
+        return _pool
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run blocking, CPU bound ``func`` in the bounded pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), partial(func, *args, **kwargs))
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def async_api_view(methods=('GET',), guests=True):
+    """
+    Method check, JWT authentication and permissions for an async view.
+
+    Like the DRF views it replaces: JWT in the Authorization header, guests
+    through ``request.guest_session`` unless ``guests`` is False, and no CSRF
+    check since no cookie authentication is involved.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                authenticated = await TokenUserAuthentication().aauthenticate(request)
+            except AuthenticationFailed as e:
+                detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+                return JsonResponse(detail, status=e.status_code)
+            request.user = authenticated[0] if authenticated else AnonymousUser()
+
+            if not (request.user.is_authenticated or (guests and hasattr(request, 'guest_session'))):
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            return await view(request, *args, **kwargs)
+        return inner
+    return decorator
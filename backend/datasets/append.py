@@ -0,0 +1,133 @@
+"""
+Appending rows to a stored dataset.
+
+Machines export telemetry continuously, so a dataset can grow by appends
+(``POST my/<pk>/append/`` with a CSV file of the new rows) rather than each
+export becoming a new dataset that is parsed, scored and summarized from
+scratch. An append costs in proportion to the new rows:
+
+- they are written to the end of the dataset file, in its column order;
+- the row index and the columnar copy, where built, are extended rather than
+  rebuilt (see ``RowIndex.extend`` and ``ColumnarCache.extend``), under the
+  file's ``file_lock`` so no reader rebuilds them in between;
+- the dataset's ``StatsSummary`` is merged with a summary of the new rows,
+  updating only the rollups they fall into, and the stats endpoint serves
+  it from then on;
+- ``ml_model.tasks.score_appended_rows`` scores only the new rows and adds
+  their predictions.
+
+The first append also summarizes the rows already there, once. An append
+holds the dataset's processing lease from writing the rows until their
+predictions are stored, so appends never overlap with each other or with a
+full run, and they are only accepted once the dataset has been processed.
+"""
+import hashlib
+import os
+import uuid
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .columnar import ColumnarCache
+from .row_index import RowIndex, clear_dataset_cache, dataset_cache_dir, file_lock
+from .storage import record_usage
+from .summary import StatsSummary, save_summary, stored_summary, summarize_file
+
+
+class AppendError(Exception):
+    """Rows that cannot be appended, with the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def read_rows(upload, columns):
+    """The rows of an uploaded CSV file, in the order of ``columns``, which the file must have exactly"""
+    try:
+        df = pd.read_csv(upload)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise AppendError(f"Invalid CSV: {str(e)}")
+    missing = [column for column in columns if column not in df.columns]
+    unknown = [column for column in df.columns if column not in columns]
+    if missing or unknown:
+        problems = [f"{kind} {', '.join(names)}" for kind, names in [('missing', missing), ('unknown', unknown)] if names]
+        raise AppendError(f"Columns do not match the dataset's: {'; '.join(problems)}")
+    if not len(df):
+        raise AppendError("No rows to append")
+    return df[columns]
+
+
+def _write(path, df):
+    """Append ``df`` to the CSV file; returns the size of the file before, where the new rows begin and their bytes"""
+    rows = df.to_csv(index=False, header=False, lineterminator='\n').encode('utf-8')
+    with open(path, 'ab+') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - 1, 0))
+        # The last row of the file may lack its line break
+        separator = b'\n' if size and f.read(1) != b'\n' else b''
+        f.write(separator + rows)
+    return size, size + len(separator), separator + rows
+
+
+def chained_hash(content_hash, body):
+    """The content hash of a file after ``body`` was appended to it"""
+    return hashlib.sha256(f"{content_hash}:{hashlib.sha256(body).hexdigest()}".encode('ascii')).hexdigest()
+
+
+def append_rows(dataset, upload):
+    """Append the rows of the CSV file ``upload`` to ``dataset`` and queue their scoring; returns their number"""
+    from ml_model.tasks import claim_append, release_append, score_appended_rows
+
+    path = dataset.file.path
+    df = read_rows(upload, list(pd.read_csv(path, nrows=0).columns))
+
+    task_id = str(uuid.uuid4())
+    if not claim_append(dataset, task_id):
+        raise AppendError("The dataset is being processed, append once its predictions are stored", status=409)
+
+    # Readers that find the index or the columnar copy stale wait for the lock,
+    # rather than rebuilding them from the grown file before they are extended
+    with file_lock(path):
+        size = None
+        try:
+            cache_dir = dataset_cache_dir(dataset.pk)
+            index = RowIndex.load(path, cache_dir)
+            columnar = ColumnarCache.load(path, cache_dir / 'columnar')
+            summary = stored_summary(dataset, rollups=False)
+            # The first append summarizes the rows already there
+            fresh = summary is None
+            if fresh:
+                summary = summarize_file(path)
+
+            size, begin, body = _write(path, df)
+            if index is not None:
+                index.extend(begin)
+                if columnar is not None:
+                    columnar.extend(index)
+            added = StatsSummary.from_frame(df)
+            summary.merge(added)
+
+            dataset.file_size = size + len(body)
+            dataset.content_hash = chained_hash(dataset.content_hash, body)
+            dataset.appended_at = timezone.now()
+            with transaction.atomic():
+                save_summary(dataset, summary, added=None if fresh else added)
+                dataset.save(update_fields=['file_size', 'content_hash', 'appended_at'])
+                record_usage(len(body), files=0, user_id=dataset.user_id, session_id=dataset.session_id)
+        except Exception:
+            if size is not None:
+                # Leave the file as it was; its derived files are rebuilt when next needed
+                with open(path, 'rb+') as f:
+                    f.truncate(size)
+                clear_dataset_cache(dataset.pk)
+            release_append(dataset, task_id)
+            raise
+
+    try:
+        score_appended_rows.delay(dataset.pk, task_id, begin, dataset.file_size)
+    except Exception as e:
+        release_append(dataset, task_id, f"Could not queue the scoring of the appended rows: {str(e)}")
+        raise
+    return len(df)
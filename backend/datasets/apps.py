@@ -5,5 +5,8 @@ class DatasetsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "datasets"
 
+    def ready(self):
+        from . import response_cache  # noqa: F401 (connects the invalidation signals)
+
 
 
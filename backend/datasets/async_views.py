@@ -0,0 +1,84 @@
+"""
+Async variants of the upload and stats views, routed instead of the DRF ones
+when ``ASYNC_VIEWS`` is on (see ``datasets.aio``).
+"""
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .aio import async_api_view, error_response, run_cpu
+from .conditional import conditional, dataset_file_validators
+from .models import Dataset
+from .permissions import owned_datasets
+from .response_cache import cache_response
+from .serializers import DatasetSerializer
+from .stats import dataset_statistics
+from .summary import stored_summary
+from .storage import check_quota, record_usage
+
+
+def _save_upload(request, serializer):
+    if request.user.is_authenticated:
+        instance = serializer.save(user_id=request.user.pk)
+    else:
+        instance = serializer.save(session=request.guest_session)
+    record_usage(instance.file_size, user_id=instance.user_id, session_id=instance.session_id)
+    return instance
+
+
+@async_api_view(methods=('POST',))
+async def dataset_upload(request):
+    # Parsing the multipart body writes large files to disk
+    files = await sync_to_async(lambda: request.FILES)()
+    if 'file' not in files:
+        return error_response("No file provided", 400)
+    file = files['file']
+
+    quota_error = await sync_to_async(check_quota)(request, file.size)
+    if quota_error:
+        return error_response(quota_error, 413)
+
+    serializer = DatasetSerializer(data={'file': file})
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        instance = await sync_to_async(_save_upload)(request, serializer)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+    from ml_model.tasks import process_dataset
+    try:
+        await sync_to_async(process_dataset.delay)(instance.id)
+    except Exception:
+        return error_response("Failed to generate predictions.", 500)
+
+    return JsonResponse(serializer.data, status=201, encoder=JSONEncoder)
+
+
+@async_api_view()
+@cache_response('dataset-stats')
+@conditional(dataset_file_validators)
+async def dataset_stats(request, pk):
+    """Get detailed statistics for a dataset"""
+    try:
+        dataset = await owned_datasets(request).aget(pk=pk)
+    except Dataset.DoesNotExist:
+        return error_response("Dataset not found", 404)
+
+    # Datasets that were appended to keep their statistics up to date in a summary
+    summary = await sync_to_async(stored_summary)(dataset)
+    if summary is not None:
+        stats = await run_cpu(summary.statistics, dataset.file.size)
+        return JsonResponse(stats, encoder=JSONEncoder)
+
+    try:
+        df = await run_cpu(pd.read_csv, dataset.file.path)
+    except Exception as e:
+        return error_response(f"Failed to read dataset file: {str(e)}", 500)
+
+    try:
+        stats = await run_cpu(dataset_statistics, df, dataset.file.size)
+    except Exception as e:
+        return error_response(str(e), 500)
+    return JsonResponse(stats, encoder=JSONEncoder)
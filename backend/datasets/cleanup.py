@@ -0,0 +1,166 @@
+"""
+Batched deletion of guest data.
+
+Expired guest datasets are deleted a batch at a time, each batch in its own
+short transaction: predictions and insights first with set-based deletes
+(no model instances, no per-row signals), then the dataset rows. Files and
+the dataset cache directories are removed once the batch has committed, so
+an interrupted run leaves nothing half deleted in the database and the next
+run simply picks up the remaining rows. ``pause`` and ``max_seconds`` keep a
+run from holding the tables for long.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from insights.models import Insight
+from predictions.models import Prediction, ShadowComparison
+from users.models import GuestSession
+from users.session_cache import invalidate_guest_sessions
+
+from .models import Dataset, DatasetProcessing, DatasetRollup, DatasetSummary
+from .response_cache import dataset_owner_key, invalidate_owners
+from .row_index import clear_dataset_cache, dataset_cache_dir
+from .storage import disk_usage, record_usage
+
+
+class CleanupReport:
+    def __init__(self):
+        self.sessions = 0
+        self.datasets = 0
+        self.predictions = 0
+        self.insights = 0
+        self.files = 0
+        self.bytes = 0
+        self.complete = True
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        summary = (
+            f"Deleted {self.sessions} sessions, {self.datasets} datasets, {self.predictions} predictions, "
+            f"{self.insights} insights and {self.files} files ({self.bytes} bytes)"
+        )
+        return summary if self.complete else summary + ", stopped early, run again to continue"
+
+
+def expired_guest_datasets(now=None):
+    """Guest datasets whose session has expired or that are older than ``GUEST_DATASET_MAX_AGE``"""
+    now = now or timezone.now()
+    return Dataset.objects.filter(user__isnull=True).filter(
+        Q(session__isnull=True)
+        | Q(session__expires_at__lte=now)
+        | Q(uploaded_at__lt=now - timedelta(seconds=settings.GUEST_DATASET_MAX_AGE))
+    )
+
+
+def _raw_delete(queryset, batch_size):
+    """Delete in chunks of ``batch_size`` rows with plain DELETE statements, returning the row count"""
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        # _raw_delete skips the collector: these models have no dependents and no delete signals
+        deleted += queryset.model.objects.filter(pk__in=pks)._raw_delete(queryset.db)
+
+
+def _remove_files(batch, report):
+    for dataset_id, name, *_ in batch:
+        if name:
+            try:
+                size = default_storage.size(name)
+                default_storage.delete(name)
+            except OSError:
+                pass
+            else:
+                report.files += 1
+                report.bytes += size
+        report.bytes += disk_usage(dataset_cache_dir(dataset_id))
+        clear_dataset_cache(dataset_id)
+
+
+def _release_usage(batch):
+    released = defaultdict(lambda: [0, 0])
+    for _, _, user_id, session_id, file_size in batch:
+        totals = released[(user_id, session_id)]
+        totals[0] -= file_size
+        totals[1] -= 1
+    for (user_id, session_id), (size, files) in released.items():
+        record_usage(size, files, user_id=user_id, session_id=session_id)
+
+
+def delete_datasets(queryset, report=None, batch_size=None, pause=None, deadline=None):
+    """Delete the datasets in ``queryset`` with their predictions, insights and files"""
+    report = report or CleanupReport()
+    batch_size = batch_size or settings.GUEST_CLEANUP_BATCH_SIZE
+    pause = settings.GUEST_CLEANUP_PAUSE if pause is None else pause
+
+    last_pk = 0
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            report.complete = False
+            break
+        rows = queryset.filter(pk__gt=last_pk).order_by('pk')
+        batch = list(rows.values_list('pk', 'file', 'user_id', 'session_id', 'file_size')[:batch_size])
+        if not batch:
+            break
+        pks = [row[0] for row in batch]
+        with transaction.atomic():
+            report.predictions += _raw_delete(Prediction.objects.filter(dataset_id__in=pks), batch_size * 20)
+            report.insights += _raw_delete(Insight.objects.filter(dataset_id__in=pks), batch_size)
+            DatasetProcessing.objects.filter(dataset_id__in=pks)._raw_delete(DatasetProcessing.objects.db)
+            _raw_delete(DatasetRollup.objects.filter(dataset_id__in=pks), batch_size * 20)
+            DatasetSummary.objects.filter(dataset_id__in=pks)._raw_delete(DatasetSummary.objects.db)
+            ShadowComparison.objects.filter(dataset_id__in=pks)._raw_delete(ShadowComparison.objects.db)
+            report.datasets += Dataset.objects.filter(pk__in=pks)._raw_delete(Dataset.objects.db)
+        _release_usage(batch)
+        # The raw deletes send no signals
+        invalidate_owners(dataset_owner_key(user_id, session_id) for _, _, user_id, session_id, _ in batch)
+        _remove_files(batch, report)
+        last_pk = pks[-1]
+        if pause:
+            time.sleep(pause)
+    return report
+
+
+def delete_guest_sessions(queryset, report=None, batch_size=None, pause=None, deadline=None):
+    """Delete the sessions in ``queryset`` with all their data"""
+    report = report or CleanupReport()
+    batch_size = batch_size or settings.GUEST_CLEANUP_BATCH_SIZE
+    pause = settings.GUEST_CLEANUP_PAUSE if pause is None else pause
+
+    while report.complete:
+        session_ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not session_ids:
+            break
+        delete_datasets(
+            Dataset.objects.filter(session_id__in=session_ids), report, batch_size, pause, deadline
+        )
+        if not report.complete:
+            break
+        # The datasets are gone, so this cascade only collects the storage usage rows
+        _, deleted = GuestSession.objects.filter(pk__in=session_ids).delete()
+        report.sessions += deleted.get(GuestSession._meta.label, 0)
+        invalidate_guest_sessions(session_ids)
+    return report
+
+
+def cleanup_expired_guest_data(batch_size=None, pause=None, max_seconds=None):
+    """Delete expired guest sessions and guest datasets, within ``max_seconds`` if given"""
+    now = timezone.now()
+    max_seconds = settings.GUEST_CLEANUP_MAX_SECONDS if max_seconds is None else max_seconds
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+
+    report = CleanupReport()
+    delete_guest_sessions(GuestSession.objects.filter(expires_at__lte=now), report, batch_size, pause, deadline)
+    if report.complete:
+        delete_datasets(expired_guest_datasets(now), report, batch_size, pause, deadline)
+    return report
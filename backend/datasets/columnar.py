@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .row_index import dataset_cache_dir, file_lock
+
+ROW_GROUP_SIZE = 65536
+
+
+class ColumnarCache:
+    """
+    Column-per-file copy of a dataset, split into row groups.
+
+    Each row group stores one ``.npy`` file per column (strings as fixed width
+    unicode, so everything can be memory-mapped) and the manifest keeps the
+    min/max/null count of every column per group. Queries use those statistics
+    to skip whole groups without reading them.
+    """
+
+    def __init__(self, root, manifest):
+        self.root = Path(root)
+        self.manifest = manifest
+
+    @property
+    def columns(self):
+        return self.manifest['columns']
+
+    @property
+    def row_groups(self):
+        return self.manifest['row_groups']
+
+    @property
+    def num_rows(self):
+        return sum(group['rows'] for group in self.row_groups)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        return cls.load_or_build(dataset.file.path, dataset_cache_dir(dataset.id) / 'columnar')
+
+    @classmethod
+    def load(cls, path, root):
+        """The cache of ``path`` kept in ``root``, or None if there is none or the file changed since"""
+        root = Path(root)
+        try:
+            with open(root / 'manifest.json') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        stat = os.stat(path)
+        if manifest['size'] != stat.st_size or manifest['mtime'] != stat.st_mtime:
+            return None
+        return cls(root, manifest)
+
+    @classmethod
+    def load_or_build(cls, path, root, row_group_size=ROW_GROUP_SIZE):
+        cache = cls.load(path, root)
+        if cache is not None:
+            return cache
+
+        with file_lock(path):
+            # An append may have extended the cache while we waited
+            cache = cls.load(path, root)
+            if cache is not None:
+                return cache
+
+            # Build next to the final place and rename it in, so a reader
+            # never sees a cache with some of its row groups missing
+            root = Path(root)
+            root.parent.mkdir(parents=True, exist_ok=True)
+            tmp = Path(tempfile.mkdtemp(dir=root.parent, prefix=f'.{root.name}-'))
+            try:
+                manifest = cls._build(path, tmp, row_group_size)
+                stale = tmp.with_name(f'{tmp.name}-stale')
+                try:
+                    os.rename(root, stale)
+                except FileNotFoundError:
+                    pass
+                shutil.rmtree(stale, ignore_errors=True)
+                os.rename(tmp, root)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        return cls(root, manifest)
+
+    @classmethod
+    def _build(cls, path, root, row_group_size):
+        stat = os.stat(path)
+        manifest = {'size': stat.st_size, 'mtime': stat.st_mtime, 'columns': None, 'row_groups': []}
+        start = 0
+        for number, chunk in enumerate(pd.read_csv(path, chunksize=row_group_size)):
+            if manifest['columns'] is None:
+                manifest['columns'] = list(chunk.columns)
+            manifest['row_groups'].append(cls._write_group(root, number, start, chunk))
+            start += len(chunk)
+        if manifest['columns'] is None:
+            manifest['columns'] = list(pd.read_csv(path, nrows=0).columns)
+        cls._write_manifest(root, manifest)
+        return manifest
+
+    @staticmethod
+    def _write_manifest(root, manifest):
+        with open(root / 'manifest.json', 'w') as f:
+            json.dump(manifest, f)
+
+    def extend(self, index, row_group_size=ROW_GROUP_SIZE):
+        """
+        Add the rows appended to the file, read through its up to date
+        ``RowIndex``. Only a last row group that was not full is rewritten:
+        the new rows fill it up, then go into new groups.
+        """
+        groups = self.row_groups
+        start = self.num_rows
+        if groups and groups[-1]['rows'] < row_group_size:
+            last = groups.pop()
+            start = last['start']
+            shutil.rmtree(self.root / last['dir'], ignore_errors=True)
+        stat = os.stat(index.path)
+        for begin in range(start, len(index), row_group_size):
+            chunk = index.read_range(begin, begin + row_group_size)
+            groups.append(self._write_group(self.root, len(groups), begin, chunk))
+        self.manifest.update(size=stat.st_size, mtime=stat.st_mtime)
+        self._write_manifest(self.root, self.manifest)
+
+    @staticmethod
+    def _write_group(root, number, start, chunk):
+        group_dir = root / f'{number:05d}'
+        group_dir.mkdir()
+        stats = {}
+        for position, column in enumerate(chunk.columns):
+            series = chunk[column]
+            nulls = int(series.isna().sum())
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                values = series.to_numpy()
+                present = series.dropna()
+                low = present.min() if len(present) else None
+                high = present.max() if len(present) else None
+                stats[column] = {
+                    'kind': 'number',
+                    'min': None if low is None else low.item(),
+                    'max': None if high is None else high.item(),
+                    'nulls': nulls,
+                }
+            else:
+                values = series.fillna('').astype(str).to_numpy(dtype=str)
+                present = np.sort(values[series.notna().to_numpy()])
+                stats[column] = {
+                    'kind': 'string',
+                    'min': str(present[0]) if len(present) else None,
+                    'max': str(present[-1]) if len(present) else None,
+                    'nulls': nulls,
+                }
+            np.save(group_dir / f'{position}.npy', values)
+        return {'dir': group_dir.name, 'start': start, 'rows': len(chunk), 'stats': stats}
+
+    def read_column(self, group, column):
+        """Memory-mapped values of one column in one row group"""
+        position = self.columns.index(column)
+        return np.load(self.root / group['dir'] / f'{position}.npy', mmap_mode='r')
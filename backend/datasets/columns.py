@@ -0,0 +1,23 @@
+# Common names of the AI4I telemetry columns, so different exports of the same
+# data can be handled the same way.
+COLUMN_MAPPINGS = {
+    'air_temperature': ['Air temperature [K]', 'air_temperature', 'air_temp'],
+    'process_temperature': ['Process temperature [K]', 'process_temperature', 'process_temp'],
+    'rotational_speed': ['Rotational speed [rpm]', 'rotational_speed', 'speed'],
+    'torque': ['Torque [Nm]', 'torque'],
+    'tool_wear': ['Tool wear [min]', 'tool_wear'],
+    'product_id': ['Product ID', 'product_id'],
+    'type': ['Type', 'type', 'machine_type'],
+    'machine_id': ['UDI', 'machine_id', 'id']
+}
+
+
+def find_columns(columns):
+    """Map each known column key to the actual column name present in ``columns``"""
+    found_columns = {}
+    for key, possible_names in COLUMN_MAPPINGS.items():
+        for name in possible_names:
+            if name in columns:
+                found_columns[key] = name
+                break
+    return found_columns
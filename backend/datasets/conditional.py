@@ -0,0 +1,108 @@
+"""
+Conditional GET support for the dataset, prediction and insight endpoints.
+
+A view is wrapped with ``conditional(validators)``, where ``validators`` is a
+cheap function of the request (a query on the dataset row, never the file)
+returning ``(etag, last_modified, immutable)`` or ``None`` to skip. Requests
+whose ``If-None-Match``/``If-Modified-Since`` still match get a 304 before
+the view runs.
+"""
+from calendar import timegm
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .permissions import owned_datasets, owner_key
+
+# Responses depend on who is asking
+VARY_HEADERS = ['Authorization', 'X-Guest-Session']
+
+
+def make_etag(request, *parts):
+    parts = (owner_key(request), request.get_full_path()) + parts
+    return md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def dataset_version(dataset):
+    # Datasets uploaded before content hashes were stored are identified by their file
+    return dataset.content_hash or f'{dataset.file.name}@{dataset.uploaded_at.isoformat()}'
+
+
+def _not_modified(request, found):
+    """Quoted etag, timestamp, and the 304/412 response if the request's validators still match"""
+    etag, last_modified, _ = found
+    etag = quote_etag(etag)
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _finish(response, found, etag, timestamp, fresh):
+    if fresh and response.status_code == 200:
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+
+    patch_vary_headers(response, VARY_HEADERS)
+    if found[2]:
+        patch_cache_control(response, private=True, max_age=settings.DATASET_CACHE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(validators):
+    """Works on sync and async views, the validators always run sync"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                found = await sync_to_async(validators)(request, *args, **kwargs)
+                if found is None:
+                    return await view(request, *args, **kwargs)
+                etag, timestamp, response = _not_modified(request, found)
+                fresh = response is None
+                if fresh:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, found, etag, timestamp, fresh)
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            found = validators(request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if found is None:
+                return view(request, *args, **kwargs)
+            etag, timestamp, response = _not_modified(request, found)
+            fresh = response is None
+            if fresh:
+                response = view(request, *args, **kwargs)
+            return _finish(response, found, etag, timestamp, fresh)
+        return inner
+    return decorator
+
+
+def dataset_file_validators(request, pk, **kwargs):
+    """Validators for responses derived only from the dataset file, which changes when rows are appended"""
+    dataset = (
+        owned_datasets(request).filter(pk=pk).only('pk', 'file', 'uploaded_at', 'appended_at', 'content_hash').first()
+    )
+    if dataset is None:
+        return None
+    return make_etag(request, 'file', dataset_version(dataset)), dataset.appended_at or dataset.uploaded_at, True
+
+
+def dataset_detail_validators(request, pk, **kwargs):
+    """Validators for the dataset itself, which also changes when it is processed"""
+    dataset = owned_datasets(request).filter(pk=pk).only(
+        'pk', 'file', 'uploaded_at', 'appended_at', 'content_hash', 'processed_at', 'model_version',
+    ).first()
+    if dataset is None:
+        return None
+    etag = make_etag(request, 'dataset', dataset_version(dataset), dataset.processed_at, dataset.model_version)
+    changes = [dataset.uploaded_at, dataset.appended_at, dataset.processed_at]
+    return etag, max(change for change in changes if change is not None), False
@@ -0,0 +1,23 @@
+# Run this command manually (or schedule it) :  python manage.py delete_expired_guest_datasets
+# To automate it, use a scheduled job: Windows: Task Scheduler, Linux/macOS: cron job
+from django.core.management.base import BaseCommand
+from datasets.cleanup import delete_datasets, expired_guest_datasets
+import time
+
+class Command(BaseCommand):
+    help = 'Deletes guest datasets of expired sessions or older than GUEST_DATASET_MAX_AGE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Datasets deleted per transaction')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between batches')
+        parser.add_argument('--max-seconds', type=float, help='Stop after this long')
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options['max_seconds'] if options['max_seconds'] else None
+        report = delete_datasets(
+            expired_guest_datasets(),
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            deadline=deadline,
+        )
+        self.stdout.write(self.style.SUCCESS(str(report)))
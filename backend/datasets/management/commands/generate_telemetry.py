@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from datasets.synthetic import CHUNK_ROWS, WRITERS, SchemaNoise, TelemetryModel
+
+
+class Command(BaseCommand):
+    help = 'Writes synthetic AI4I style telemetry fitted on a real dataset (see datasets/synthetic.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write, .csv or .parquet')
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--format', choices=sorted(WRITERS), help='Default: from the output file extension')
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same data')
+        parser.add_argument('--product-ids', type=int, help='Number of distinct products (default: one per row)')
+        parser.add_argument('--source', help='Dataset to fit (default: data/ai4i2020.csv)')
+        parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+        parser.add_argument('--missing-rate', type=float, default=0.0, help='Share of empty cells')
+        parser.add_argument('--invalid-rate', type=float, default=0.0, help='Share of non-numeric sensor cells')
+        parser.add_argument('--rename', action='store_true', help='Use alternative column names')
+        parser.add_argument('--shuffle', action='store_true', help='Shuffle the column order')
+        parser.add_argument('--extra-columns', type=int, default=0, help='Unrelated columns to add')
+        parser.add_argument('--drop-columns', default='', help='Comma separated columns to leave out')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        file_format = options['format'] or output.rsplit('.', 1)[-1].lower()
+        if file_format not in WRITERS:
+            raise CommandError(f"Unknown format '{file_format}', use --format {' or '.join(sorted(WRITERS))}")
+
+        noise = SchemaNoise(
+            missing_rate=options['missing_rate'],
+            invalid_rate=options['invalid_rate'],
+            rename=options['rename'],
+            shuffle=options['shuffle'],
+            extra_columns=options['extra_columns'],
+            drop_columns=[c for c in options['drop_columns'].split(',') if c],
+        )
+        start = time.perf_counter()
+        model = TelemetryModel.fit(options['source'])
+        try:
+            rows = WRITERS[file_format](
+                output, options['rows'], model=model, seed=options['seed'], product_ids=options['product_ids'],
+                noise=noise, chunk_rows=options['chunk_rows'],
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} rows to {output} in {time.perf_counter() - start:.1f}s"
+        ))
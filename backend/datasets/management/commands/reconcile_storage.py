@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from datasets.storage import reconcile_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes uploaded files without a dataset and rebuilds the per owner storage usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, help='Keep orphaned files younger than this')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+
+    def handle(self, *args, **options):
+        report = reconcile_storage(grace_seconds=options['grace_seconds'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(str(report)))
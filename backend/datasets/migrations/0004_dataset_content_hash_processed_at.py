@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0003_remove_dataset_session_key_dataset_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
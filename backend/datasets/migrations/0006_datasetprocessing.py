@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 16:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0005_dataset_file_size_storageusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetProcessing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('task_id', models.CharField(blank=True, default='', max_length=255)),
+                ('model_version', models.CharField(blank=True, default='', max_length=50)),
+                ('rows', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('bytes_read', models.BigIntegerField(default=0)),
+                ('stages', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='processing', to='datasets.dataset')),
+            ],
+        ),
+    ]
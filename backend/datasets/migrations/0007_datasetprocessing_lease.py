@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0006_datasetprocessing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetprocessing',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='datasetprocessing',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
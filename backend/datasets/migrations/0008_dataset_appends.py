@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0007_datasetprocessing_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='appended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DatasetSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='datasets.dataset')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DatasetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=50)),
+                ('type', models.CharField(blank=True, default='', max_length=20)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('air_temperature_sum', models.FloatField(default=0)),
+                ('air_temperature_count', models.BigIntegerField(default=0)),
+                ('process_temperature_sum', models.FloatField(default=0)),
+                ('process_temperature_count', models.BigIntegerField(default=0)),
+                ('rotational_speed_sum', models.FloatField(default=0)),
+                ('rotational_speed_count', models.BigIntegerField(default=0)),
+                ('torque_sum', models.FloatField(default=0)),
+                ('torque_count', models.BigIntegerField(default=0)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='datasets.dataset')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dataset', 'product_id', 'type'), name='unique_dataset_rollup')],
+            },
+        ),
+    ]
@@ -6,6 +6,91 @@ class Dataset(models.Model):
     session = models.ForeignKey('users.GuestSession', on_delete=models.CASCADE, null=True, blank=True)
     file = models.FileField(upload_to='datasets/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # sha256 of the file, chained over appends
+    file_size = models.BigIntegerField(default=0)  # bytes
+    processed_at = models.DateTimeField(null=True, blank=True)  # set once predictions are stored
+    model_version = models.CharField(max_length=50, blank=True, default='')
+    appended_at = models.DateTimeField(null=True, blank=True)  # last time rows were appended, see datasets.append
 
     def __str__(self):
         return f"Dataset uploaded by {self.user or 'Guest'} on {self.uploaded_at}"
+
+
+
+
+class DatasetProcessing(models.Model):
+    """
+    The latest prediction run of a dataset, with per stage timings.
+
+    Also the lock of the dataset's processing: a run holds it while
+    ``status`` is running and ``lease_expires_at`` is in the future (see
+    ml_model.tasks).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE, related_name='processing')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    task_id = models.CharField(max_length=255, blank=True, default='')
+    model_version = models.CharField(max_length=50, blank=True, default='')
+    rows = models.IntegerField(default=0)  # predictions stored
+    errors = models.IntegerField(default=0)  # rows that could not be scored
+    bytes_read = models.BigIntegerField(default=0)
+    stages = models.JSONField(default=dict, blank=True)  # seconds per stage
+    error = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)  # runs that claimed the dataset
+
+    def __str__(self):
+        return f"Processing of dataset {self.dataset_id}: {self.status}"
+
+class DatasetSummary(models.Model):
+    """Mergeable statistics of a dataset that rows were appended to, see datasets.summary"""
+    dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE, related_name='summary')
+    file_size = models.BigIntegerField(default=0)  # bytes of the file the state covers
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of dataset {self.dataset_id} at {self.file_size} bytes"
+
+
+class DatasetRollup(models.Model):
+    """Rows and sensor sums of one product and type of a dataset, part of its DatasetSummary"""
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='rollups')
+    product_id = models.CharField(max_length=50)
+    type = models.CharField(max_length=20, blank=True, default='')  # '' for rows without a type
+    rows = models.BigIntegerField(default=0)
+    air_temperature_sum = models.FloatField(default=0)
+    air_temperature_count = models.BigIntegerField(default=0)
+    process_temperature_sum = models.FloatField(default=0)
+    process_temperature_count = models.BigIntegerField(default=0)
+    rotational_speed_sum = models.FloatField(default=0)
+    rotational_speed_count = models.BigIntegerField(default=0)
+    torque_sum = models.FloatField(default=0)
+    torque_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'product_id', 'type'], name='unique_dataset_rollup'),
+        ]
+
+
+class StorageUsage(models.Model):
+    """Bytes of uploaded files per user or guest session, see datasets.storage"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='storage_usage')
+    session = models.OneToOneField(
+        'users.GuestSession', on_delete=models.CASCADE, null=True, blank=True, related_name='storage_usage'
+    )
+    bytes = models.BigIntegerField(default=0)
+    files = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user or self.session_id}: {self.bytes} bytes in {self.files} files"
@@ -6,4 +6,24 @@ class IsAuthenticatedOrGuestSession(BasePermission):
         return bool(
             request.user.is_authenticated or
             hasattr(request, 'guest_session')
-        )
\ No newline at end of file
+        )
+
+def owned_datasets(request):
+    """Datasets visible to the user or guest session making the request"""
+    from .models import Dataset
+
+    user = request.user
+    if user and user.is_authenticated:
+        # user may be a TokenUser, so filter on the id
+        return Dataset.objects.filter(user_id=user.pk)
+    guest_session = getattr(request, 'guest_session', None)
+    if guest_session is not None:
+        return Dataset.objects.filter(user__isnull=True, session=guest_session)
+    return Dataset.objects.none()
+
+
+def owner_key(request):
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    guest_session = getattr(request, 'guest_session', None)
+    return f'guest:{guest_session.pk}' if guest_session is not None else 'anonymous'
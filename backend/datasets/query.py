@@ -0,0 +1,343 @@
+"""
+Filtering, sorting and aggregation over the columnar cache of a dataset.
+
+Queries come from request query params::
+
+    ?torque__gte=40&torque__lt=60&type=L&product_id__prefix=L47
+     &columns=Product ID,Torque [Nm]&sort=-tool_wear&offset=0&limit=50
+
+    ?type__in=L,M&group_by=type&agg=mean:torque,max:tool_wear,count
+
+Columns can be referred to by their name in the file or by the keys of
+``COLUMN_MAPPINGS``. Predicates are checked against the min/max statistics
+of every row group first, so groups that cannot match are never read, and
+only the columns a query needs are loaded from the groups that are. Params
+starting with ``_``, such as cache busters, are ignored.
+
+A column that is text in any row group is compared as text throughout: its
+groups stored as numbers are not skipped by their statistics, and their
+values are read as text.
+"""
+import numpy as np
+import pandas as pd
+
+from .columns import find_columns
+
+OPERATORS = ('eq', 'in', 'gt', 'gte', 'lt', 'lte', 'prefix')
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+RESERVED_PARAMS = ('offset', 'limit', 'columns', 'sort', 'group_by', 'agg', 'format')
+
+# Upper bound for strings starting with a given prefix
+MAX_CHAR = '\U0010ffff'
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Predicate:
+    def __init__(self, column, op, value, kind='number'):
+        self.column = column
+        self.op = op
+        self.value = value
+        self.kind = kind
+
+    def may_match(self, stats):
+        """Whether a row group with these column statistics can contain a match"""
+        low, high = stats['min'], stats['max']
+        if low is None:
+            return False
+        if stats['kind'] != self.kind:
+            # Numbers in a text column; their statistics do not compare with text
+            return True
+        if self.op == 'eq':
+            return low <= self.value <= high
+        if self.op == 'in':
+            return any(low <= value <= high for value in self.value)
+        if self.op == 'gt':
+            return high > self.value
+        if self.op == 'gte':
+            return high >= self.value
+        if self.op == 'lt':
+            return low < self.value
+        if self.op == 'lte':
+            return low <= self.value
+        if self.op == 'prefix':
+            return high >= self.value and low <= self.value + MAX_CHAR
+        return True
+
+    def mask(self, values):
+        if self.op == 'eq':
+            return values == self.value
+        if self.op == 'in':
+            return np.isin(values, self.value)
+        if self.op == 'gt':
+            return values > self.value
+        if self.op == 'gte':
+            return values >= self.value
+        if self.op == 'lt':
+            return values < self.value
+        if self.op == 'lte':
+            return values <= self.value
+        if self.op == 'prefix':
+            return np.char.startswith(values, self.value)
+        raise QueryError(f"Unknown operator: {self.op}")
+
+
+class Query:
+    def __init__(self, predicates=None, columns=None, sort=None, descending=False,
+                 offset=0, limit=100, group_by=None, aggregates=None):
+        self.predicates = predicates or []
+        self.columns = columns or []
+        self.sort = sort
+        self.descending = descending
+        self.offset = offset
+        self.limit = limit
+        self.group_by = group_by or []
+        self.aggregates = aggregates or []
+
+    @property
+    def is_aggregate(self):
+        return bool(self.aggregates or self.group_by)
+
+
+def column_kinds(cache):
+    """'string' for columns stored as text in any row group, 'number' otherwise"""
+    kinds = {column: 'number' for column in cache.columns}
+    for group in cache.row_groups:
+        for column, stats in group['stats'].items():
+            if stats['kind'] == 'string':
+                kinds[column] = 'string'
+    return kinds
+
+
+def parse_query(params, cache, max_limit):
+    """Build a ``Query`` from request query params, raising ``QueryError`` on bad input"""
+    aliases = find_columns(cache.columns)
+    kinds = column_kinds(cache)
+
+    def resolve(name):
+        name = name.strip()
+        if name in cache.columns:
+            return name
+        if name in aliases:
+            return aliases[name]
+        raise QueryError(f"Unknown column: {name}")
+
+    def coerce(column, value):
+        if kinds[column] == 'string':
+            return value
+        try:
+            return float(value)
+        except ValueError:
+            raise QueryError(f"Expected a number for {column}, got {value!r}")
+
+    predicates = []
+    for key in params:
+        if key in RESERVED_PARAMS or key.startswith('_'):
+            continue
+        name, _, op = key.rpartition('__') if '__' in key else (key, '', 'eq')
+        if op not in OPERATORS:
+            raise QueryError(f"Unknown operator: {op}")
+        column = resolve(name)
+        if op == 'prefix' and kinds[column] != 'string':
+            raise QueryError(f"prefix only applies to text columns, not {column}")
+        for raw in params.getlist(key):
+            if op == 'in':
+                value = [coerce(column, item) for item in raw.split(',')]
+            else:
+                value = coerce(column, raw)
+            predicates.append(Predicate(column, op, value, kinds[column]))
+
+    try:
+        offset = max(int(params.get('offset', 0)), 0)
+        limit = min(max(int(params.get('limit', 100)), 0), max_limit)
+    except ValueError:
+        raise QueryError("offset and limit must be integers")
+
+    columns = [resolve(c) for c in params.get('columns', '').split(',') if c.strip()] or list(cache.columns)
+
+    sort = params.get('sort') or None
+    descending = bool(sort) and sort.startswith('-')
+    if sort:
+        sort = resolve(sort[1:] if descending else sort)
+
+    group_by = [resolve(c) for c in params.get('group_by', '').split(',') if c.strip()]
+    aggregates = []
+    for item in params.get('agg', '').split(','):
+        if not item.strip():
+            continue
+        func, _, name = item.partition(':')
+        func = func.strip()
+        if func not in AGGREGATES:
+            raise QueryError(f"Unknown aggregate: {func}")
+        if func == 'count':
+            aggregates.append(('count', None))
+            continue
+        column = resolve(name)
+        if kinds[column] == 'string' and func in ('sum', 'mean'):
+            raise QueryError(f"Cannot compute {func} of text column {column}")
+        aggregates.append((func, column))
+
+    return Query(predicates, columns, sort, descending, offset, limit, group_by, aggregates)
+
+
+def _as_text(values):
+    """Numbers as the text they were read from, e.g. 300.0 as '300', and missing values as ''"""
+    series = pd.Series(values)
+    text = series.astype(str)
+    integral = series.notna() & (series % 1 == 0)
+    text[integral] = series[integral].astype(np.int64).astype(str)
+    text[series.isna()] = ''
+    return text.to_numpy(dtype=str)
+
+
+def _read(cache, group, column, kinds):
+    """Values of one column in one row group, as text if the column is text in any group"""
+    values = cache.read_column(group, column)
+    if kinds[column] == 'string' and group['stats'][column]['kind'] != 'string':
+        return _as_text(values)
+    return values
+
+
+def _matching_positions(cache, group, predicates, kinds):
+    """Positions of matching rows in a row group, or None if every row matches"""
+    mask = None
+    for predicate in predicates:
+        matches = predicate.mask(_read(cache, group, predicate.column, kinds))
+        mask = matches if mask is None else mask & matches
+        if not mask.any():
+            break
+    return None if mask is None else np.flatnonzero(mask)
+
+
+def _load(cache, group, columns, positions, kinds):
+    data = {}
+    for column in columns:
+        values = _read(cache, group, column, kinds)
+        data[column] = values[positions] if positions is not None else np.asarray(values)
+    return pd.DataFrame(data)
+
+
+def _records(frame, kinds):
+    frame = frame.astype(object)
+    for column in frame.columns:
+        if kinds.get(column) == 'string':
+            frame[column] = _missing_as_nan(frame[column])
+    return frame.where(frame.notna(), None).to_dict(orient='records')
+
+
+def _missing_as_nan(series):
+    # Text columns store missing values as empty strings
+    return series.replace('', np.nan) if series.dtype == object else series
+
+
+def execute(cache, query):
+    kinds = column_kinds(cache)
+    scanned = skipped = matched = collected = 0
+    to_skip = query.offset
+    frames = []
+    partials = []
+
+    for group in cache.row_groups:
+        if not all(p.may_match(group['stats'][p.column]) for p in query.predicates):
+            skipped += 1
+            continue
+        scanned += 1
+
+        positions = _matching_positions(cache, group, query.predicates, kinds)
+        count = group['rows'] if positions is None else len(positions)
+        if not count:
+            continue
+        matched += count
+        if positions is None and not query.is_aggregate:
+            positions = np.arange(group['rows'])
+
+        if query.is_aggregate:
+            partials.append(_partial_aggregate(cache, group, query, positions, kinds))
+        elif query.sort:
+            # Only the first offset + limit rows of each group can end up on the page
+            keys = pd.DataFrame({
+                'key': _missing_as_nan(pd.Series(_read(cache, group, query.sort, kinds)[positions])),
+                'row': positions,
+            }).sort_values(
+                ['key', 'row'], ascending=[not query.descending, True], na_position='last', kind='stable'
+            ).head(query.offset + query.limit)
+            positions = keys['row'].to_numpy()
+            frame = _load(cache, group, query.columns, positions, kinds)
+            frame['__key'] = keys['key'].to_numpy()
+            frame['__row'] = group['start'] + positions
+            frames.append(frame)
+        elif collected < query.limit:
+            # File order: skip whole groups until the offset is reached, then read the page
+            if to_skip >= count:
+                to_skip -= count
+                continue
+            positions = positions[to_skip:to_skip + query.limit - collected]
+            to_skip = 0
+            frames.append(_load(cache, group, query.columns, positions, kinds))
+            collected += len(positions)
+
+    result = {'count': matched, 'row_groups': {'scanned': scanned, 'skipped': skipped}}
+    if query.is_aggregate:
+        result['groups'] = _finish_aggregate(query, partials)
+        return result
+
+    page = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=query.columns)
+    if query.sort and len(page):
+        page = page.sort_values(
+            ['__key', '__row'], ascending=[not query.descending, True], na_position='last', kind='stable'
+        ).iloc[query.offset:query.offset + query.limit]
+
+    result.update({
+        'offset': query.offset,
+        'limit': query.limit,
+        'columns': query.columns,
+        'rows': _records(page[query.columns], kinds),
+    })
+    return result
+
+
+def _partial_aggregate(cache, group, query, positions, kinds):
+    """Mergeable per row group aggregates: row count and count, sum, min and max of each column"""
+    value_columns = list(dict.fromkeys(c for _, c in query.aggregates if c))
+    frame = _load(cache, group, list(dict.fromkeys(query.group_by + value_columns)), positions, kinds)
+    keys = [_missing_as_nan(frame[c]) for c in query.group_by] or [pd.Series(0, index=frame.index)]
+
+    partial = frame.groupby(keys, sort=False, dropna=False).size().to_frame('__count')
+    for column in value_columns:
+        values = _missing_as_nan(frame[column])
+        grouped = values.groupby(keys, sort=False, dropna=False)
+        partial[f'__n:{column}'] = grouped.count()
+        if values.dtype != object:
+            partial[f'__sum:{column}'] = grouped.sum()
+        partial[f'__min:{column}'] = grouped.min()
+        partial[f'__max:{column}'] = grouped.max()
+    return partial
+
+
+def _finish_aggregate(query, partials):
+    if not partials:
+        return []
+    combined = pd.concat(partials)
+    grouped = combined.groupby(level=list(range(combined.index.nlevels)), sort=True, dropna=False)
+    merged = pd.DataFrame({
+        column: getattr(grouped[column], 'min' if column.startswith('__min:')
+                        else 'max' if column.startswith('__max:') else 'sum')()
+        for column in combined.columns
+    })
+
+    output = pd.DataFrame(index=merged.index)
+    for func, column in query.aggregates:
+        if func == 'count':
+            output['count'] = merged['__count']
+        elif func == 'mean':
+            output[f'mean:{column}'] = merged[f'__sum:{column}'] / merged[f'__n:{column}'].replace(0, np.nan)
+        else:
+            output[f'{func}:{column}'] = merged[f'__{func}:{column}']
+
+    if query.group_by:
+        output.index.names = query.group_by
+        output = output.reset_index()
+    output = output.astype(object)
+    return output.where(output.notna(), None).to_dict(orient='records')
@@ -0,0 +1,212 @@
+"""
+Server-side caching of read responses.
+
+``cache_response(view_name)`` keeps the data of successful GET responses in
+the default cache, keyed by the requesting owner, the view and the full path.
+Each owner also has a generation number in the cache that is part of every
+key. Saving or deleting one of their datasets, predictions or insights bumps
+it (see the receivers below, and ``invalidate_owners`` for bulk writes that
+send no signals), so stale entries are never read again and simply expire.
+
+Hits and misses are counted per view, in the cache so that all workers add up.
+"""
+import time
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .permissions import owner_key
+
+# Headers set by the view (and ``conditional``) that are replayed on a hit
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+CACHED_VIEWS = set()
+
+
+def dataset_owner_key(user_id, session_id):
+    """``owner_key`` of the user or guest session a dataset belongs to"""
+    if user_id is not None:
+        return f'user:{user_id}'
+    return f'guest:{session_id}' if session_id is not None else None
+
+
+def _generation_key(owner):
+    return f'response-generation:{owner}'
+
+
+def _generation(owner):
+    # Start from the clock, so a generation that was evicted never comes back with an old value
+    return cache.get_or_set(_generation_key(owner), time.time_ns(), None)
+
+
+async def _ageneration(owner):
+    return await cache.aget_or_set(_generation_key(owner), time.time_ns(), None)
+
+
+def invalidate_owners(owners):
+    for owner in set(owners):
+        if owner is None:
+            continue
+        try:
+            cache.incr(_generation_key(owner))
+        except ValueError:
+            cache.set(_generation_key(owner), time.time_ns(), None)
+
+
+def invalidate_dataset(dataset):
+    invalidate_owners([dataset_owner_key(dataset.user_id, dataset.session_id)])
+
+
+def _count(view_name, outcome):
+    key = f'response-cache:{outcome}:{view_name}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _acount(view_name, outcome):
+    key = f'response-cache:{outcome}:{view_name}'
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def response_cache_stats():
+    keys = {
+        (view_name, outcome): f'response-cache:{outcome}:{view_name}'
+        for view_name in sorted(CACHED_VIEWS) for outcome in ('hits', 'misses')
+    }
+    counts = cache.get_many(keys.values())
+    stats = {}
+    for (view_name, outcome), key in keys.items():
+        stats.setdefault(view_name, {})[outcome] = counts.get(key, 0)
+    return stats
+
+
+def _plain(data):
+    # ReturnList/ReturnDict hold a reference to their serializer, which should not be pickled
+    if isinstance(data, list):
+        return list(data)
+    if isinstance(data, dict):
+        return dict(data)
+    return data
+
+
+def _cache_key(request, owner, generation, view_name):
+    path_hash = md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'response:{owner}:{generation}:{view_name}:{path_hash}'
+
+
+def _entry(response):
+    """What is cached of a response, or None if it should not be"""
+    if response.status_code != 200:
+        return None
+    headers = {header: response[header] for header in CACHED_HEADERS if header in response}
+    if isinstance(response, Response):
+        return 'data', _plain(response.data), headers
+    if not response.streaming:
+        headers['Content-Type'] = response['Content-Type']
+        return 'content', response.content, headers
+    return None
+
+
+def _replay(request, entry):
+    kind, body, headers = entry
+    response = Response(body, headers=headers) if kind == 'data' else HttpResponse(body, headers=headers)
+    response = get_conditional_response(
+        request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+        response=response,
+    )
+    for header, value in headers.items():
+        response.headers.setdefault(header, value)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def _cacheable(request, owner):
+    return request.method in ('GET', 'HEAD') and owner != 'anonymous' and settings.RESPONSE_CACHE_TTL
+
+
+def cache_response(view_name):
+    """Cache 200 responses of a DRF handler or an async view, per owner, view and full path"""
+    CACHED_VIEWS.add(view_name)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                owner = owner_key(request)
+                if not _cacheable(request, owner):
+                    return await view(request, *args, **kwargs)
+                key = _cache_key(request, owner, await _ageneration(owner), view_name)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    await _acount(view_name, 'hits')
+                    return _replay(request, cached)
+
+                await _acount(view_name, 'misses')
+                response = await view(request, *args, **kwargs)
+                entry = _entry(response)
+                if entry is not None:
+                    await cache.aset(key, entry, settings.RESPONSE_CACHE_TTL)
+                    response['X-Cache'] = 'MISS'
+                return response
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            owner = owner_key(request)
+            if not _cacheable(request, owner):
+                return view(request, *args, **kwargs)
+            key = _cache_key(request, owner, _generation(owner), view_name)
+            cached = cache.get(key)
+            if cached is not None:
+                _count(view_name, 'hits')
+                return _replay(request, cached)
+
+            _count(view_name, 'misses')
+            response = view(request, *args, **kwargs)
+            entry = _entry(response)
+            if entry is not None:
+                cache.set(key, entry, settings.RESPONSE_CACHE_TTL)
+                response['X-Cache'] = 'MISS'
+            return response
+        return inner
+    return decorator
+
+
+def _dataset_owner(instance):
+    # Predictions are created with their dataset at hand, so this rarely needs a query
+    if type(instance).dataset.is_cached(instance):
+        dataset = instance.dataset
+        return dataset_owner_key(dataset.user_id, dataset.session_id)
+    from .models import Dataset
+
+    owner = Dataset.objects.filter(pk=instance.dataset_id).values_list('user_id', 'session_id').first()
+    return dataset_owner_key(*owner) if owner else None
+
+
+@receiver([post_save, post_delete], sender='datasets.Dataset')
+def invalidate_dataset_owner(sender, instance, **kwargs):
+    invalidate_dataset(instance)
+
+
+@receiver([post_save, post_delete], sender='predictions.Prediction')
+@receiver([post_save, post_delete], sender='insights.Insight')
+def invalidate_related_owner(sender, instance, **kwargs):
+    invalidate_owners([_dataset_owner(instance)])
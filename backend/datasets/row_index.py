@@ -0,0 +1,268 @@
+import fcntl
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from hashlib import md5
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+READ_CHUNK_SIZE = 8 * 1024 * 1024
+SORT_CHUNK_ROWS = 1_000_000
+
+
+def dataset_cache_dir(dataset_id):
+    """Directory holding the derived files (row index, sort orders) of a dataset"""
+    return Path(settings.DATASET_CACHE_ROOT) / str(dataset_id)
+
+
+def clear_dataset_cache(dataset_id):
+    shutil.rmtree(dataset_cache_dir(dataset_id), ignore_errors=True)
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on a dataset file. Appends hold it from growing the file
+    until its derived files cover the new rows, and builds hold it while
+    they index the file, so a build never takes an append half done.
+    """
+    with open(path, 'rb') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _row_starts(f, begin):
+    """Start of every line of ``f`` from ``begin``, itself the start of a line, to the end of the file"""
+    f.seek(begin)
+    position = begin
+    chunks = []
+    while True:
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n'))
+        chunks.append(newlines + position + 1)
+        position += len(chunk)
+
+    starts = np.concatenate([[begin]] + chunks).astype('<i8')
+    # The last newline of the file does not start a row
+    starts = starts[starts < position]
+    if not len(starts):
+        return starts
+
+    # Neither do blank lines, which pandas skips
+    data = np.memmap(f, dtype=np.uint8, mode='r')
+    first = data[starts]
+    second = data[np.minimum(starts + 1, len(data) - 1)]
+    blank = (first == ord('\n')) | ((first == ord('\r')) & (second == ord('\n')))
+    return starts[~blank]
+
+
+def _write_atomic(path, write):
+    """Write ``path`` through a temporary file renamed into place, so readers never see it half written"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _map_offsets(path):
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype='<i8')
+    return np.memmap(path, dtype='<i8', mode='r')
+
+
+def read_byte_range(path, begin, end):
+    """The rows in bytes ``begin`` to ``end`` of a CSV file, which must be row boundaries"""
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        f.seek(begin)
+        body = f.read(end - begin)
+    return pd.read_csv(io.BytesIO(header_line.rstrip(b'\r\n') + b'\n' + body))
+
+
+class RowIndex:
+    """
+    Byte offset of every data row of a CSV file.
+
+    The offsets are stored as a flat file of little-endian int64 in the
+    dataset cache directory and memory-mapped on load, so reading a page of
+    rows only touches the bytes of that page, and rows appended to the file
+    only add their own offsets (see ``extend``). Rows are assumed to be
+    newline terminated, i.e. quoted fields must not contain line breaks,
+    and blank lines are skipped, as pandas does.
+    """
+
+    def __init__(self, path, offsets, header, cache_dir):
+        self.path = str(path)
+        self.offsets = offsets
+        self.header = header
+        self.cache_dir = Path(cache_dir)
+        self.file_size = os.path.getsize(self.path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        return cls.load_or_build(dataset.file.path, dataset_cache_dir(dataset.id))
+
+    @staticmethod
+    def _meta(cache_dir):
+        if not (cache_dir / 'rows.bin').exists():
+            return None
+        try:
+            with open(cache_dir / 'rows.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write_meta(cache_dir, stat, header):
+        meta = {'size': stat.st_size, 'mtime': stat.st_mtime, 'header': header}
+        _write_atomic(cache_dir / 'rows.json', lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+    @classmethod
+    def load(cls, path, cache_dir):
+        """The index of ``path`` kept in ``cache_dir``, or None if there is none or the file changed since"""
+        cache_dir = Path(cache_dir)
+        meta = cls._meta(cache_dir)
+        stat = os.stat(path)
+        if meta is None or meta['size'] != stat.st_size or meta['mtime'] != stat.st_mtime:
+            return None
+        return cls(path, _map_offsets(cache_dir / 'rows.bin'), meta['header'], cache_dir)
+
+    @classmethod
+    def load_or_build(cls, path, cache_dir):
+        cache_dir = Path(cache_dir)
+        index = cls.load(path, cache_dir)
+        if index is not None:
+            return index
+
+        with file_lock(path):
+            # An append may have extended the index while we waited
+            index = cls.load(path, cache_dir)
+            if index is not None:
+                return index
+            if cls._meta(cache_dir) is not None:
+                # The file changed underneath us, so every derived file is stale
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                header_line = f.readline()
+                offsets = _row_starts(f, len(header_line))
+            header = header_line.decode('utf-8-sig').rstrip('\r\n')
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(cache_dir / 'rows.bin', offsets.tofile)
+            cls._write_meta(cache_dir, stat, header)
+        return cls(path, _map_offsets(cache_dir / 'rows.bin'), header, cache_dir)
+
+    def extend(self, begin):
+        """
+        Index the rows appended to the file from byte ``begin`` on. The sort
+        orders do not cover those rows, so they are dropped and rebuilt when
+        next asked for. The caller holds the ``file_lock`` of the file from
+        before it grew, or a concurrent build could index the new rows first.
+        """
+        stat = os.stat(self.path)
+        with open(self.path, 'rb') as f:
+            starts = _row_starts(f, begin)
+        with open(self.cache_dir / 'rows.bin', 'ab') as f:
+            starts.tofile(f)
+        for order_path in self.cache_dir.glob('sort_*.npy'):
+            order_path.unlink(missing_ok=True)
+        self._write_meta(self.cache_dir, stat, self.header)
+        self.offsets = _map_offsets(self.cache_dir / 'rows.bin')
+        self.file_size = stat.st_size
+
+    @property
+    def columns(self):
+        return list(pd.read_csv(io.StringIO(self.header), nrows=0).columns)
+
+    def _frame(self, body, columns=None):
+        buffer = io.BytesIO(self.header.encode('utf-8') + b'\n' + body)
+        return pd.read_csv(buffer, usecols=columns)
+
+    def read_range(self, start, stop, columns=None):
+        """Rows ``start`` (inclusive) to ``stop`` (exclusive) in file order"""
+        start = max(0, min(start, len(self)))
+        stop = max(start, min(stop, len(self)))
+        if start == stop:
+            return self._frame(b'', columns)
+
+        begin = int(self.offsets[start])
+        end = int(self.offsets[stop]) if stop < len(self) else self.file_size
+        with open(self.path, 'rb') as f:
+            f.seek(begin)
+            body = f.read(end - begin)
+        return self._frame(body, columns)
+
+    def read_positions(self, positions, columns=None):
+        """Rows at arbitrary positions, returned in the order given"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return self._frame(b'', columns)
+
+        parts = []
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for position in positions:
+                end = self.offsets[position + 1] if position + 1 < len(self) else self.file_size
+                line = mm[int(self.offsets[position]):int(end)]
+                parts.append(line if line.endswith(b'\n') else line + b'\n')
+        return self._frame(b''.join(parts), columns)
+
+    def sort_order(self, column, descending=False):
+        """
+        Row positions ordered by ``column``, cached on disk after the first
+        call. Numbers compare as numbers and come before text (after it when
+        descending), missing values come last in both directions and equal
+        values keep their row order, as in ``datasets.query``.
+        """
+        # Keyed by the row count too, so an order sorted by a reader that
+        # still had the index from before an append is never used after it
+        key = md5(column.encode('utf-8')).hexdigest()[:16]
+        direction = 'desc' if descending else 'asc'
+        order_path = self.cache_dir / f'sort_{key}_{direction}_{len(self)}.npy'
+        if order_path.exists():
+            return np.load(order_path, mmap_mode='r')
+
+        # Read through the index, so positions are the ones the offsets give
+        values = pd.concat([
+            self.read_range(start, start + SORT_CHUNK_ROWS, columns=[column])[column]
+            for start in range(0, max(len(self), 1), SORT_CHUNK_ROWS)
+        ], ignore_index=True)
+        # Chunks may parse as numbers or as text, so compare the numeric
+        # values as numbers and only the rest as text
+        numbers = pd.to_numeric(values, errors='coerce')
+        missing = values.isna()
+        text = ~missing & numbers.isna()
+        keys = pd.DataFrame({
+            'missing': missing,
+            'text': text,
+            'number': numbers,
+            'string': values.where(text, '').astype(str),
+            'row': np.arange(len(values)),
+        })
+        ascending = not descending
+        order = keys.sort_values(
+            ['missing', 'text', 'number', 'string', 'row'],
+            ascending=[True, ascending, ascending, ascending, True], kind='stable',
+        )['row'].to_numpy(dtype=np.int64)
+        _write_atomic(order_path, lambda f: np.save(f, order))
+        return np.load(order_path, mmap_mode='r')
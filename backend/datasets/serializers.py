@@ -1,16 +1,18 @@
-import csv
-import io
+import hashlib
+from django.urls import reverse
 from rest_framework import serializers
+from monitoring.serializers import TimedListSerializer, TimedSerializerMixin
 from .models import Dataset
 import pandas as pd
 
-class DatasetSerializer(serializers.ModelSerializer):
+class DatasetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Dataset
         fields = '__all__'
-        read_only_fields = ['uploaded_at', 'user', 'session']
+        list_serializer_class = TimedListSerializer
+        read_only_fields = ['uploaded_at', 'user', 'session', 'content_hash', 'file_size', 'processed_at', 'model_version', 'appended_at']
 
     def get_file_url(self, obj):
         request = self.context.get('request')
@@ -34,6 +36,14 @@ class DatasetSerializer(serializers.ModelSerializer):
         
         return value
 
+    def create(self, validated_data):
+        content_hash = hashlib.sha256()
+        for chunk in validated_data['file'].chunks():
+            content_hash.update(chunk)
+        validated_data['content_hash'] = content_hash.hexdigest()
+        validated_data['file_size'] = validated_data['file'].size
+        return super().create(validated_data)
+
     def to_representation(self, instance):  #warning response with missing headers
         rep = super().to_representation(instance)
         missing = getattr(self, 'missing_headers', [])
@@ -44,11 +54,11 @@ class DatasetSerializer(serializers.ModelSerializer):
 
 class DatasetWithDataSerializer(serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
-    csv_data = serializers.SerializerMethodField()
+    rows_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Dataset
-        fields = ['id', 'file', 'file_url', 'uploaded_at', 'csv_data']
+        fields = ['id', 'file', 'file_url', 'rows_url', 'uploaded_at']
 
     def get_file_url(self, obj):
         request = self.context.get('request')
@@ -56,10 +66,9 @@ class DatasetWithDataSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
-    def get_csv_data(self, obj):
-        try:
-            df = pd.read_csv(obj.file.path) # Limit rows for preview
-            return df.to_dict(orient='records')
-        except:
-            print("Error reading csv data")
-        return None
\ No newline at end of file
+    def get_rows_url(self, obj):
+        # Row data is served page by page from the rows endpoint
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(reverse('dataset-rows', args=[obj.pk]))
+        return None
@@ -0,0 +1,162 @@
+import numpy as np
+
+from .columns import find_columns
+
+
+def dataset_statistics(df, file_size):
+    """Summary statistics and chart data of a dataset, as returned by the stats endpoint"""
+    # Basic dataset info
+    basic_stats = {
+        'rows': len(df),
+        'columns': len(df.columns),
+        'file_size': file_size,
+    }
+    
+    # Find actual column names in the dataframe
+    found_columns = find_columns(df.columns)
+    
+    # Calculate statistics based on found columns
+    stats = {}
+    
+    # Get machine counts
+    if 'machine_id' in found_columns:
+        stats['machineCount'] = df[found_columns['machine_id']].nunique()
+    else:
+        stats['machineCount'] = 'N/A'
+        
+    # Get type counts if type column exists
+    if 'type' in found_columns:
+        stats['type_counts'] = df[found_columns['type']].value_counts().to_dict()
+        
+        # Get counts by product ID and type if both exist
+        if 'product_id' in found_columns:
+            type_product_counts = df.groupby([found_columns['type'], found_columns['product_id']]).size().unstack(fill_value=0)
+            stats['type_product_counts'] = {
+                type_name: type_group.to_dict() 
+                for type_name, type_group in type_product_counts.iterrows()
+            }
+    
+    # Calculate averages for numerical columns
+    numerical_stats = {}
+    for stat_name, column_key in [
+        ('avgAirTemperature', 'air_temperature'),
+        ('avgProcessTemperature', 'process_temperature'),
+        ('avgTorque', 'torque'),
+        ('avgToolWear', 'tool_wear'),
+        ('avgRotationalSpeed', 'rotational_speed')
+    ]:
+        if column_key in found_columns:
+            try:
+                numerical_stats[stat_name] = round(df[found_columns[column_key]].mean(), 2)
+            except:
+                numerical_stats[stat_name] = 'N/A'
+        else:
+            numerical_stats[stat_name] = 'N/A'
+            
+    stats.update(numerical_stats)
+    
+    # Create histograms for key numerical columns
+    if 'air_temperature' in found_columns:
+        try:
+            hist_air, bins_air = np.histogram(df[found_columns['air_temperature']].dropna(), bins=10)
+            stats['air_temp_histogram'] = {
+                'counts': hist_air.tolist(),
+                'bins': [round(x, 2) for x in bins_air.tolist()]
+            }
+        except:
+            pass
+            
+    if 'process_temperature' in found_columns:
+        try:
+            hist_process, bins_process = np.histogram(df[found_columns['process_temperature']].dropna(), bins=10)
+            stats['process_temp_histogram'] = {
+                'counts': hist_process.tolist(),
+                'bins': [round(x, 2) for x in bins_process.tolist()]
+            }
+        except:
+            pass
+
+    # Add new aggregated data for scatter plots
+    
+    # 1. Rotational speed vs torque by product
+    if 'rotational_speed' in found_columns and 'torque' in found_columns:
+        try:
+            speed_torque_df = df.groupby(found_columns['product_id']).agg({
+                found_columns['rotational_speed']: 'mean',
+                found_columns['torque']: 'mean'
+            }).reset_index()
+            
+            stats['speed_torque_data'] = speed_torque_df.to_dict(orient='records')
+        except:
+            pass
+    
+    # 2. Air temp vs process temp by product ID and type
+    if all(key in found_columns for key in ['air_temperature', 'process_temperature', 'product_id', 'type']):
+        try:
+            temp_by_product_type = df.groupby([found_columns['product_id'], found_columns['type']]).agg({
+                found_columns['air_temperature']: 'sum',
+                found_columns['process_temperature']: 'sum'
+            }).reset_index()
+            
+            # Rename columns for clarity in the frontend
+            temp_by_product_type = temp_by_product_type.rename(columns={
+                found_columns['product_id']: 'product_id',
+                found_columns['type']: 'type',
+                found_columns['air_temperature']: 'air_temp_sum',
+                found_columns['process_temperature']: 'process_temp_sum'
+            })
+            
+            stats['temp_by_product_type'] = temp_by_product_type.to_dict(orient='records')
+        except Exception as e:
+            print(f"Error creating temp_by_product_type: {str(e)}")
+            pass
+    
+    # 3. Process temp vs rotational speed by product ID and type
+    if all(key in found_columns for key in ['process_temperature', 'rotational_speed', 'product_id', 'type']):
+        try:
+            process_speed_by_product_type = df.groupby([found_columns['product_id'], found_columns['type']]).agg({
+                found_columns['process_temperature']: 'sum',
+                found_columns['rotational_speed']: 'sum'
+            }).reset_index()
+            
+            # Rename columns for clarity in the frontend
+            process_speed_by_product_type = process_speed_by_product_type.rename(columns={
+                found_columns['product_id']: 'product_id',
+                found_columns['type']: 'type',
+                found_columns['process_temperature']: 'process_temp_sum',
+                found_columns['rotational_speed']: 'rotational_speed_sum'
+            })
+            
+            stats['process_speed_by_product_type'] = process_speed_by_product_type.to_dict(orient='records')
+        except Exception as e:
+            print(f"Error creating process_speed_by_product_type: {str(e)}")
+            pass
+
+    # Speed and torque by product ID and type
+    if all(key in found_columns for key in ['rotational_speed', 'torque', 'product_id', 'type']):
+        try:
+            speed_torque_by_product_type = df.groupby([found_columns['product_id'], found_columns['type']]).agg({
+                found_columns['rotational_speed']: 'sum',
+                found_columns['torque']: 'sum'
+            }).reset_index()
+            
+            # Rename columns for clarity in the frontend
+            speed_torque_by_product_type = speed_torque_by_product_type.rename(columns={
+                found_columns['product_id']: 'product_id',
+                found_columns['type']: 'type',
+                found_columns['rotational_speed']: 'rotational_speed_sum',
+                found_columns['torque']: 'torque_sum'
+            })
+            
+            stats['speed_torque_by_product_type'] = speed_torque_by_product_type.to_dict(orient='records')
+        except Exception as e:
+            print(f"Error creating speed_torque_by_product_type: {str(e)}")
+            pass
+            
+    # Combine all statistics
+    result = {
+        **basic_stats,
+        **stats
+    }
+
+    return result
@@ -0,0 +1,214 @@
+"""
+Disk usage accounting and orphaned file collection for uploads.
+
+Every user and guest session has a ``StorageUsage`` row with the bytes and
+number of files it has uploaded. Uploads and deletes adjust it with a single
+UPDATE, so the quota check on upload is one primary key lookup.
+
+``reconcile_storage`` brings disk and database back in line. It streams
+``MEDIA_ROOT/datasets`` and the dataset cache directory with ``os.scandir``,
+compares the entries against the file names and ids in the database, deletes
+the orphans older than the grace period (younger ones may belong to an upload
+that has not committed yet) and corrects the sizes recorded for the files
+found. The counters are then recounted from the datasets in one transaction
+that holds their rows, so uploads and appends made during the scan are
+neither lost nor counted twice.
+"""
+import os
+import shutil
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Dataset, StorageUsage
+
+UPLOAD_DIR = 'datasets'
+SCAN_BATCH_SIZE = 5000
+
+
+def disk_usage(path):
+    """Size of a file, or of all files below a directory, in bytes"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _owner(user_id=None, session_id=None):
+    return {'user_id': user_id} if user_id is not None else {'session_id': session_id}
+
+
+def record_usage(size, files=1, user_id=None, session_id=None):
+    """Add ``size`` bytes and ``files`` files to an owner's usage, negative values to subtract"""
+    if user_id is None and session_id is None:
+        return
+    owner = _owner(user_id, session_id)
+    changes = {'bytes': F('bytes') + size, 'files': F('files') + files}
+    if not StorageUsage.objects.filter(**owner).update(**changes) and size > 0:
+        StorageUsage.objects.get_or_create(**owner)
+        StorageUsage.objects.filter(**owner).update(**changes)
+
+
+def storage_used(user_id=None, session_id=None):
+    used = StorageUsage.objects.filter(**_owner(user_id, session_id)).values_list('bytes', flat=True).first()
+    return used or 0
+
+
+def check_quota(request, size):
+    """An error message if uploading ``size`` more bytes would exceed the requester's quota, else None"""
+    if request.user and request.user.is_authenticated:
+        quota, owner = settings.USER_STORAGE_QUOTA, {'user_id': request.user.pk}
+    elif getattr(request, 'guest_session', None) is not None:
+        quota, owner = settings.GUEST_STORAGE_QUOTA, {'session_id': request.guest_session.pk}
+    else:
+        return None
+    if quota is None:
+        return None
+    used = storage_used(**owner)
+    if used + size > quota:
+        return f"Storage quota exceeded: {used} of {quota} bytes used, the file needs {size} more."
+    return None
+
+
+class StorageReport:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.orphaned_files = 0
+        self.orphaned_cache_dirs = 0
+        self.reclaimed_bytes = 0
+        self.missing_files = 0
+        self.owners = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        return (
+            f"{self.files} files ({self.bytes} bytes) for {self.owners} owners; "
+            f"removed {self.orphaned_files} orphaned files and {self.orphaned_cache_dirs} cache directories "
+            f"({self.reclaimed_bytes} bytes); {self.missing_files} datasets have no file"
+        )
+
+
+def _scan(path):
+    try:
+        with os.scandir(path) as entries:
+            yield from entries
+    except FileNotFoundError:
+        return
+
+
+def _collect_orphan_files(known, cutoff, report, dry_run):
+    """Sizes of the known upload files; unknown files older than ``cutoff`` are deleted"""
+    sizes = {}
+    for entry in _scan(os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)):
+        if not entry.is_file():
+            continue
+        name = f'{UPLOAD_DIR}/{entry.name}'
+        stat = entry.stat()
+        if name in known:
+            sizes[name] = stat.st_size
+        elif stat.st_mtime < cutoff:
+            report.orphaned_files += 1
+            report.reclaimed_bytes += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+    return sizes
+
+
+def _collect_orphan_cache_dirs(dataset_ids, cutoff, report, dry_run):
+    for entry in _scan(settings.DATASET_CACHE_ROOT):
+        if not entry.is_dir() or not entry.name.isdigit() or int(entry.name) in dataset_ids:
+            continue
+        if entry.stat().st_mtime < cutoff:
+            report.orphaned_cache_dirs += 1
+            report.reclaimed_bytes += disk_usage(entry.path)
+            if not dry_run:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def reconcile_storage(grace_seconds=None, dry_run=False):
+    grace_seconds = settings.STORAGE_ORPHAN_GRACE if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+    report = StorageReport()
+
+    # Read the database first: anything written to disk after this is younger than the cutoff
+    known, dataset_ids = set(), set()
+    for pk, name in Dataset.objects.values_list('pk', 'file').iterator(chunk_size=SCAN_BATCH_SIZE):
+        dataset_ids.add(pk)
+        if name:
+            known.add(name)
+
+    sizes = _collect_orphan_files(known, cutoff, report, dry_run)
+    _collect_orphan_cache_dirs(dataset_ids, cutoff, report, dry_run)
+
+    usage = defaultdict(lambda: [0, 0])
+    stale = []
+    datasets = Dataset.objects.only('pk', 'file', 'file_size', 'user_id', 'session_id')
+    for dataset in datasets.iterator(chunk_size=SCAN_BATCH_SIZE):
+        size = sizes.get(dataset.file.name)
+        if size is None:
+            report.missing_files += 1
+            size = 0
+        else:
+            report.files += 1
+            report.bytes += size
+        if dataset.file_size != size:
+            stale.append((dataset.pk, dataset.file_size, size))
+        if dataset.user_id is not None or dataset.session_id is not None:
+            totals = usage[(dataset.user_id, dataset.session_id if dataset.user_id is None else None)]
+            totals[0] += size
+            totals[1] += size > 0
+    report.owners = len(usage)
+
+    if not dry_run:
+        _apply_corrections(stale)
+    return report
+
+
+def _apply_corrections(stale):
+    """
+    Store the file sizes found for ``stale`` ``(pk, scanned size, size on
+    disk)`` datasets and recount every owner's usage from the datasets.
+    """
+    with transaction.atomic():
+        for pk, scanned, size in stale:
+            # Unless an append changed the size since the scan
+            Dataset.objects.filter(pk=pk, file_size=scanned).update(file_size=size)
+
+        # Holding the counters makes record_usage wait: an upload or append
+        # that has not committed yet is not in the totals, and adds to them after
+        counters = {(row.user_id, row.session_id): row for row in StorageUsage.objects.select_for_update()}
+        totals = defaultdict(lambda: [0, 0])
+        owned = Dataset.objects.filter(Q(user__isnull=False) | Q(session__isnull=False))
+        for row in owned.values('user_id', 'session_id').annotate(
+            size=Sum('file_size'), files=Count('pk', filter=Q(file_size__gt=0)),
+        ):
+            owner = (row['user_id'], row['session_id'] if row['user_id'] is None else None)
+            totals[owner][0] += row['size']
+            totals[owner][1] += row['files']
+
+        changed = []
+        for owner, counter in counters.items():
+            size, files = totals.pop(owner, (0, 0))
+            if (counter.bytes, counter.files) != (size, files):
+                counter.bytes, counter.files = size, files
+                changed.append(counter)
+        StorageUsage.objects.bulk_update(changed, ['bytes', 'files'], batch_size=SCAN_BATCH_SIZE)
+        StorageUsage.objects.bulk_create(
+            [
+                StorageUsage(user_id=user_id, session_id=session_id, bytes=size, files=files)
+                for (user_id, session_id), (size, files) in totals.items()
+            ],
+            batch_size=SCAN_BATCH_SIZE,
+        )
@@ -0,0 +1,347 @@
+"""
+Mergeable statistics of a dataset, for datasets that grow by appends.
+
+``dataset_statistics`` summarizes a whole frame at once. ``StatsSummary``
+keeps what those statistics are derived from in a form two summaries can be
+added up in:
+
+- row count, and sum and count of every sensor column;
+- rows per type;
+- the count of every distinct air and process temperature (rounded to
+  ``HISTOGRAM_DECIMALS``), to bin the histograms from;
+- a HyperLogLog sketch of the machine ids;
+- rollups per product and type: rows, and sum and count of the sensors
+  that the charts use (``GROUP_SUMS``).
+
+Everything but the rollups is small and stored as JSON in
+``DatasetSummary``. There can be a rollup per row (every AI4I row is its
+own product), so the rollups are rows of ``DatasetRollup``, and an append
+updates just the rollups its rows fall into. Appending rows therefore costs
+a summary of the new rows and a merge, in proportion to the new rows, not a
+pass over the whole file.
+
+``statistics`` returns what ``dataset_statistics`` returns for the same
+rows, except that the machine count is an estimate, typically within 1%,
+and product ids and types come back as text.
+"""
+import base64
+import math
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .columns import find_columns
+from .models import DatasetRollup, DatasetSummary
+
+HISTOGRAM_DECIMALS = 2
+HLL_PRECISION = 14
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+NUMERIC_STATS = [
+    ('avgAirTemperature', 'air_temperature'),
+    ('avgProcessTemperature', 'process_temperature'),
+    ('avgTorque', 'torque'),
+    ('avgToolWear', 'tool_wear'),
+    ('avgRotationalSpeed', 'rotational_speed'),
+]
+HISTOGRAMS = [('air_temp_histogram', 'air_temperature'), ('process_temp_histogram', 'process_temperature')]
+GROUP_SUMS = ['air_temperature', 'process_temperature', 'rotational_speed', 'torque']
+# Values of a rollup, in DatasetRollup field names: rows, then sum and count of each of GROUP_SUMS
+ROLLUP_FIELDS = ['rows'] + [f'{key}_{part}' for key in GROUP_SUMS for part in ('sum', 'count')]
+# Rollups per product and type: (statistic, [(column key, name in the records)])
+PRODUCT_TYPE_ROLLUPS = [
+    ('temp_by_product_type', [('air_temperature', 'air_temp_sum'), ('process_temperature', 'process_temp_sum')]),
+    ('process_speed_by_product_type', [
+        ('process_temperature', 'process_temp_sum'), ('rotational_speed', 'rotational_speed_sum'),
+    ]),
+    ('speed_torque_by_product_type', [('rotational_speed', 'rotational_speed_sum'), ('torque', 'torque_sum')]),
+]
+# Type of the rollups of rows without a type (or of datasets without a type column)
+NO_TYPE = ''
+
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _sorted(keys):
+    try:
+        return sorted(keys)
+    except TypeError:  # mixed types, e.g. numeric and text values
+        return sorted(keys, key=str)
+
+
+def _add(target, source):
+    """Add the value lists of ``source`` into ``target`` key by key"""
+    for key, values in source.items():
+        current = target.get(key)
+        target[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+
+def _position(field):
+    return ROLLUP_FIELDS.index(field)
+
+
+def sketch(series):
+    """HyperLogLog registers of the distinct non-null values of ``series``"""
+    values = series.dropna()
+    # Hash numbers as floats, so 5 and 5.0 (an integer column with gaps) are the same value
+    values = values.astype('float64') if _is_numeric(values) else values.astype(str)
+    registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    if not len(values):
+        return registers
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    bits = 64 - HLL_PRECISION
+    rest = hashes & np.uint64((1 << bits) - 1)
+    # Position of the first 1 bit of what remains after the register index
+    rank = np.full(len(rest), bits + 1, dtype=np.uint8)
+    nonzero = rest > 0
+    _, exponent = np.frexp(rest[nonzero].astype(np.float64))
+    rank[nonzero] = bits + 1 - exponent
+    np.maximum.at(registers, (hashes >> np.uint64(bits)).astype(np.intp), rank)
+    return registers
+
+
+def estimate(registers):
+    """Distinct count of a HyperLogLog sketch, by linear counting while most registers are empty"""
+    m = len(registers)
+    zeros = int((registers == 0).sum())
+    raw = 0.7213 / (1 + 1.079 / m) * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int64))))
+    if raw <= 2.5 * m and zeros:
+        return int(round(m * math.log(m / zeros)))
+    return int(round(raw))
+
+
+class StatsSummary:
+    def __init__(self, columns, found):
+        self.columns = list(columns)
+        self.found = found
+        self.rows = 0
+        self.invalid = set()  # column keys that did not parse as numbers somewhere
+        self.sums = {}  # key: [sum, count]
+        self.types = {}  # type: [rows]
+        self.values = {}  # histogram key: {rounded value: [count]}
+        self.machines = None
+        self.groups = {}  # (product, type): values of ROLLUP_FIELDS
+
+    @classmethod
+    def from_frame(cls, df):
+        found = find_columns(df.columns)
+        summary = cls(df.columns, found)
+        summary.rows = len(df)
+        numeric = {}
+        for _, key in NUMERIC_STATS:
+            if key in found:
+                if _is_numeric(df[found[key]]):
+                    numeric[key] = df[found[key]]
+                else:
+                    summary.invalid.add(key)
+        for key, series in numeric.items():
+            summary.sums[key] = [float(series.sum()), int(series.count())]
+        for _, key in HISTOGRAMS:
+            if key in numeric:
+                counts = numeric[key].dropna().round(HISTOGRAM_DECIMALS).value_counts(sort=False)
+                summary.values[key] = {value: [count] for value, count in zip(counts.index.tolist(), counts.tolist())}
+        if 'machine_id' in found:
+            summary.machines = sketch(df[found['machine_id']])
+        if 'type' in found:
+            counts = df[found['type']].value_counts(sort=False)
+            summary.types = {value: [count] for value, count in zip(counts.index.tolist(), counts.tolist())}
+        if 'product_id' in found:
+            summary.groups = cls._rollups(df, found, numeric)
+        return summary
+
+    @staticmethod
+    def _rollups(df, found, numeric):
+        """ROLLUP_FIELDS per (product, type), with 0 for the sensors that are missing or not numeric"""
+        products = df[found['product_id']]
+        frame = pd.DataFrame({'product': products.astype(str).where(products.notna()), 'rows': 1})
+        if 'type' in found:
+            types = df[found['type']]
+            frame['type'] = types.astype(str).where(types.notna(), NO_TYPE)
+        else:
+            frame['type'] = NO_TYPE
+        for key in GROUP_SUMS:
+            frame[f'{key}_sum'] = numeric[key] if key in numeric else 0.0
+            frame[f'{key}_count'] = numeric[key].notna() if key in numeric else 0
+        grouped = frame.groupby(['product', 'type'])[ROLLUP_FIELDS].sum()
+        return dict(zip(grouped.index.tolist(), grouped.to_numpy(dtype=np.float64).tolist()))
+
+    def merge(self, other):
+        """Add the rows of ``other``, a summary of rows with the same columns"""
+        self.rows += other.rows
+        self.invalid |= other.invalid
+        for target, source in [(self.sums, other.sums), (self.types, other.types), (self.groups, other.groups)]:
+            _add(target, source)
+        for key, values in other.values.items():
+            _add(self.values.setdefault(key, {}), values)
+        if other.machines is not None:
+            self.machines = other.machines if self.machines is None else np.maximum(self.machines, other.machines)
+        return self
+
+    def _valid(self, key):
+        return key in self.found and key not in self.invalid
+
+    def statistics(self, file_size):
+        """The statistics ``dataset_statistics`` returns, from the summary"""
+        found = self.found
+        stats = {'machineCount': estimate(self.machines) if self.machines is not None else 'N/A'}
+        typed = {key: values for key, values in self.groups.items() if key[1] != NO_TYPE}
+
+        if 'type' in found:
+            stats['type_counts'] = {value: count for value, (count,) in
+                                    sorted(self.types.items(), key=lambda item: -item[1][0])}
+            if 'product_id' in found:
+                products = _sorted({product for product, _ in typed})
+                rows = _position('rows')
+                stats['type_product_counts'] = {
+                    type_name: {
+                        product: int(typed[(product, type_name)][rows]) if (product, type_name) in typed else 0
+                        for product in products
+                    }
+                    for type_name in _sorted({type_name for _, type_name in typed})
+                }
+
+        for stat_name, key in NUMERIC_STATS:
+            if self._valid(key):
+                total, count = self.sums.get(key, [0.0, 0])
+                stats[stat_name] = round(total / count, 2) if count else float('nan')
+            else:
+                stats[stat_name] = 'N/A'
+
+        for stat_name, key in HISTOGRAMS:
+            if self._valid(key):
+                values = self.values.get(key, {})
+                counts, bins = np.histogram(
+                    np.fromiter(values.keys(), dtype=np.float64, count=len(values)), bins=10,
+                    weights=np.fromiter((count for count, in values.values()), dtype=np.float64, count=len(values)),
+                )
+                stats[stat_name] = {
+                    'counts': counts.astype(np.int64).tolist(),
+                    'bins': [round(x, 2) for x in bins.tolist()],
+                }
+
+        if 'product_id' in found and self._valid('rotational_speed') and self._valid('torque'):
+            by_product = {}
+            for (product, _), values in self.groups.items():
+                _add(by_product, {product: values})
+            columns = [(found[key], _position(f'{key}_sum'), _position(f'{key}_count'))
+                       for key in ('rotational_speed', 'torque')]
+            stats['speed_torque_data'] = [
+                {found['product_id']: product, **{
+                    column: values[total] / values[count] if values[count] else float('nan')
+                    for column, total, count in columns
+                }}
+                for product in _sorted(by_product)
+                for values in [by_product[product]]
+            ]
+
+        if 'product_id' in found and 'type' in found:
+            keys = _sorted(typed)
+            for stat_name, sums in PRODUCT_TYPE_ROLLUPS:
+                if all(self._valid(key) for key, _ in sums):
+                    positions = [(_position(f'{key}_sum'), name) for key, name in sums]
+                    stats[stat_name] = [
+                        {'product_id': product, 'type': type_name,
+                         **{name: typed[(product, type_name)][position] for position, name in positions}}
+                        for product, type_name in keys
+                    ]
+
+        return {'rows': self.rows, 'columns': len(self.columns), 'file_size': file_size, **stats}
+
+    def to_state(self):
+        """JSON-serializable form of everything but the rollups, for ``DatasetSummary.state``"""
+        return {
+            'columns': self.columns,
+            'found': self.found,
+            'rows': self.rows,
+            'invalid': sorted(self.invalid),
+            'sums': self.sums,
+            'types': [[value, *counts] for value, counts in self.types.items()],
+            'values': {key: [[value, *counts] for value, counts in values.items()] for key, values in self.values.items()},
+            'machines': None if self.machines is None else base64.b64encode(self.machines.tobytes()).decode('ascii'),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        summary = cls(state['columns'], state['found'])
+        summary.rows = state['rows']
+        summary.invalid = set(state['invalid'])
+        summary.sums = state['sums']
+        summary.types = {row[0]: row[1:] for row in state['types']}
+        summary.values = {key: {row[0]: row[1:] for row in rows} for key, rows in state['values'].items()}
+        if state['machines'] is not None:
+            summary.machines = np.frombuffer(base64.b64decode(state['machines']), dtype=np.uint8).copy()
+        return summary
+
+
+def summarize_file(path, chunksize=500_000):
+    """Summary of a whole dataset file, read a chunk at a time"""
+    summary = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        part = StatsSummary.from_frame(chunk)
+        summary = part if summary is None else summary.merge(part)
+    return summary or StatsSummary.from_frame(pd.read_csv(path, nrows=0))
+
+
+def stored_summary(dataset, rollups=True):
+    """
+    The stored summary of ``dataset`` if it covers the current file, else
+    None. ``rollups=False`` leaves the rollups out, which is all merging
+    needs (see ``save_summary``).
+    """
+    state = (
+        DatasetSummary.objects.filter(dataset_id=dataset.pk, file_size=dataset.file_size)
+        .values_list('state', flat=True).first()
+    )
+    if state is None:
+        return None
+    summary = StatsSummary.from_state(state)
+    if rollups:
+        rows = DatasetRollup.objects.filter(dataset_id=dataset.pk).values_list('product_id', 'type', *ROLLUP_FIELDS)
+        summary.groups = {(product, type_name): list(values) for product, type_name, *values in rows.iterator()}
+    return summary
+
+
+def _rollup(dataset_id, key, values):
+    return DatasetRollup(dataset_id=dataset_id, product_id=key[0], type=key[1], **dict(zip(ROLLUP_FIELDS, values)))
+
+
+def save_summary(dataset, summary, added=None, batch_size=2000):
+    """
+    Store ``summary`` as the summary of ``dataset``'s current file.
+
+    ``added`` is the summary of rows just merged into ``summary`` (which then
+    need not hold any rollups): only the rollups those rows fall into are
+    written, each plus its share of them. Without it every rollup is
+    replaced by those of ``summary``.
+    """
+    with transaction.atomic():
+        DatasetSummary.objects.update_or_create(
+            dataset_id=dataset.pk, defaults={'file_size': dataset.file_size, 'state': summary.to_state()},
+        )
+        rollups = DatasetRollup.objects.filter(dataset_id=dataset.pk)
+        if added is None:
+            rollups._raw_delete(rollups.db)
+            groups = list(summary.groups.items())
+            for start in range(0, len(groups), batch_size):
+                DatasetRollup.objects.bulk_create(
+                    [_rollup(dataset.pk, key, values) for key, values in groups[start:start + batch_size]]
+                )
+            return
+
+        groups = list(added.groups.items())
+        for start in range(0, len(groups), batch_size):
+            batch = dict(groups[start:start + batch_size])
+            existing = rollups.filter(product_id__in={product for product, _ in batch}).values_list(
+                'pk', 'product_id', 'type', *ROLLUP_FIELDS,
+            )
+            replaced = []
+            for pk, product, type_name, *values in existing:
+                if (product, type_name) in batch:
+                    _add(batch, {(product, type_name): values})
+                    replaced.append(pk)
+            # Swapping the touched rows is much cheaper than a bulk_update of each one
+            DatasetRollup.objects.filter(pk__in=replaced)._raw_delete(rollups.db)
+            DatasetRollup.objects.bulk_create([_rollup(dataset.pk, key, values) for key, values in batch.items()])
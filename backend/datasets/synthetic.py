@@ -0,0 +1,342 @@
+"""
+Synthetic AI4I 2020 style telemetry, for load and scale tests.
+
+``TelemetryModel.fit`` learns from a real dataset, per machine Type, the
+distribution of every sensor column (as quantiles) and the rank correlations
+between them. Sampling draws correlated normal scores and maps them through
+those quantiles (a Gaussian copula), so the skewed rotational speed, the
+flat tool wear and the speed/torque trade-off keep their shape. Failures are
+then derived from the generated values with the AI4I failure mode rules:
+
+- TWF, tool wear failure: some tools fail between 200 and 240 minutes of wear
+- HDF, heat dissipation: process - air temperature below 8.6 K and speed below 1380 rpm
+- PWF, power failure: torque times angular speed below 3500 W or above 9000 W
+- OSF, overstrain: tool wear times torque above 11000 (L), 12000 (M) or 13000 (H) minNm
+- RNF, random failures
+
+The TWF and RNF rates are fitted too. ``Machine failure`` is set when any
+mode is. Writers generate and write ``chunk_rows`` rows at a time, so
+memory use does not grow with the row count.
+"""
+import json
+
+import numpy as np
+from django.conf import settings
+from scipy.special import ndtr, ndtri
+
+from .columns import COLUMN_MAPPINGS
+
+# Sensor columns and the decimals they are written with
+SENSORS = {
+    'Air temperature [K]': 1,
+    'Process temperature [K]': 1,
+    'Rotational speed [rpm]': 0,
+    'Torque [Nm]': 1,
+    'Tool wear [min]': 0,
+}
+FAILURE_MODES = ['TWF', 'HDF', 'PWF', 'OSF', 'RNF']
+COLUMNS = ['UDI', 'Product ID', 'Type', *SENSORS, 'Machine failure', *FAILURE_MODES]
+
+OSF_LIMITS = {'L': 11000, 'M': 12000, 'H': 13000}
+TWF_WEAR = (200, 240)
+
+QUANTILES = 1001
+CHUNK_ROWS = 500_000
+INVALID_TOKENS = ['n/a', '#VALUE!', '-', 'ERR', '?']
+
+
+def default_source():
+    return settings.BASE_DIR.parent / 'data' / 'ai4i2020.csv'
+
+
+class TelemetryModel:
+    def __init__(self, shares, quantiles, correlations, twf_rate, rnf_rate):
+        self.shares = shares  # Type -> share of rows
+        self.quantiles = quantiles  # Type -> QUANTILES x len(SENSORS) array
+        self.correlations = correlations  # Type -> correlation matrix of the normal scores
+        self.twf_rate = twf_rate  # share of rows in the TWF wear window that fail
+        self.rnf_rate = rnf_rate
+        self._cholesky = {t: np.linalg.cholesky(c) for t, c in correlations.items()}
+
+    @property
+    def types(self):
+        return list(self.shares)
+
+    @classmethod
+    def fit(cls, path=None):
+        import pandas as pd
+
+        df = pd.read_csv(path or default_source())
+        grid = np.linspace(0, 1, QUANTILES)
+        shares, quantiles, correlations = {}, {}, {}
+        for machine_type, group in df.groupby('Type'):
+            values = group[list(SENSORS)].to_numpy(dtype=float)
+            shares[machine_type] = len(group) / len(df)
+            quantiles[machine_type] = np.quantile(values, grid, axis=0)
+            scores = ndtri((group[list(SENSORS)].rank().to_numpy() - 0.5) / len(group))
+            correlations[machine_type] = np.corrcoef(scores, rowvar=False)
+
+        wear = df['Tool wear [min]']
+        in_window = wear.between(*TWF_WEAR)
+        twf_rate = float(df.loc[in_window, 'TWF'].mean()) if in_window.any() else 0.0
+        return cls(shares, quantiles, correlations, twf_rate, float(df['RNF'].mean()))
+
+    def as_dict(self):
+        return {
+            'shares': self.shares,
+            'quantiles': {t: q.tolist() for t, q in self.quantiles.items()},
+            'correlations': {t: c.tolist() for t, c in self.correlations.items()},
+            'twf_rate': self.twf_rate,
+            'rnf_rate': self.rnf_rate,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['shares'],
+            {t: np.array(q) for t, q in data['quantiles'].items()},
+            {t: np.array(c) for t, c in data['correlations'].items()},
+            data['twf_rate'],
+            data['rnf_rate'],
+        )
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def sample_sensors(self, rng, types):
+        """Sensor values (one array per column, rounded as written) for rows of the given Types"""
+        values = np.empty((len(types), len(SENSORS)))
+        grid = np.linspace(0, 1, QUANTILES)
+        for machine_type in self.types:
+            rows = np.flatnonzero(types == machine_type)
+            if not len(rows):
+                continue
+            scores = rng.standard_normal((len(rows), len(SENSORS))) @ self._cholesky[machine_type].T
+            u = ndtr(scores)
+            for j in range(len(SENSORS)):
+                values[rows, j] = np.interp(u[:, j], grid, self.quantiles[machine_type][:, j])
+
+        columns = {}
+        for j, (name, decimals) in enumerate(SENSORS.items()):
+            column = values[:, j].round(decimals)
+            columns[name] = column.astype(np.int64) if decimals == 0 else column
+        return columns
+
+    def failures(self, rng, types, sensors):
+        air = sensors['Air temperature [K]']
+        process = sensors['Process temperature [K]']
+        speed = sensors['Rotational speed [rpm]']
+        torque = sensors['Torque [Nm]']
+        wear = sensors['Tool wear [min]']
+
+        power = torque * speed * (2 * np.pi / 60)
+        limits = np.zeros(len(types))
+        for machine_type, limit in OSF_LIMITS.items():
+            limits[types == machine_type] = limit
+
+        modes = {
+            'TWF': (wear >= TWF_WEAR[0]) & (wear <= TWF_WEAR[1]) & (rng.random(len(types)) < self.twf_rate),
+            'HDF': (process - air < 8.6) & (speed < 1380),
+            'PWF': (power < 3500) | (power > 9000),
+            'OSF': wear * torque > limits,
+            'RNF': rng.random(len(types)) < self.rnf_rate,
+        }
+        failure = np.zeros(len(types), dtype=bool)
+        for flags in modes.values():
+            failure |= flags
+        return {'Machine failure': failure.astype(np.int8), **{m: f.astype(np.int8) for m, f in modes.items()}}
+
+
+class ProductPool:
+    """
+    ``size`` products, each with a fixed Type, that rows are spread over.
+
+    Product IDs are the Type letter followed by a serial number, as in
+    ai4i2020.csv. Without a pool every row gets its own product.
+    """
+
+    def __init__(self, rng, model, size):
+        self.types = rng.choice(np.array(model.types), size=size, p=list(model.shares.values()))
+        self.serials = rng.choice(max(90000, size * 10), size=size, replace=False) + 10000
+
+    def draw(self, rng, rows):
+        picks = rng.integers(0, len(self.types), rows)
+        return self.types[picks], self.serials[picks]
+
+
+class SchemaNoise:
+    """
+    Imperfections of real exports, applied on top of the clean data.
+
+    ``missing_rate`` and ``invalid_rate`` are the shares of Product ID, Type
+    and sensor cells left empty, and of sensor cells holding a token that is
+    not a number (CSV only, columnar files keep their types). ``rename`` uses
+    alternative column names the app recognizes (see ``datasets.columns``),
+    ``shuffle`` reorders the columns, ``extra_columns`` adds unrelated numeric
+    columns and ``drop_columns`` leaves columns out.
+    """
+    NOISY_COLUMNS = ['Product ID', 'Type', *SENSORS]
+
+    def __init__(self, missing_rate=0.0, invalid_rate=0.0, rename=False, shuffle=False, extra_columns=0,
+                 drop_columns=()):
+        self.missing_rate = missing_rate
+        self.invalid_rate = invalid_rate
+        self.rename = rename
+        self.shuffle = shuffle
+        self.extra_columns = extra_columns
+        self.drop_columns = set(drop_columns)
+
+    def layout(self, rng):
+        """(source column, output name) pairs in output order; extra columns have no source"""
+        columns = [c for c in COLUMNS if c not in self.drop_columns]
+        names = {}
+        if self.rename:
+            for canonical, *alternatives in COLUMN_MAPPINGS.values():
+                if alternatives:
+                    names[canonical] = alternatives[rng.integers(len(alternatives))]
+        layout = [(column, names.get(column, column)) for column in columns]
+        layout += [(None, f'extra_{i + 1}') for i in range(self.extra_columns)]
+        if self.shuffle:
+            layout = [layout[i] for i in rng.permutation(len(layout))]
+        return layout
+
+    def masks(self, rng, column, rows):
+        """Rows of ``column`` to leave empty and rows to fill with an invalid token"""
+        missing = invalid = None
+        if column in self.NOISY_COLUMNS and self.missing_rate:
+            missing = rng.random(rows) < self.missing_rate
+        if column in SENSORS and self.invalid_rate:
+            invalid = rng.random(rows) < self.invalid_rate
+        return missing, invalid
+
+
+def generate(rows, model=None, seed=0, product_ids=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield chunks of generated rows as dicts of column arrays in ``COLUMNS`` order.
+
+    ``Product ID`` holds the serial number only; the ID written out is the
+    Type letter followed by it. ``product_ids`` limits the number of distinct
+    products, by default every row is its own product.
+    """
+    model = model or TelemetryModel.fit()
+    rng = np.random.default_rng(seed)
+    pool = ProductPool(rng, model, product_ids) if product_ids else None
+    type_names = np.array(model.types)
+    shares = list(model.shares.values())
+
+    for start in range(0, rows, chunk_rows):
+        count = min(chunk_rows, rows - start)
+        udi = np.arange(start + 1, start + count + 1)
+        if pool is not None:
+            types, serials = pool.draw(rng, count)
+        else:
+            types, serials = rng.choice(type_names, size=count, p=shares), udi + 10000
+        sensors = model.sample_sensors(rng, types)
+        yield {
+            'UDI': udi,
+            'Product ID': serials,
+            'Type': types,
+            **sensors,
+            **model.failures(rng, types, sensors),
+        }
+
+
+def _code(column):
+    if column in ('Product ID', 'Type'):
+        return '%s'
+    return f'%.{SENSORS[column]}f' if SENSORS.get(column) else '%d'
+
+
+def _product_ids(chunk):
+    return [f'{t}{s}' for t, s in zip(chunk['Type'].tolist(), chunk['Product ID'].tolist())]
+
+
+def write_csv(path, rows, model=None, seed=0, product_ids=None, noise=None, chunk_rows=CHUNK_ROWS):
+    """
+    Write ``rows`` generated rows to a CSV file and return the number of rows.
+
+    Rows are formatted with one format string per row, which is several
+    times faster than ``DataFrame.to_csv``; noisy columns are formatted cell
+    by cell.
+    """
+    rng = np.random.default_rng([seed, 1])  # noise has its own stream, so it does not change the data
+    noise = noise or SchemaNoise()
+    layout = noise.layout(rng)
+
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(name for _, name in layout) + '\n')
+        for chunk in generate(rows, model, seed, product_ids, chunk_rows):
+            count = len(chunk['UDI'])
+            chunk['Product ID'] = _product_ids(chunk)
+            chunk['Type'] = chunk['Type'].tolist()
+
+            codes, cells = [], []
+            for column, _ in layout:
+                if column is None:
+                    codes.append('%.3f')
+                    cells.append(rng.normal(0, 1, count).tolist())
+                    continue
+                values = chunk[column]
+                values = values if isinstance(values, list) else values.tolist()
+                missing, invalid = noise.masks(rng, column, count)
+                if missing is None and invalid is None:
+                    codes.append(_code(column))
+                    cells.append(values)
+                    continue
+                code = _code(column)
+                values = [code % value for value in values]
+                if invalid is not None:
+                    for i in np.flatnonzero(invalid).tolist():
+                        values[i] = INVALID_TOKENS[i % len(INVALID_TOKENS)]
+                if missing is not None:
+                    for i in np.flatnonzero(missing).tolist():
+                        values[i] = ''
+                codes.append('%s')
+                cells.append(values)
+
+            line = ','.join(codes) + '\n'
+            f.write(''.join(map(line.__mod__, zip(*cells))))
+    return rows
+
+
+def write_parquet(path, rows, model=None, seed=0, product_ids=None, noise=None, chunk_rows=CHUNK_ROWS):
+    """Like ``write_csv``, to a Parquet file with one row group per chunk; needs pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Writing Parquet files needs pyarrow: pip install pyarrow")
+
+    rng = np.random.default_rng([seed, 1])
+    noise = noise or SchemaNoise()
+    layout = noise.layout(rng)
+
+    writer = None
+    try:
+        for chunk in generate(rows, model, seed, product_ids, chunk_rows):
+            count = len(chunk['UDI'])
+            chunk['Product ID'] = np.array(_product_ids(chunk))
+            arrays = []
+            for column, _ in layout:
+                if column is None:
+                    arrays.append(pa.array(rng.normal(0, 1, count)))
+                    continue
+                missing, _ = noise.masks(rng, column, count)
+                arrays.append(pa.array(chunk[column], mask=missing))
+            table = pa.Table.from_arrays(arrays, names=[name for _, name in layout])
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet}
@@ -0,0 +1,8 @@
+from celery import shared_task
+from .storage import reconcile_storage as reconcile
+
+
+@shared_task
+def reconcile_storage():
+    report = reconcile()
+    return str(report)
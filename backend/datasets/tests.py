@@ -1,3 +1,495 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+import pandas as pd
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from insights.models import Insight
+from ml_model.tasks import process_dataset
+from monitoring import task_metrics
+from predictions.models import Prediction
+from users.models import GuestSession
+from users.session_cache import clear_local_cache
+
+from . import async_views
+from .cleanup import cleanup_expired_guest_data
+from .columnar import ColumnarCache
+from .columns import find_columns
+from .models import Dataset, DatasetProcessing, DatasetSummary, StorageUsage
+from .query import QueryError, execute, parse_query
+from .row_index import RowIndex, dataset_cache_dir, file_lock
+from .stats import dataset_statistics
+from .storage import _apply_corrections, record_usage, reconcile_storage, storage_used
+from .synthetic import SchemaNoise, TelemetryModel, write_csv
+
+
+class MediaRootMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, DATASET_CACHE_ROOT=f'{self.media_root}/cache', GUEST_CLEANUP_PAUSE=0,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class GuestCleanupTests(MediaRootMixin, TestCase):
+    def make_dataset(self, session):
+        dataset = Dataset(session=session)
+        dataset.file.save('data.csv', ContentFile(b'UDI,Product ID\n1,L1\n'), save=True)
+        Prediction.objects.bulk_create(
+            Prediction(dataset=dataset, product_id=f'L{i}', prediction='Normal', confidence=0.1, features={})
+            for i in range(5)
+        )
+        Insight.objects.create(dataset=dataset, recommendation='ok')
+        return dataset
+
+    def test_deletes_expired_sessions_in_batches(self):
+        expired = GuestSession.objects.create(expires_at=timezone.now())
+        active = GuestSession.objects.create()
+        old = [self.make_dataset(expired) for _ in range(3)]
+        kept = self.make_dataset(active)
+
+        report = cleanup_expired_guest_data(batch_size=2, max_seconds=0)
+
+        self.assertTrue(report.complete)
+        self.assertEqual((report.sessions, report.datasets, report.predictions, report.insights), (1, 3, 15, 3))
+        self.assertEqual(report.files, 3)
+        self.assertGreater(report.bytes, 0)
+        self.assertEqual(list(Dataset.objects.all()), [kept])
+        self.assertEqual(Prediction.objects.count(), 5)
+        for dataset in old:
+            self.assertFalse(dataset.file.storage.exists(dataset.file.name))
+        self.assertTrue(kept.file.storage.exists(kept.file.name))
+
+    def test_stops_at_deadline(self):
+        expired = GuestSession.objects.create(expires_at=timezone.now())
+        self.make_dataset(expired)
+
+        with override_settings(GUEST_CLEANUP_MAX_SECONDS=1e-9):
+            report = cleanup_expired_guest_data()
+
+        self.assertFalse(report.complete)
+        self.assertEqual(Dataset.objects.count(), 1)
+        self.assertEqual(cleanup_expired_guest_data().datasets, 1)
+
+
+class StorageReconcileTests(MediaRootMixin, TestCase):
+    def write(self, name, size, age=0):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        if age:
+            os.utime(path, (os.path.getmtime(path) - age,) * 2)
+        return path
+
+    def test_removes_old_orphans_and_rebuilds_usage(self):
+        session = GuestSession.objects.create()
+        self.write('datasets/kept.csv', 10)
+        Dataset.objects.create(session=session, file='datasets/kept.csv')
+        Dataset.objects.create(session=session, file='datasets/missing.csv')
+        old_orphan = self.write('datasets/old.csv', 7, age=7200)
+        new_orphan = self.write('datasets/new.csv', 5)
+        old_cache = self.write('cache/999/rows.npy', 3, age=7200)
+        os.utime(os.path.dirname(old_cache), (os.path.getmtime(old_cache),) * 2)
+
+        report = reconcile_storage(grace_seconds=3600)
+
+        self.assertEqual((report.orphaned_files, report.orphaned_cache_dirs, report.reclaimed_bytes), (1, 1, 10))
+        self.assertEqual((report.files, report.bytes, report.missing_files), (1, 10, 1))
+        self.assertFalse(os.path.exists(old_orphan))
+        self.assertFalse(os.path.exists(os.path.dirname(old_cache)))
+        self.assertTrue(os.path.exists(new_orphan))
+        self.assertEqual(StorageUsage.objects.get(session=session).files, 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(storage_used(session_id=session.pk), 10)
+
+    def test_keeps_usage_recorded_after_the_scan(self):
+        session = GuestSession.objects.create()
+        dataset = Dataset.objects.create(session=session, file='datasets/data.csv', file_size=10)
+        record_usage(10, session_id=session.pk)
+        # The scan found 8 bytes, then an append grew the file to 30 and a second file was uploaded
+        Dataset.objects.filter(pk=dataset.pk).update(file_size=30)
+        record_usage(20, files=0, session_id=session.pk)
+        Dataset.objects.create(session=session, file='datasets/more.csv', file_size=5)
+        record_usage(5, session_id=session.pk)
+
+        _apply_corrections([(dataset.pk, 10, 8)])
+
+        self.assertEqual(Dataset.objects.get(pk=dataset.pk).file_size, 30)
+        usage = StorageUsage.objects.get(session=session)
+        self.assertEqual((usage.bytes, usage.files), (35, 2))
+
+
+@override_settings(RESPONSE_CACHE_TTL=300)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        self.session = GuestSession.objects.create()
+        self.dataset = Dataset.objects.create(session=self.session, file='datasets/data.csv')
+
+    def get(self, path):
+        return self.client.get(path, HTTP_X_GUEST_SESSION=str(self.session.session_id))
+
+    def test_hits_until_owner_data_changes(self):
+        self.assertEqual(self.get('/api/datasets/my/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get('/api/datasets/my/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.json()), 1)
+
+        Dataset.objects.create(session=self.session, file='datasets/other.csv')
+        response = self.get('/api/datasets/my/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_owners_do_not_share_entries(self):
+        self.get('/api/datasets/my/')
+        other = GuestSession.objects.create()
+        response = self.client.get('/api/datasets/my/', HTTP_X_GUEST_SESSION=str(other.session_id))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json(), [])
+
+
+@override_settings(RESPONSE_CACHE_TTL=300)
+class AsyncViewTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.session = GuestSession.objects.create()
+        self.dataset = Dataset(session=self.session)
+        self.dataset.file.save('data.csv', ContentFile(
+            b'UDI,Product ID,Type,Air temperature [K],Torque [Nm]\n1,L1,L,300,40\n2,M2,M,302,42\n'
+        ), save=True)
+
+    def request(self, guest=True):
+        request = AsyncRequestFactory().get(f'/api/datasets/my/{self.dataset.pk}/stats/')
+        if guest:
+            request.guest_session = self.session
+        return request
+
+    async def test_stats(self):
+        response = await async_views.dataset_stats(self.request(), pk=self.dataset.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('ETag', response)
+        stats = json.loads(response.content)
+        self.assertEqual((stats['rows'], stats['avgTorque']), (2, 41.0))
+
+        cached = await async_views.dataset_stats(self.request(), pk=self.dataset.pk)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(cached.content), stats)
+
+    async def test_requires_credentials(self):
+        response = await async_views.dataset_stats(self.request(guest=False), pk=self.dataset.pk)
+        self.assertEqual(response.status_code, 401)
+
+
+class ProcessingTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = dataset = Dataset(session=GuestSession.objects.create())
+        dataset.file.save('data.csv', ContentFile(
+            b'UDI,Product ID,Type,Air temperature [K],Process temperature [K],Rotational speed [rpm],'
+            b'Torque [Nm],Tool wear [min]\n'
+            b'1,L1,L,300,310,1500,40,10\n2,M2,M,302,311,1400,45,200\n3,H3,H,301,310,n/a,40,5\n'
+        ), save=True)
+
+    def test_records_stages_and_counts(self):
+        dataset = self.dataset
+        result = process_dataset.apply(args=[dataset.pk])
+        summary = result.get()
+        processing = DatasetProcessing.objects.get(dataset=dataset)
+        self.assertEqual(processing.status, 'succeeded')
+        self.assertEqual((processing.rows, processing.errors), (2, 1))
+        self.assertEqual(processing.bytes_read, dataset.file.size)
+        self.assertEqual(set(processing.stages), {'load_model', 'read', 'preprocess', 'predict', 'explain', 'write'})
+        self.assertEqual(processing.model_version, summary['model_version'])
+        self.assertEqual(Prediction.objects.filter(dataset=dataset).count(), 2)
+
+        name = process_dataset.name
+        rows_before = task_metrics.ROWS._values.get((name,), 0)
+        task_metrics.task_finished(task_id=result.id, task=process_dataset, retval=summary, state='SUCCESS')
+        self.assertEqual(task_metrics.ROWS._values[(name,)], rows_before + 2)
+
+    def test_explanations_are_stored_and_served(self):
+        process_dataset.apply(args=[self.dataset.pk]).get()
+        response = self.client.get(
+            f'/api/predictions/?dataset={self.dataset.pk}', HTTP_X_GUEST_SESSION=str(self.dataset.session.session_id),
+        )
+        rows = response.json()
+        rows = rows.get('results', rows) if isinstance(rows, dict) else rows
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            reasons = row['explanation']
+            self.assertTrue(1 <= len(reasons) <= 3)
+            features = [feature for feature, _ in reasons]
+            self.assertEqual(len(set(features)), len(features))
+            strengths = [abs(contribution) for _, contribution in reasons]
+            self.assertEqual(strengths, sorted(strengths, reverse=True))
+
+    def test_runs_again_without_duplicates(self):
+        first = process_dataset.apply(args=[self.dataset.pk]).get()
+        again = process_dataset.apply(args=[self.dataset.pk]).get()
+        self.assertEqual(again['skipped'], 'up to date')
+        self.assertEqual(Prediction.objects.filter(dataset=self.dataset).count(), 2)
+
+        # A new model replaces the predictions instead of adding to them
+        DatasetProcessing.objects.filter(dataset=self.dataset).update(model_version='old')
+        Prediction.objects.filter(dataset=self.dataset).update(model_version='old')
+        process_dataset.apply(args=[self.dataset.pk]).get()
+        versions = list(Prediction.objects.filter(dataset=self.dataset).values_list('model_version', flat=True))
+        self.assertEqual(versions, [first['model_version']] * 2)
+        self.assertEqual(DatasetProcessing.objects.get(dataset=self.dataset).attempts, 2)
+
+    def test_leaves_datasets_leased_by_another_run(self):
+        DatasetProcessing.objects.create(
+            dataset=self.dataset, status='running', task_id='other',
+            lease_expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(process_dataset.apply(args=[self.dataset.pk]).get()['skipped'], 'in progress')
+        self.assertFalse(Prediction.objects.filter(dataset=self.dataset).exists())
+
+        # Once the lease expires, the run is presumed dead and the dataset is taken over
+        DatasetProcessing.objects.filter(dataset=self.dataset).update(lease_expires_at=timezone.now())
+        self.assertNotIn('skipped', process_dataset.apply(args=[self.dataset.pk]).get())
+        self.assertEqual(Prediction.objects.filter(dataset=self.dataset).count(), 2)
+
+
+class RowsTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.dataset = dataset = Dataset(session=GuestSession.objects.create())
+        # Blank lines and a missing final line break, which pandas takes in its stride
+        dataset.file.save('data.csv', ContentFile(
+            b'UDI,Product ID,Torque [Nm]\r\n1,L1,40\r\n\r\n2,M2,\r\n3,H3,70\n\n4,L4,38\n5,M5,45'
+        ), save=True)
+        self.headers = {'HTTP_X_GUEST_SESSION': str(dataset.session.session_id)}
+        self.url = f'/api/datasets/my/{dataset.pk}/rows/'
+
+    def test_index(self):
+        index = RowIndex.for_dataset(self.dataset)
+        self.assertEqual((len(index), index.columns), (5, ['UDI', 'Product ID', 'Torque [Nm]']))
+        self.assertEqual(list(index.read_range(1, 3)['UDI']), [2, 3])
+        self.assertEqual(list(index.read_range(4, 10, columns=['Product ID'])['Product ID']), ['M5'])
+        self.assertEqual(list(index.read_positions([4, 0, 2])['UDI']), [5, 1, 3])
+        self.assertEqual(list(index.sort_order('Torque [Nm]')), [3, 0, 4, 2, 1])
+        self.assertEqual(list(index.sort_order('Torque [Nm]', descending=True)), [2, 4, 0, 3, 1])
+
+        # Loaded from the cache until the file changes
+        self.assertTrue((dataset_cache_dir(self.dataset.pk) / 'rows.bin').exists())
+        self.assertEqual(len(RowIndex.for_dataset(self.dataset)), 5)
+        with open(self.dataset.file.path, 'ab') as f:
+            f.write(b'\n6,H6,50\n')
+        self.assertEqual(list(RowIndex.for_dataset(self.dataset).read_range(5, 6)['UDI']), [6])
+
+    def test_sort_order_of_mixed_values(self):
+        path = os.path.join(self.media_root, 'mixed.csv')
+        with open(path, 'w') as f:
+            f.write('UDI,Wear\n1,5\n2,40\n3,?\n4,\n5,100\n6,40\n')
+        index = RowIndex.load_or_build(path, os.path.join(self.media_root, 'cache', 'mixed'))
+        self.assertEqual(list(index.sort_order('Wear')), [0, 1, 5, 4, 2, 3])
+        self.assertEqual(list(index.sort_order('Wear', descending=True)), [2, 4, 1, 5, 0, 3])
+
+    def test_a_build_waits_for_an_append_to_extend_the_index(self):
+        index = RowIndex.for_dataset(self.dataset)
+        path = self.dataset.file.path
+        built = []
+        with file_lock(path):
+            with open(path, 'ab') as f:
+                begin = f.tell() + 1
+                f.write(b'\n6,H6,50\n')
+            reader = threading.Thread(target=lambda: built.append(RowIndex.for_dataset(self.dataset)))
+            reader.start()
+            reader.join(0.2)
+            self.assertTrue(reader.is_alive())
+            index.extend(begin)
+        reader.join()
+        # Built before the extend, the index would hold the new row twice
+        self.assertEqual((len(built[0]), len(RowIndex.for_dataset(self.dataset))), (6, 6))
+
+    def test_endpoint(self):
+        page = self.client.get(f'{self.url}?offset=1&limit=2&columns=UDI,Torque [Nm]', **self.headers).json()
+        self.assertEqual((page['count'], page['columns']), (5, ['UDI', 'Torque [Nm]']))
+        self.assertEqual(page['rows'], [{'UDI': 2, 'Torque [Nm]': None}, {'UDI': 3, 'Torque [Nm]': 70.0}])
+
+        page = self.client.get(f'{self.url}?sort=-Torque [Nm]&limit=2', **self.headers).json()
+        self.assertEqual([row['Product ID'] for row in page['rows']], ['H3', 'M5'])
+
+        self.assertEqual(self.client.get(f'{self.url}?sort=Speed', **self.headers).status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?limit=x', **self.headers).status_code, 400)
+        other = GuestSession.objects.create()
+        self.assertEqual(self.client.get(self.url, HTTP_X_GUEST_SESSION=str(other.session_id)).status_code, 404)
+
+
+class QueryTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.media_root, 'data.csv')
+        with open(self.path, 'w') as f:
+            # Tool wear is text in the second row group only
+            f.write('UDI,Product ID,Type,Torque [Nm],Tool wear [min]\n'
+                    '1,L1,L,40,10\n2,M2,M,45,200\n3,H3,H,70,240\n4,L4,L,38,?\n5,L5,L,52,0\n')
+        self.root = os.path.join(self.media_root, 'cache', 'columnar')
+        self.cache = ColumnarCache.load_or_build(self.path, self.root, row_group_size=2)
+
+    def query(self, params):
+        return execute(self.cache, parse_query(QueryDict(params), self.cache, max_limit=100))
+
+    def udis(self, params):
+        return [row['UDI'] for row in self.query(params)['rows']]
+
+    def test_predicates_skip_row_groups(self):
+        result = self.query('torque__gt=60&_=1700000000')
+        self.assertEqual((result['count'], result['row_groups']), (1, {'scanned': 1, 'skipped': 2}))
+        self.assertEqual(result['rows'][0]['Product ID'], 'H3')
+        self.assertEqual(self.query('product_id__prefix=L')['count'], 3)
+        self.assertEqual(self.query('type__in=M,H&torque__lte=60')['count'], 1)
+
+    def test_sorting_and_paging(self):
+        self.assertEqual(self.udis('type=L&sort=-torque&columns=UDI'), [5, 1, 4])
+        self.assertEqual(self.udis('sort=Torque [Nm]&offset=1&limit=2&columns=UDI'), [1, 2])
+        self.assertEqual(self.udis('offset=3&limit=5'), [4, 5])
+
+    def test_aggregates(self):
+        groups = self.query('group_by=type&agg=count,mean:torque,max:tool_wear')['groups']
+        self.assertEqual([(g['Type'], g['count'], g['max:Tool wear [min]']) for g in groups],
+                         [('H', 1, '240'), ('L', 3, '?'), ('M', 1, '200')])
+        self.assertAlmostEqual(groups[1]['mean:Torque [Nm]'], 130 / 3)
+
+    def test_column_with_numbers_and_text(self):
+        result = self.query('tool_wear=10')
+        self.assertEqual((result['count'], result['rows'][0]['Tool wear [min]']), (1, '10'))
+        self.assertEqual(self.query('tool_wear__in=0,240')['count'], 2)
+        self.assertEqual(self.udis('sort=tool_wear'), [5, 1, 2, 3, 4])
+
+    def test_rejects_bad_queries(self):
+        for params in ('speed=1', 'torque=x', 'torque__near=1', 'torque__prefix=4', 'agg=mean:tool_wear', 'limit=x'):
+            with self.assertRaises(QueryError, msg=params):
+                self.query(params)
+
+    def test_rebuilds_in_place_when_the_file_changes(self):
+        with open(self.path, 'a') as f:
+            f.write('6,M6,M,41,5\n')
+        self.assertIsNone(ColumnarCache.load(self.path, self.root))
+        cache = ColumnarCache.load_or_build(self.path, self.root, row_group_size=2)
+        self.assertEqual((cache.num_rows, len(cache.row_groups)), (6, 3))
+        self.assertEqual(os.listdir(os.path.dirname(self.root)), ['columnar'])
+
+
+class AppendTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.dataset = dataset = Dataset(session=GuestSession.objects.create())
+        dataset.file.save('data.csv', ContentFile(
+            b'UDI,Product ID,Type,Air temperature [K],Process temperature [K],Rotational speed [rpm],'
+            b'Torque [Nm],Tool wear [min]\n'
+            b'1,L1,L,300,310,1500,40,10\n2,M2,M,302,311,1400,45,200\n3,H3,H,301.5,310,1300,70,240'
+        ), save=True)
+        self.headers = {'HTTP_X_GUEST_SESSION': str(dataset.session.session_id)}
+        self.url = f'/api/datasets/my/{dataset.pk}/'
+
+    def append(self, content):
+        upload = SimpleUploadedFile('rows.csv', content, content_type='text/csv')
+        return self.client.post(f'{self.url}append/', {'file': upload}, **self.headers)
+
+    def test_scores_and_summarizes_only_the_new_rows(self):
+        rows = b'Type,Product ID,UDI,Air temperature [K],Process temperature [K],Rotational speed [rpm],' \
+               b'Torque [Nm],Tool wear [min]\nL,L4,4,299,309,1550,38,20\nM,L1,5,303,312,1450,50,215\n'
+        self.assertEqual(self.append(rows).status_code, 409)  # not processed yet
+
+        process_dataset.apply(args=[self.dataset.pk]).get()
+        self.assertEqual(self.client.get(f'{self.url}rows/', **self.headers).json()['count'], 3)
+        self.assertEqual(self.client.get(f'{self.url}query/', **self.headers).json()['count'], 3)
+        etag = self.client.get(f'{self.url}stats/', **self.headers)['ETag']
+        hash_before = self.dataset.content_hash
+
+        response = self.append(rows)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()['appended_rows'], 2)
+        self.dataset.refresh_from_db()
+        self.assertNotEqual(self.dataset.content_hash, hash_before)
+        self.assertEqual(self.dataset.file_size, os.path.getsize(self.dataset.file.path))
+
+        processing = DatasetProcessing.objects.get(dataset=self.dataset)
+        self.assertEqual((processing.status, processing.rows, processing.attempts), ('succeeded', 5, 1))
+        products = Prediction.objects.filter(dataset=self.dataset).order_by('pk').values_list('product_id', flat=True)
+        self.assertEqual(list(products), ['L1', 'M2', 'H3', 'L4', 'L1'])
+
+        # The summary serves what a pass over the whole file computes
+        self.assertTrue(DatasetSummary.objects.filter(dataset=self.dataset, file_size=self.dataset.file_size).exists())
+        response = self.client.get(f'{self.url}stats/', HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        expected = json.loads(json.dumps(dataset_statistics(pd.read_csv(self.dataset.file.path), self.dataset.file.size),
+                                         default=lambda value: value.item()))
+        self.assertEqual(response.json(), expected)
+
+        page = self.client.get(f'{self.url}rows/?offset=3', **self.headers).json()
+        self.assertEqual((page['count'], [row['UDI'] for row in page['rows']]), (5, [4, 5]))
+        self.assertEqual(self.client.get(f'{self.url}query/?type=L', **self.headers).json()['count'], 2)
+
+    def test_rejects_rows_that_do_not_fit(self):
+        process_dataset.apply(args=[self.dataset.pk]).get()
+        size = self.dataset.file.size
+        response = self.append(b'UDI,Product ID,Type,Speed\n4,L4,L,1500\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('missing Air temperature [K]', response.json()['error'])
+        self.assertEqual(self.append(b'').status_code, 400)
+        self.assertEqual(os.path.getsize(self.dataset.file.path), size)
+
+
+class SyntheticTelemetryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.model = TelemetryModel.fit()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def generate(self, rows, **options):
+        path = os.path.join(self.dir, 'telemetry.csv')
+        write_csv(path, rows, model=self.model, chunk_rows=1000, **options)
+        return pd.read_csv(path)
+
+    def test_follows_failure_rules_and_product_cardinality(self):
+        df = self.generate(5000, product_ids=50)
+        self.assertEqual(len(df), 5000)
+        self.assertLessEqual(df['Product ID'].nunique(), 50)
+        self.assertTrue((df['Product ID'].str[0] == df['Type']).all())
+
+        heat = (df['Process temperature [K]'] - df['Air temperature [K]'] < 8.6) & (df['Rotational speed [rpm]'] < 1380)
+        self.assertTrue((df['HDF'] == heat).all())
+        modes = df[['TWF', 'HDF', 'PWF', 'OSF', 'RNF']].any(axis=1)
+        self.assertTrue((df['Machine failure'] == modes).all())
+        self.assertTrue(0.01 < df['Machine failure'].mean() < 0.08)
+
+    def test_same_seed_same_data(self):
+        self.assertTrue(self.generate(1500, seed=3).equals(self.generate(1500, seed=3)))
+
+    def test_schema_noise(self):
+        noise = SchemaNoise(missing_rate=0.1, invalid_rate=0.1, rename=True, extra_columns=2, drop_columns=['RNF'])
+        df = self.generate(2000, noise=noise)
+        self.assertNotIn('RNF', df.columns)
+        self.assertIn('extra_2', df.columns)
+        self.assertEqual(len(find_columns(df.columns)), 8)
+        torque = df[find_columns(df.columns)['torque']]
+        self.assertEqual(torque.dtype, object)
+        self.assertTrue(torque.isna().any())
@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from .views import DatasetUploadView, UserDatasetListView, UserDatasetDetailView, dataset_stats
+from predictions.views import PredictionResultsExport
+from . import async_views
+from .views import DatasetUploadView, UserDatasetListView, UserDatasetDetailView, dataset_stats, dataset_rows, dataset_query, dataset_append, cache_stats
 
 urlpatterns = [
-    path('upload/', DatasetUploadView.as_view(), name='dataset-upload'),
+    path('upload/', async_views.dataset_upload if settings.ASYNC_VIEWS else DatasetUploadView.as_view(), name='dataset-upload'),
     path('my/', UserDatasetListView.as_view(), name='my-datasets'),
     path('my/<int:pk>/', UserDatasetDetailView.as_view(), name='my-dataset-detail'),
-    path('my/<int:pk>/stats/', dataset_stats, name='dataset-stats'),
+    path('my/<int:pk>/stats/', async_views.dataset_stats if settings.ASYNC_VIEWS else dataset_stats, name='dataset-stats'),
+    path('my/<int:pk>/rows/', dataset_rows, name='dataset-rows'),
+    path('my/<int:pk>/query/', dataset_query, name='dataset-query'),
+    path('my/<int:pk>/append/', dataset_append, name='dataset-append'),
+    path('my/<int:pk>/predictions/export/', PredictionResultsExport.as_view(), name='dataset-predictions-export'),
+    path('cache-stats/', cache_stats, name='dataset-cache-stats'),
 ]
@@ -0,0 +1,22 @@
+"""Async variant of the dataset insights view, routed when ``ASYNC_VIEWS`` is on"""
+from django.http import JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from datasets.aio import async_api_view
+from datasets.conditional import conditional
+from datasets.response_cache import cache_response
+
+from .models import Insight
+from .serializers import InsightSerializer
+from .views import dataset_insights_validators
+
+
+@async_api_view(guests=False)
+@cache_response('dataset-insights')
+@conditional(dataset_insights_validators)
+async def dataset_insights(request, dataset_id):
+    """Get insights for a specific dataset"""
+    insights = [
+        insight async for insight in Insight.objects.filter(dataset=dataset_id, dataset__user_id=request.user.pk)
+    ]
+    return JsonResponse(InsightSerializer(insights, many=True).data, safe=False, encoder=JSONEncoder)
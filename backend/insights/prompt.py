@@ -0,0 +1,159 @@
+"""
+Compact, deterministic dataset summaries for the insight prompt.
+
+Instead of pasting the dataframe into the prompt, ``build_prompt`` writes a
+short statistical summary made of sections in priority order: overview,
+failure-mode rates, per-column statistics, top-risk products and drift
+against the training data. Sections are added while they fit in the token
+budget; the last one that does not fit is cut line by line.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from datasets.columns import find_columns
+
+INSTRUCTIONS = (
+    "You are a maintenance engineer analysing telemetry from CNC milling machines. "
+    "Below is a statistical summary of an uploaded dataset. Provide detailed insights: "
+    "the main failure risks and their likely causes, which products or machine types "
+    "need attention first, and concrete maintenance recommendations."
+)
+
+FAILURE_MODES = {
+    'Machine failure': 'any failure',
+    'TWF': 'tool wear failure',
+    'HDF': 'heat dissipation failure',
+    'PWF': 'power failure',
+    'OSF': 'overstrain failure',
+    'RNF': 'random failure',
+}
+
+CHARS_PER_TOKEN = 4
+TOP_RISK_PRODUCTS = 10
+DRIFT_Z_THRESHOLD = 0.5
+
+
+def estimate_tokens(text):
+    """Rough token count, good enough to keep prompts within budget"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'n/a'
+    return f'{value:.4g}'
+
+
+def _percent(rate):
+    text = _number(100 * rate)
+    return text if text == 'n/a' else f'{text}%'
+
+
+def overview_section(df):
+    found = find_columns(df.columns)
+    lines = [f"Rows: {len(df)}", f"Columns: {', '.join(map(str, df.columns))}"]
+    if 'product_id' in found:
+        lines.append(f"Distinct products: {df[found['product_id']].nunique()}")
+    if 'type' in found:
+        counts = df[found['type']].value_counts().sort_index()
+        lines.append("Machine types: " + ', '.join(f'{name}={count}' for name, count in counts.items()))
+    return lines
+
+
+def failure_section(df):
+    lines = []
+    for column, description in FAILURE_MODES.items():
+        if column not in df.columns:
+            continue
+        rate = pd.to_numeric(df[column], errors='coerce').mean()
+        lines.append(f"{column} ({description}): {_percent(rate)} of rows")
+
+    found = find_columns(df.columns)
+    if 'Machine failure' in df.columns and 'type' in found:
+        failures = pd.to_numeric(df['Machine failure'], errors='coerce')
+        rates = failures.groupby(df[found['type']]).mean().sort_index()
+        lines.append("Failure rate by type: " + ', '.join(f'{name}={_percent(rate)}' for name, rate in rates.items()))
+    return lines
+
+
+def column_section(df):
+    lines = []
+    skip = set(FAILURE_MODES) | {'UDI'}
+    for column in df.columns:
+        if column in skip:
+            continue
+        series = df[column]
+        nulls = int(series.isna().sum())
+        suffix = f", missing={nulls}" if nulls else ''
+        if pd.api.types.is_numeric_dtype(series):
+            lines.append(
+                f"{column}: mean={_number(series.mean())} std={_number(series.std())} "
+                f"min={_number(series.min())} median={_number(series.median())} max={_number(series.max())}{suffix}"
+            )
+        else:
+            top = series.value_counts().head(3)
+            line = f"{column}: {series.nunique()} distinct"
+            if len(top) and top.iloc[0] > 1:
+                line += ", most common " + ', '.join(f'{value}={count}' for value, count in top.items())
+            lines.append(line + suffix)
+    return lines
+
+
+def risk_section(predictions):
+    """``predictions`` are dicts with product_id and confidence, highest risk first"""
+    lines = []
+    for prediction in list(predictions)[:TOP_RISK_PRODUCTS]:
+        lines.append(f"{prediction['product_id']}: failure probability {_number(prediction['confidence'])}")
+    return lines
+
+
+def drift_section(df, training_stats):
+    """Columns whose distribution moved away from the training data, largest shift first"""
+    drifts = []
+    for column, stats in (training_stats or {}).items():
+        if column not in df.columns or not pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        values = df[column].dropna()
+        std = stats.get('std') or 0
+        if not len(values) or not std:
+            continue
+        z = (values.mean() - stats['mean']) / std
+        outside = float(np.mean((values < stats['min']) | (values > stats['max'])))
+        if abs(z) >= DRIFT_Z_THRESHOLD or outside > 0:
+            drifts.append((abs(z), column, z, outside, stats))
+
+    lines = []
+    for _, column, z, outside, stats in sorted(drifts, key=lambda item: (-item[0], item[1])):
+        lines.append(
+            f"{column}: mean {_number(df[column].mean())} vs training {_number(stats['mean'])} "
+            f"({z:+.2f} std), {_number(100 * outside)}% of rows outside the training range "
+            f"[{_number(stats['min'])}, {_number(stats['max'])}]"
+        )
+    return lines
+
+
+def build_prompt(df, predictions=(), training_stats=None, token_budget=2000):
+    sections = [
+        ("Dataset overview", overview_section(df)),
+        ("Failure modes", failure_section(df)),
+        ("Column statistics", column_section(df)),
+        ("Products with the highest predicted failure risk", risk_section(predictions)),
+        ("Drift against the model's training data", drift_section(df, training_stats)),
+    ]
+
+    prompt = INSTRUCTIONS
+    for title, lines in sections:
+        if not lines:
+            continue
+        block = f"\n\n## {title}\n- {lines[0]}"
+        if estimate_tokens(prompt + block) > token_budget:
+            break
+        prompt += block
+        for line in lines[1:]:
+            line = f"\n- {line}"
+            if estimate_tokens(prompt + line) > token_budget:
+                return prompt
+            prompt += line
+    return prompt
@@ -0,0 +1,200 @@
+"""
+LLM backends for insight generation.
+
+``get_insight_client()`` returns the process-wide ``InsightClient`` configured
+from the ``INSIGHT_*`` settings. It wraps a provider (Gemini, or the offline
+stub) with a result cache keyed by model name and prompt hash, a bounded
+worker pool with a per-call timeout, retries with exponential backoff and a
+circuit breaker, so a slow or failing LLM cannot tie up the insight workers.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+
+class InsightGenerationError(Exception):
+    pass
+
+
+class CircuitOpenError(InsightGenerationError):
+    pass
+
+
+class InsightProvider:
+    """Turns a prompt into markdown text"""
+    model_name = None
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+
+class GeminiProvider(InsightProvider):
+    def __init__(self, api_key, model_name='gemini-1.5-flash', timeout=None):
+        if not api_key:
+            raise ImproperlyConfigured("Gemini API key is not set. Please set the GEMINI_API_KEY environment variable.")
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+
+    def generate(self, prompt):
+        request_options = {'timeout': self.timeout} if self.timeout else None
+        response = self.model.generate_content(prompt, request_options=request_options)
+        if not response.text:
+            raise InsightGenerationError("Failed to generate insights from the dataset.")
+        return response.text
+
+
+class StubProvider(InsightProvider):
+    """Deterministic offline provider for tests and local development"""
+    model_name = 'stub'
+
+    def generate(self, prompt):
+        headings = [line[3:] for line in prompt.splitlines() if line.startswith('## ')]
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        lines = ["## Insights (offline stub)", "", f"Summary `{digest}` covers:"]
+        lines += [f"- {heading}" for heading in headings]
+        return '\n'.join(lines)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after ``threshold`` consecutive failures. After
+    ``reset_timeout`` seconds it lets a single probe call through
+    (half-open): its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=60, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.probing else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+                self.probing = False
+
+
+class InsightClient:
+    """
+    At most ``max_workers`` provider calls are in flight. A call that times
+    out cannot be stopped, so it keeps its slot until it returns; once every
+    slot is taken, further calls fail after ``timeout`` instead of queueing
+    behind them.
+    """
+
+    def __init__(self, provider, cache_ttl=None, max_workers=4, timeout=30, retries=2, backoff=1.0, breaker=None):
+        self.provider = provider
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='insights')
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def cache_key(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f'insight:{self.provider.model_name}:{digest}'
+
+    def _call(self, prompt):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise InsightGenerationError(f"All {self.max_workers} insight calls are still running")
+        try:
+            future = self.executor.submit(self.provider.generate, prompt)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise InsightGenerationError(f"Insight generation timed out after {self.timeout}s")
+
+    def generate(self, prompt):
+        key = self.cache_key(prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Insight generation is temporarily disabled after repeated failures.")
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                text = self._call(prompt)
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                cache.set(key, text, self.cache_ttl)
+                return text
+            self.breaker.record_failure()
+
+        raise InsightGenerationError(f"Failed to generate insights: {error}") from error
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def build_provider():
+    if settings.INSIGHT_PROVIDER == 'stub':
+        return StubProvider()
+    if settings.INSIGHT_PROVIDER == 'gemini':
+        return GeminiProvider(settings.GEMINI_API_KEY, settings.INSIGHT_MODEL_NAME, settings.INSIGHT_TIMEOUT)
+    raise ImproperlyConfigured(f"Unknown INSIGHT_PROVIDER: {settings.INSIGHT_PROVIDER}")
+
+
+def get_insight_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InsightClient(
+                build_provider(),
+                cache_ttl=settings.INSIGHT_CACHE_TTL,
+                max_workers=settings.INSIGHT_MAX_WORKERS,
+                timeout=settings.INSIGHT_TIMEOUT,
+                retries=settings.INSIGHT_RETRIES,
+                backoff=settings.INSIGHT_RETRY_BACKOFF,
+                breaker=CircuitBreaker(settings.INSIGHT_BREAKER_THRESHOLD, settings.INSIGHT_BREAKER_RESET),
+            )
+        return _client
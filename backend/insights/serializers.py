@@ -1,9 +1,11 @@
 from rest_framework import serializers
+from monitoring.serializers import TimedListSerializer, TimedSerializerMixin
 from .models import Insight
 
 
-class InsightSerializer(serializers.ModelSerializer):
+class InsightSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Insight
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
         read_only_fields = ['insight_id', 'created_at']
\ No newline at end of file
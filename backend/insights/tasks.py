@@ -0,0 +1,26 @@
+import logging
+
+from celery import shared_task
+
+from datasets.models import Dataset
+from .models import Insight
+from .utils import generate_insight
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_dataset_insight(dataset_id):
+    """
+    Generate the insight of a dataset, queued by ``process_dataset`` once the
+    predictions are stored. A dataset gets one insight: scoring it again,
+    e.g. with a new model, does not add another.
+    """
+    dataset = Dataset.objects.filter(pk=dataset_id).first()
+    if dataset is None:
+        return {'dataset_id': dataset_id, 'skipped': 'deleted'}
+    if Insight.objects.filter(dataset=dataset).exists():
+        return {'dataset_id': dataset_id, 'skipped': 'has an insight'}
+    insight = generate_insight(dataset.pk, dataset.file.path)
+    logger.info("Insight %s generated for dataset %s", insight.pk, dataset_id)
+    return {'dataset_id': dataset_id, 'insight_id': insight.pk}
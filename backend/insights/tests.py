@@ -0,0 +1,165 @@
+import io
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from datasets.models import Dataset
+from ml_model.tasks import process_dataset
+from predictions.models import Prediction
+from users.models import GuestSession
+
+from . import providers
+from .models import Insight
+from .prompt import build_prompt, estimate_tokens
+from .providers import CircuitBreaker, CircuitOpenError, InsightClient, InsightGenerationError, StubProvider
+from .tasks import generate_dataset_insight
+
+CSV = (
+    b'UDI,Product ID,Type,Air temperature [K],Process temperature [K],Rotational speed [rpm],'
+    b'Torque [Nm],Tool wear [min],Machine failure,TWF\n'
+    b'1,L1,L,300,310,1500,40,10,0,0\n2,M2,M,302,311,1400,45,200,1,1\n'
+    b'3,H3,H,301,310,1300,70,240,x,0\n4,L4,L,299,309,1550,38,20,1,0\n'
+)
+
+
+class PromptTests(TestCase):
+    def setUp(self):
+        self.df = pd.read_csv(io.BytesIO(CSV))
+
+    def test_sections_within_budget(self):
+        risks = [{'product_id': 'M2', 'confidence': 0.91}, {'product_id': 'L4', 'confidence': 0.62}]
+        stats = {'Torque [Nm]': {'mean': 40.0, 'std': 5.0, 'min': 3.8, 'max': 60.0}}
+        prompt = build_prompt(self.df, risks, stats, token_budget=2000)
+        self.assertIn("Machine failure (any failure): 66.67% of rows", prompt)
+        # The label that does not parse is left out of the rates instead of failing the insight
+        self.assertIn("Failure rate by type: H=n/a, L=50%, M=100%", prompt)
+        self.assertIn("- M2: failure probability 0.91", prompt)
+        self.assertIn("Torque [Nm]: mean 48.25 vs training 40", prompt)
+
+        short = build_prompt(self.df, risks, stats, token_budget=estimate_tokens(prompt) // 2)
+        self.assertLessEqual(estimate_tokens(short), estimate_tokens(prompt) // 2)
+        self.assertTrue(prompt.startswith(short))
+        self.assertNotIn("Drift", short)
+
+    def test_deterministic(self):
+        self.assertEqual(build_prompt(self.df), build_prompt(self.df.copy()))
+
+
+@override_settings(INSIGHT_PROVIDER='stub')
+class InsightTaskTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        providers._client = None
+        self.addCleanup(setattr, providers, '_client', None)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root, DATASET_CACHE_ROOT=f'{media_root}/cache')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.dataset = Dataset(session=GuestSession.objects.create())
+        self.dataset.file.save('data.csv', ContentFile(CSV), save=True)
+
+    def test_generated_once_the_predictions_are_stored(self):
+        process_dataset.apply(args=[self.dataset.pk]).get()
+        self.assertEqual(Insight.objects.filter(dataset=self.dataset).count(), 1)
+        self.assertEqual(generate_dataset_insight(self.dataset.pk)['skipped'], 'has an insight')
+
+    def test_names_the_products_most_at_risk(self):
+        Prediction.objects.bulk_create(
+            Prediction(dataset=self.dataset, product_id=product_id, prediction=label, confidence=confidence, features={})
+            for product_id, label, confidence in [('M2', 'Failure', 0.9), ('L1', 'Normal', 0.1)]
+        )
+        insight = Insight.objects.get(pk=generate_dataset_insight(self.dataset.pk)['insight_id'])
+        self.assertIn("Products with the highest predicted failure risk", insight.recommendation)
+
+
+class ScriptedProvider(StubProvider):
+    """Fails the first ``failures`` calls, and blocks every call until ``released`` is set"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.released = threading.Event()
+        self.released.set()
+
+    def generate(self, prompt):
+        self.calls += 1
+        self.released.wait()
+        if self.calls <= self.failures:
+            raise ConnectionError("backend down")
+        return super().generate(prompt)
+
+
+class InsightClientTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 0.0
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=60, clock=lambda: self.now)
+
+    def make_client(self, provider, **options):
+        options = {'retries': 0, 'backoff': 0, 'timeout': 5, 'breaker': self.breaker, **options}
+        client = InsightClient(provider, cache_ttl=60, **options)
+        self.addCleanup(client.executor.shutdown)
+        return client
+
+    def test_cache_hit(self):
+        provider = ScriptedProvider()
+        client = self.make_client(provider)
+        self.assertEqual(client.generate('## A'), client.generate('## A'))
+        self.assertEqual(provider.calls, 1)
+
+    def test_retries_with_backoff(self):
+        provider = ScriptedProvider(failures=2)
+        started = time.monotonic()
+        self.breaker.threshold = 5
+        text = self.make_client(provider, retries=2, backoff=0.05).generate('## A')
+        self.assertIn('offline stub', text)
+        self.assertEqual(provider.calls, 3)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05 + 0.1)
+
+    def test_breaker_opens_probes_once_and_closes(self):
+        provider = ScriptedProvider(failures=3)
+        client = self.make_client(provider)
+        for prompt in ('## A', '## B'):
+            with self.assertRaises(InsightGenerationError):
+                client.generate(prompt)
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.generate('## C')
+        self.assertEqual(provider.calls, 2)
+
+        # Half-open: one probe, which fails and opens the breaker again
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+
+        self.now += 60
+        with self.assertRaises(InsightGenerationError):
+            client.generate('## D')  # the third failure
+        self.now += 60
+        client.generate('## E')
+        self.assertEqual((self.breaker.state, provider.calls), ('closed', 4))
+
+    def test_calls_in_flight_are_bounded(self):
+        provider = ScriptedProvider()
+        provider.released.clear()
+        self.breaker.threshold = 5
+        client = self.make_client(provider, max_workers=1, timeout=0.05)
+        with self.assertRaisesRegex(InsightGenerationError, 'timed out'):
+            client.generate('## A')
+        # The timed out call still holds the only slot, so nothing else reaches the provider
+        with self.assertRaisesRegex(InsightGenerationError, 'still running'):
+            client.generate('## B')
+        self.assertEqual(provider.calls, 1)
+
+        provider.released.set()
+        client.executor.submit(lambda: None).result()
+        self.assertIn('offline stub', client.generate('## C'))
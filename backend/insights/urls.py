@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import InsightListView, InsightDetailView, DatasetInsightsView
 
 urlpatterns = [
     path('', InsightListView.as_view(), name='insight-list'),
     path('<int:pk>/', InsightDetailView.as_view(), name='insight-detail'),
-    path('dataset/<int:dataset_id>/', DatasetInsightsView.as_view(), name='dataset-insights'),
+    path(
+        'dataset/<int:dataset_id>/',
+        async_views.dataset_insights if settings.ASYNC_VIEWS else DatasetInsightsView.as_view(),
+        name='dataset-insights',
+    ),
 ]
\ No newline at end of file
@@ -1,37 +1,49 @@
-import os
-import google.generativeai as genai
-from google.auth.exceptions import DefaultCredentialsError
-from dotenv import load_dotenv
 import pandas as pd
+from django.conf import settings
 from .models import Insight
+from .prompt import TOP_RISK_PRODUCTS, build_prompt
+from .providers import get_insight_client
 from datasets.models import Dataset
+from ml_model import registry
+from predictions.models import Prediction
 
 
-load_dotenv()
+def _prompt(df, predictions):
+    return build_prompt(
+        df,
+        predictions=predictions,
+        training_stats=registry.training_stats(),
+        token_budget=settings.INSIGHT_PROMPT_TOKEN_BUDGET,
+    )
 
-def generate_insight(dataset_id, dataset_file_path):
 
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if DefaultCredentialsError(GEMINI_API_KEY) is None:
-        return "Gemini API key is not set. Please set the GEMINI_API_KEY environment variable."
-    
+def _top_risk(dataset):
+    return (
+        Prediction.objects.filter(dataset=dataset, prediction='Failure')
+        .order_by('-confidence', 'product_id')
+        .values('product_id', 'confidence')[:TOP_RISK_PRODUCTS]
+    )
+
+
+def generate_insight(dataset_id, dataset_file_path, client=None):
+    """
+    Generate and store an insight for a dataset. Run once its predictions
+    are stored (see ``insights.tasks``), so the prompt can name the products
+    most at risk.
+
+    ``client`` defaults to the shared ``InsightClient``; pass one built around
+    ``StubProvider`` to run without an LLM.
+    """
     dataset = Dataset.objects.get(id=dataset_id)
     
     df = pd.read_csv(dataset_file_path)
+    prompt = _prompt(df, list(_top_risk(dataset)))
     
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    prompt = f"Analyze this dataset about CNC milling machines and provide detailed insights.\n{df}"
-    response = model.generate_content(prompt)
-    
-    if response.text:
-        processed_recommendation = process_gemini_response(response.text)
-        Insight.objects.create(
-            dataset=dataset,
-            recommendation=processed_recommendation,
-        )
-    else:
-        raise Exception("Failed to generate insights from the dataset.")
+    text = (client or get_insight_client()).generate(prompt)
+    return Insight.objects.create(
+        dataset=dataset,
+        recommendation=process_gemini_response(text),
+    )
 
 
 import markdown
@@ -1,30 +1,50 @@
+from django.db.models import Count, Max
+from django.utils.decorators import method_decorator
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from .serializers import InsightSerializer
 from .models import Insight
+from authentication.authentication import TokenUserAuthentication
+from datasets.conditional import conditional, make_etag
+from datasets.permissions import owned_datasets
+from datasets.response_cache import cache_response
 
 
 class InsightListView(generics.ListAPIView):
     serializer_class = InsightSerializer
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return Insight.objects.filter(dataset__user=user)
+        return Insight.objects.filter(dataset__user_id=user.pk)
 
 
 class InsightDetailView(generics.RetrieveAPIView):
     serializer_class = InsightSerializer
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return Insight.objects.filter(dataset__user=user)
+        return Insight.objects.filter(dataset__user_id=user.pk)
 
 
+def dataset_insights_validators(request, dataset_id=None, **kwargs):
+    if not owned_datasets(request).filter(pk=dataset_id).exists():
+        return None
+    summary = Insight.objects.filter(dataset_id=dataset_id).aggregate(latest=Max('created_at'), count=Count('pk'))
+    if not summary['count']:
+        return None
+    return make_etag(request, 'insights', summary['count'], summary['latest']), summary['latest'], False
+
+
+@method_decorator(cache_response('dataset-insights'), name='get')
+@method_decorator(conditional(dataset_insights_validators), name='get')
 class DatasetInsightsView(generics.ListAPIView):
     """Get insights for a specific dataset"""
     serializer_class = InsightSerializer
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -34,4 +54,4 @@ class DatasetInsightsView(generics.ListAPIView):
         if not dataset_id:
             return Insight.objects.none()
 
-        return Insight.objects.filter(dataset=dataset_id, dataset__user=user)
\ No newline at end of file
+        return Insight.objects.filter(dataset=dataset_id, dataset__user_id=user.pk)
\ No newline at end of file
@@ -0,0 +1,18 @@
+"""
+Load test of the API with local stand-ins for its services.
+
+Run from ``backend/``::
+
+    python -m loadtest run --users 20 --duration 60 --output load.json
+
+``run`` starts the app in a subprocess (``python -m loadtest serve``) with
+``loadtest.settings``: SQLite in WAL mode instead of PostgreSQL, Celery's
+in-memory broker with eager tasks instead of Redis and a worker, the local
+memory cache and the stub insight provider instead of Gemini. Pass ``--url``
+to load an app that is already running instead, e.g. the full stack.
+
+Each virtual user creates a guest session, uploads a generated dataset and
+then keeps picking requests from the ``--mix`` weights: stats polling,
+prediction listing, dataset listing, more uploads or a new session. The
+report has throughput, latency percentiles and error rates per endpoint.
+"""
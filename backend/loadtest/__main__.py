@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from .scenario import DEFAULT_MIX, run_load
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _mix(value):
+    mix = dict(DEFAULT_MIX)
+    for part in value.split(','):
+        if part:
+            name, weight = part.split('=')
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f"unknown action '{name}' (available: {', '.join(DEFAULT_MIX)})")
+            mix[name] = float(weight)
+    return mix
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise SystemExit('The load test server exited, see its output above')
+        try:
+            requests.get(url + '/metrics/', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise SystemExit(f'{url} did not come up within {timeout}s')
+
+
+def _print_report(report):
+    for endpoint, stats in report['endpoints'].items():
+        latency = stats['latency']
+        print(f"{endpoint:<34} {stats['requests']:>6} req  {stats['throughput_per_s']:7.1f}/s  "
+              f"p50 {latency['p50'] * 1000:8.1f} ms  p95 {latency['p95'] * 1000:8.1f} ms  "
+              f"p99 {latency['p99'] * 1000:8.1f} ms  errors {stats['error_rate']:6.1%}", file=sys.stderr)
+    print(f"{'total':<34} {report['requests']:>6} req  {report['throughput_per_s']:7.1f}/s  "
+          f"errors {report['error_rate']:6.1%}", file=sys.stderr)
+
+
+def _write_uploads(directory, sizes, seed):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loadtest.settings')
+    import django
+
+    django.setup()
+    from datasets.synthetic import TelemetryModel, write_csv
+
+    model = TelemetryModel.fit()
+    paths = []
+    for i, rows in enumerate(sizes):
+        path = Path(directory) / f'upload_{rows}.csv'
+        write_csv(path, rows, model=model, seed=seed + i)
+        paths.append(str(path))
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='serve the app with the load test settings')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8001)
+
+    run = commands.add_parser('run', help='run a load test')
+    run.add_argument('--url', help='app to load (default: start one with the load test settings)')
+    run.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    run.add_argument('--duration', type=float, default=30, help='seconds')
+    run.add_argument('--mix', type=_mix, default=dict(DEFAULT_MIX),
+                     help=f"action weights, e.g. stats=5,upload=1 (default: "
+                          f"{','.join(f'{k}={v:g}' for k, v in DEFAULT_MIX.items())})")
+    run.add_argument('--upload-rows', default='1000,10000', help='comma separated sizes of the uploaded datasets')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--output', help='write the report here as JSON')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loadtest.settings')
+        import django
+
+        django.setup()
+        from .server import serve as serve_app
+
+        serve_app(args.host, args.port)
+        return 0
+
+    server = None
+    url = args.url
+    with tempfile.TemporaryDirectory() as directory:
+        uploads = _write_uploads(directory, [int(rows) for rows in args.upload_rows.split(',') if rows], args.seed)
+        if url is None:
+            port = _free_port()
+            url = f'http://127.0.0.1:{port}'
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'loadtest', 'serve', '--port', str(port)],
+                cwd=BACKEND_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'loadtest.settings'},
+            )
+        try:
+            _wait_until_up(url.rstrip('/'), server)
+            report = run_load(url, args.users, args.duration, uploads, args.mix, args.seed)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    report['settings'] = {
+        'url': args.url or 'local', 'users': args.users, 'duration': args.duration, 'mix': args.mix,
+        'upload_rows': args.upload_rows,
+    }
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
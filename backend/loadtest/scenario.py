@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+
+import numpy as np
+import requests
+
+PERCENTILES = (50, 90, 95, 99)
+
+DEFAULT_MIX = {'stats': 5, 'predictions': 3, 'datasets': 1, 'upload': 1, 'session': 0.5}
+
+
+class Recorder:
+    """Outcome of every request, by endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, status))
+
+    def report(self, elapsed):
+        endpoints = {}
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self.samples.items()}
+        for endpoint, values in sorted(samples.items()):
+            latencies = [seconds for seconds, _ in values]
+            errors = sum(1 for _, status in values if status is None or status >= 400)
+            statuses = {}
+            for _, status in values:
+                key = str(status or 'error')
+                statuses[key] = statuses.get(key, 0) + 1
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': errors / len(values),
+                'throughput_per_s': len(values) / elapsed,
+                'latency': {
+                    'mean': sum(latencies) / len(latencies),
+                    'max': max(latencies),
+                    **{f'p{q}': float(np.percentile(latencies, q)) for q in PERCENTILES},
+                },
+                'statuses': statuses,
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'elapsed': elapsed,
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'throughput_per_s': total / elapsed,
+            'endpoints': endpoints,
+        }
+
+
+class VirtualUser:
+    """One client of the app: a guest session with its datasets, sending one request at a time"""
+
+    def __init__(self, base_url, recorder, uploads, mix, rng, timeout=300):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.uploads = uploads
+        self.actions = list(mix)
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.datasets = []
+
+    def request(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(endpoint, time.perf_counter() - start, None)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+    def session(self):
+        self.http.headers.pop('X-Guest-Session', None)
+        self.datasets = []
+        response = self.request('POST /api/users/guest-sessions/', 'POST', '/api/users/guest-sessions/')
+        if response is not None and response.status_code == 201:
+            self.http.headers['X-Guest-Session'] = response.json()['session_id']
+            self.upload()
+
+    def upload(self):
+        path = self.rng.choice(self.uploads)
+        with open(path, 'rb') as f:
+            response = self.request(
+                'POST /api/datasets/upload/', 'POST', '/api/datasets/upload/', files={'file': ('telemetry.csv', f)},
+            )
+        if response is not None and response.status_code == 201:
+            self.datasets.append(response.json()['id'])
+
+    def stats(self):
+        if self.datasets:
+            pk = self.rng.choice(self.datasets)
+            self.request('GET /api/datasets/my/<pk>/stats/', 'GET', f'/api/datasets/my/{pk}/stats/')
+
+    def predictions(self):
+        if self.datasets:
+            pk = self.rng.choice(self.datasets)
+            self.request('GET /api/predictions/', 'GET', '/api/predictions/', params={'dataset': pk})
+
+    def list_datasets(self):
+        self.request('GET /api/datasets/my/', 'GET', '/api/datasets/my/')
+
+    def run(self, deadline):
+        self.session()
+        handlers = {
+            'stats': self.stats,
+            'predictions': self.predictions,
+            'datasets': self.list_datasets,
+            'upload': self.upload,
+            'session': self.session,
+        }
+        while time.monotonic() < deadline:
+            if 'X-Guest-Session' not in self.http.headers:
+                self.session()
+                continue
+            handlers[self.rng.choices(self.actions, self.weights)[0]]()
+
+
+def run_load(base_url, users, duration, uploads, mix, seed=0):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=VirtualUser(base_url, recorder, uploads, mix, random.Random(seed + i)).run,
+            args=(deadline,), name=f'user-{i}', daemon=True,
+        )
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - start)
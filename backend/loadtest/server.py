@@ -0,0 +1,14 @@
+import shutil
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.servers.basehttp import run
+from django.core.wsgi import get_wsgi_application
+
+
+def serve(host, port):
+    """Start from an empty database and media directory and serve the app with a thread per request"""
+    shutil.rmtree(settings.LOADTEST_ROOT, ignore_errors=True)
+    settings.LOADTEST_ROOT.mkdir(parents=True)
+    call_command('migrate', verbosity=0)
+    run(host, port, get_wsgi_application(), threading=True)
@@ -0,0 +1,41 @@
+# Settings of the load test server: the project settings with local stand-ins for PostgreSQL, Redis and Gemini
+import os
+import tempfile
+from pathlib import Path
+
+from config.settings import *  # noqa: F401,F403
+
+LOADTEST_ROOT = Path(os.getenv('LOADTEST_ROOT', Path(tempfile.gettempdir()) / 'machintel-loadtest'))
+
+SECRET_KEY = 'loadtest'
+DEBUG = False
+
+if os.getenv('LOADTEST_POSTGRES', 'False') != 'True':  # True keeps the DB_* PostgreSQL settings
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': LOADTEST_ROOT / 'db.sqlite3',
+            'OPTIONS': {
+                # Concurrent writers wait for each other instead of failing with "database is locked"
+                'timeout': 30,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
+MEDIA_ROOT = LOADTEST_ROOT / 'media'
+DATASET_CACHE_ROOT = MEDIA_ROOT / 'cache'
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'OPTIONS': {'MAX_ENTRIES': 10000}}}
+INSIGHT_PROVIDER = 'stub'
+
+# No worker: tasks run in the request that queues them, so scoring shows in the upload latency
+CELERY_BROKER_URL = 'memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'loggers': {'django.server': {'level': 'ERROR'}},  # no line per request
+}
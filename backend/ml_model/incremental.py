@@ -0,0 +1,270 @@
+"""
+Incremental retraining from labelled uploads.
+
+Uploads often carry the ``Machine failure`` label (and the TWF, HDF, PWF,
+OSF and RNF failure modes). ``TrainingStore`` collects the labelled rows of
+new uploads into an append-only directory of segments, one ``.npz`` file
+per dataset, listed in ``store.json`` with a watermark of the last dataset
+looked at. A file uploaded twice is collected once.
+
+Only the datasets of registered users are collected: guest uploads are
+deleted when their session expires (``datasets.cleanup``), so they never
+enter the store. Each cycle drops the segments of datasets that were
+deleted or lost their owner since, so the store keeps no rows of a dataset
+that is gone. Trees already grown from them stay in the model until they
+age out of the forest (see below).
+
+``retrain`` trains on the segments no model has seen yet, and only on
+those. The model is a random forest grown with ``warm_start``: each cycle
+adds ``INCREMENTAL_TREES_PER_CYCLE`` trees fitted on the new rows and keeps
+the trees of earlier cycles, dropping the oldest beyond
+``INCREMENTAL_MAX_TREES``. It uses the preprocessor of the model it grows
+from (the first cycle takes the active model's), so the feature encoding
+never changes between cycles. A cycle therefore costs in proportion to the
+new rows, not to all history.
+
+A fifth of the new rows is held out to score the retrained model and the
+active model, and to time the retrained one. Scoring and timing go through
+the promotion gates of ``ml_model.zoo``. The model is registered as a
+candidate, and also promoted when ``INCREMENTAL_AUTO_PROMOTE`` is set and
+it passes the gates.
+"""
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from . import registry
+from .train_model import feature_metadata, save_model
+from .zoo import SEED, TARGET, apply_gates, inference_speed, quality
+from datasets.columns import COLUMN_MAPPINGS, find_columns
+from datasets.models import Dataset
+
+LABEL_COLUMNS = [TARGET, 'TWF', 'HDF', 'PWF', 'OSF', 'RNF']
+# Canonical AI4I name of every column find_columns knows
+CANONICAL_NAMES = {key: names[0] for key, names in COLUMN_MAPPINGS.items()}
+STORED_COLUMNS = ['Type', 'Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]',
+                  'Torque [Nm]', 'Tool wear [min]']
+
+
+class StoreBusy(Exception):
+    """Another retraining cycle holds the store"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def labelled_rows(path):
+    """
+    The labelled rows of a dataset file, with canonical column names, or
+    None if it has no ``Machine failure`` column. Failure mode columns the
+    file lacks are -1; rows with a missing or unparsable value are dropped.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if TARGET not in header:
+        return None
+    found = find_columns(header)
+    renames = {found[key]: CANONICAL_NAMES[key] for key in found}
+    usecols = [column for column in header if column in renames or column in LABEL_COLUMNS]
+    df = pd.read_csv(path, usecols=usecols).rename(columns=renames)
+    missing = [column for column in STORED_COLUMNS if column not in df.columns]
+    if missing:
+        return None
+
+    rows = pd.DataFrame({'Type': df['Type']})
+    for column in STORED_COLUMNS[1:]:
+        rows[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in LABEL_COLUMNS:
+        rows[column] = pd.to_numeric(df[column], errors='coerce') if column in df.columns else -1
+    rows = rows.dropna()
+    rows = rows[rows[TARGET].isin([0, 1])]
+    return rows.astype({'Type': str, **{column: 'int8' for column in LABEL_COLUMNS}}).reset_index(drop=True)
+
+
+class TrainingStore:
+    def __init__(self, path=None):
+        self.path = Path(path or settings.TRAINING_STORE_DIR)
+        self.manifest_path = self.path / 'store.json'
+
+    def load(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'last_dataset_id': 0, 'content_hashes': [], 'segments': [], 'model_version': None}
+
+    def save(self, manifest):
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.store-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    @contextmanager
+    def locked(self):
+        """Hold the store for one cycle; raises StoreBusy if another cycle has it"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / '.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise StoreBusy(f"{self.path} is in use by another retraining cycle")
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def collect(self, manifest):
+        """Append a segment for every labelled user dataset uploaded since the last collection"""
+        added = []
+        seen = set(manifest['content_hashes'])
+        datasets = Dataset.objects.filter(pk__gt=manifest['last_dataset_id'], user__isnull=False).order_by('pk')
+        for dataset in datasets.only('pk', 'file', 'content_hash').iterator():
+            manifest['last_dataset_id'] = dataset.pk
+            if dataset.content_hash and dataset.content_hash in seen:
+                continue
+            try:
+                rows = labelled_rows(dataset.file.path)
+            except (OSError, ValueError, pd.errors.ParserError):
+                continue  # deleted or unreadable meanwhile
+            if rows is None or not len(rows):
+                continue
+            name = f'segment_{dataset.pk}.npz'
+            # Strings as fixed width unicode, so reading needs no pickle
+            np.savez(self.path / name, **{
+                column: rows[column].to_numpy(dtype=str if column == 'Type' else None) for column in rows.columns
+            })
+            segment = {
+                'file': name,
+                'dataset_id': dataset.pk,
+                'content_hash': dataset.content_hash,
+                'rows': len(rows),
+                'failures': int(rows[TARGET].sum()),
+                'collected_at': _now(),
+                'trained_by': None,
+            }
+            manifest['segments'].append(segment)
+            if dataset.content_hash:
+                manifest['content_hashes'].append(dataset.content_hash)
+                seen.add(dataset.content_hash)
+            added.append(segment)
+        return added
+
+    def prune(self, manifest):
+        """Drop the segments whose dataset was deleted or no longer has an owner; returns them"""
+        ids = [segment['dataset_id'] for segment in manifest['segments']]
+        kept = set(Dataset.objects.filter(pk__in=ids, user__isnull=False).values_list('pk', flat=True))
+        dropped = [segment for segment in manifest['segments'] if segment['dataset_id'] not in kept]
+        if not dropped:
+            return dropped
+        manifest['segments'] = [segment for segment in manifest['segments'] if segment['dataset_id'] in kept]
+        # A new upload of the same file may be collected again
+        hashes = {segment.get('content_hash') for segment in dropped}
+        manifest['content_hashes'] = [h for h in manifest['content_hashes'] if h not in hashes]
+        self.save(manifest)
+        for segment in dropped:
+            (self.path / segment['file']).unlink(missing_ok=True)
+        return dropped
+
+    def read(self, segments):
+        frames = []
+        for segment in segments:
+            with np.load(self.path / segment['file'], allow_pickle=False) as arrays:
+                frames.append(pd.DataFrame({column: arrays[column] for column in arrays.files}))
+        return pd.concat(frames, ignore_index=True)
+
+
+def _base_model(manifest, model_dir):
+    """The model the next cycle grows from: the last incremental model, or the active one for its preprocessor"""
+    version = manifest['model_version'] or registry.active_version(model_dir)
+    if version is None:
+        raise registry.RegistryError('No model to take the preprocessing from')
+    registry.verify(version, model_dir=model_dir)
+    model_path, features_path = registry.model_files(version, model_dir)
+    return version, joblib.load(model_path), joblib.load(features_path)['features']
+
+
+def grow_forest(classifier, X, y, trees):
+    """Add ``trees`` trees fitted on ``X, y`` to a warm started forest, keeping at most INCREMENTAL_MAX_TREES"""
+    if isinstance(classifier, RandomForestClassifier) and classifier.warm_start:
+        classifier.set_params(n_estimators=len(classifier.estimators_) + trees)
+    else:
+        classifier = RandomForestClassifier(
+            n_estimators=trees, warm_start=True, class_weight='balanced_subsample', max_depth=12,
+            random_state=SEED, n_jobs=-1,
+        )
+    classifier.fit(X, y)
+    if len(classifier.estimators_) > settings.INCREMENTAL_MAX_TREES:
+        classifier.estimators_ = classifier.estimators_[-settings.INCREMENTAL_MAX_TREES:]
+        classifier.n_estimators = settings.INCREMENTAL_MAX_TREES
+    return classifier
+
+
+def retrain(store=None, model_dir=None, log=print):
+    """One retraining cycle; returns its summary"""
+    store = store or TrainingStore()
+    with store.locked():
+        manifest = store.load()
+        pruned = store.prune(manifest)
+        collected = store.collect(manifest)
+        store.save(manifest)
+        pending = [segment for segment in manifest['segments'] if segment['trained_by'] is None]
+        rows = sum(segment['rows'] for segment in pending)
+        summary = {'pruned_segments': len(pruned), 'collected_segments': len(collected), 'pending_rows': rows}
+        if rows < settings.INCREMENTAL_MIN_ROWS:
+            return {**summary, 'skipped': f'fewer than {settings.INCREMENTAL_MIN_ROWS} new rows'}
+
+        df = store.read(pending)
+        if df[TARGET].nunique() < 2 or df[TARGET].value_counts().min() < 2:
+            return {**summary, 'skipped': 'new rows hold too few failures'}
+
+        base_version, base, features = _base_model(manifest, model_dir)
+        X_train, X_test, y_train, y_test = train_test_split(
+            df[features], df[TARGET], test_size=0.2, random_state=SEED, stratify=df[TARGET],
+        )
+        preprocessor = base['preprocessor']
+        classifier = grow_forest(
+            base['classifier'], preprocessor.transform(X_train), y_train, settings.INCREMENTAL_TREES_PER_CYCLE,
+        )
+        model = {'preprocessor': preprocessor, 'classifier': classifier}
+
+        entry = {'test': quality(model, X_test, y_test), **inference_speed(model, X_test)}
+        active_version = registry.active_version(model_dir)
+        baseline_f1 = None
+        if active_version is not None:
+            try:
+                active = joblib.load(registry.model_files(active_version, model_dir)[0])
+                baseline_f1 = quality(active, X_test, y_test)['f1']
+            except Exception as e:  # e.g. trained on other features
+                log(f"Active model could not be scored on the new rows: {e}")
+        apply_gates(entry, baseline_f1)
+
+        promote = settings.INCREMENTAL_AUTO_PROMOTE and entry['promotable']
+        version = save_model(
+            model, feature_metadata(df, features, TARGET), model_dir or settings.MODEL_DIR,
+            extra={'incremental': {'base_version': base_version, 'rows': rows, 'trees': len(classifier.estimators_)}},
+        )
+        registry.register(
+            version, metrics={'incremental': True, 'rows': rows, 'baseline_f1': baseline_f1, **entry['test']},
+            status='active' if promote else 'candidate', model_dir=model_dir,
+        )
+        for segment in pending:
+            segment['trained_by'] = version
+        manifest['model_version'] = version
+        store.save(manifest)
+        log(f"Model {version} grown from {base_version} on {rows} new rows: F1 {entry['test']['f1']:.3f}"
+            f"{' (promoted)' if promote else ''}")
+        return {
+            **summary, 'model_version': version, 'base_version': base_version, 'promoted': promote,
+            'f1': entry['test']['f1'], 'baseline_f1': baseline_f1, 'gate_failures': entry['gate_failures'],
+        }
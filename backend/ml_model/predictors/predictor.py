@@ -3,114 +3,192 @@ import pandas as pd
 import numpy as np
 import joblib
 from pathlib import Path
+from scipy import sparse
+
+from django.conf import settings
+
+from .. import registry
+
+FEATURE_COLUMNS = [
+    'Product ID', 'Type', 'Air temperature [K]', 'Process temperature [K]',
+    'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]',
+]
+NUMERIC_COLUMNS = FEATURE_COLUMNS[2:]
+
+
+def _path_contributions(tree, X, failure_index):
+    """
+    Contribution of every model column to every row's failure probability
+    in one tree: the change of the failure rate at each split on the row's
+    path, credited to the column the split tests.
+    """
+    t = tree.tree_
+    value = t.value[:, 0, :]
+    rate = value[:, failure_index] / value.sum(axis=1)
+    nodes = np.arange(t.node_count)
+    parent = np.full(t.node_count, -1)
+    internal = t.children_left >= 0
+    parent[t.children_left[internal]] = nodes[internal]
+    parent[t.children_right[internal]] = nodes[internal]
+    child = nodes[parent >= 0]
+    # (nodes x columns): what entering each node adds, under the column its parent split on
+    moves = sparse.csr_matrix(
+        (rate[child] - rate[parent[child]], (child, t.feature[parent[child]])), shape=(t.node_count, X.shape[1]),
+    )
+    return (tree.decision_path(X) @ moves).toarray()
 
 class PredictiveMaintenancePredictor:
-    def __init__(self):
+    def __init__(self, version=None, model_dir=None):
         self.model = None
         self.features = None
-        self.model_dir = Path(__file__).parent
+        self.model_version = None
+        self.training_stats = None
+        self.model_dir = Path(model_dir or settings.MODEL_DIR)
         self.type_map = {'L': 0, 'M': 1, 'H': 2}
-        self.load_latest_model()
+        self.load_latest_model(version)
 
-    def load_latest_model(self) -> bool:
-        """Load the most recent model with its feature list"""
-        try:
+    def _version_to_load(self, version):
+        """``version``, else the registry's active model, else the newest file if there is no registry"""
+        manifest = registry.load_manifest(self.model_dir)
+        if manifest is None:
+            if version is not None:
+                return version
             model_files = sorted(self.model_dir.glob("model_*.joblib"))
             if not model_files:
                 raise FileNotFoundError("No model files found")
+            print("[WARNING] No model registry, loading the newest model file")
+            return model_files[-1].stem.replace("model_", "")
+
+        version = version or manifest['active']
+        if version is None:
+            raise FileNotFoundError("The model registry has no active model")
+        registry.verify(version, manifest, self.model_dir)
+        return version
 
-            latest_model = model_files[-1]
+    def load_latest_model(self, version=None) -> bool:
+        """Load the active model (or ``version``) with its feature list"""
+        try:
+            version = self._version_to_load(version)
+            model_file = self.model_dir / f"model_{version}.joblib"
 
-            print("[INFO] Loading model:", latest_model)
+            print("[INFO] Loading model:", model_file)
 
-            self.model = joblib.load(latest_model)
+            self.model = joblib.load(model_file)
+            self.model_version = version
 
             # Load corresponding features
-            features_file = latest_model.name.replace("model_", "features_")
-            features_data = joblib.load(self.model_dir / features_file)
+            features_data = joblib.load(self.model_dir / f"features_{version}.joblib")
             self.features = features_data['features']
+            self.training_stats = features_data.get('training_stats')
 
             return True
         except Exception as e:
             print(f"[ERROR] Model loading failed: {str(e)}")
             return False
 
+    def read(self, file_path: str) -> pd.DataFrame:
+        return pd.read_csv(file_path)
+
+    def prepare(self, df: pd.DataFrame):
+        """
+        Rows that can be scored and the number of rows that cannot.
+
+        Rows without a Product ID are left out silently, as before; rows whose
+        numeric columns do not parse are counted as errors.
+        """
+        missing = [column for column in FEATURE_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        frame = df.loc[df['Product ID'].notna(), FEATURE_COLUMNS].copy()
+        frame['Product ID'] = frame['Product ID'].astype(str)
+        frame['Type'] = frame['Type'].astype(str)  # keep as string for the OneHotEncoder
+        for column in NUMERIC_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(float)
+        valid = frame[NUMERIC_COLUMNS].notna().all(axis=1)
+        return frame[valid], int((~valid).sum())
+
+    def score(self, frame: pd.DataFrame) -> np.ndarray:
+        """Failure probability of every row, scored as one batch"""
+        if not len(frame):
+            return np.empty(0)
+        X_preprocessed = self.model['preprocessor'].transform(frame[self.features])
+        return self.model['classifier'].predict_proba(X_preprocessed)[:, 1]
+
+    def _column_features(self):
+        """(model columns x features) matrix that adds one-hot columns back up to their feature"""
+        names = self.model['preprocessor'].get_feature_names_out()
+        mapping = np.zeros((len(names), len(self.features)))
+        for i, name in enumerate(names):
+            column = name.split('__', 1)[-1]
+            for j, feature in enumerate(self.features):
+                if column == feature or column.startswith(feature + '_'):
+                    mapping[i, j] = 1
+                    break
+        return mapping
+
+    def explain(self, frame: pd.DataFrame, top_k: int = 3):
+        """
+        Why every row scored as it did: its ``top_k`` strongest feature
+        contributions to the failure probability, as ``[feature, contribution]``
+        pairs. None if the model is not made of decision trees.
+
+        All rows are done at once: ``decision_path`` gives the nodes every row
+        passes as one sparse matrix, and its product with the per-node change
+        of the failure rate gives every row's contributions. Forests average
+        their trees. The contributions add up to the row's probability minus
+        the failure rate of the (resampled) training data.
+        """
+        classifier = self.model['classifier']
+        trees = getattr(classifier, 'estimators_', [classifier])
+        if not len(frame) or not top_k or not all(hasattr(tree, 'tree_') for tree in trees):
+            return None
+
+        X = np.asarray(self.model['preprocessor'].transform(frame[self.features]), dtype=np.float32)
+        rows = None
+        if len(trees) == 1:
+            # Rows in the same leaf share their path, so explain one row per leaf
+            _, first, rows = np.unique(classifier.apply(X), return_index=True, return_inverse=True)
+            X = X[first]
+        failure_index = list(classifier.classes_).index(1)
+        contributions = sum(_path_contributions(tree, X, failure_index) for tree in trees) / len(trees)
+        contributions = contributions @ self._column_features()
+
+        top = np.argsort(-np.abs(contributions), axis=1)[:, :top_k]
+        strongest = np.round(np.take_along_axis(contributions, top, axis=1), 4)
+        reasons = [
+            [[self.features[j], float(c)] for j, c in zip(columns, values) if c]
+            for columns, values in zip(top.tolist(), strongest.tolist())
+        ]
+        return reasons if rows is None else [reasons[i] for i in rows.ravel().tolist()]
+
+    @staticmethod
+    def results(frame: pd.DataFrame, proba: np.ndarray, explanations=None):
+        rows = zip(frame.to_dict(orient='records'), proba, explanations or [None] * len(proba))
+        return [
+            {
+                'product_id': features['Product ID'],
+                'prediction': 'Failure' if probability >= 0.5 else 'Normal',
+                'confidence': float(probability),
+                'features': features,
+                'explanation': explanation,
+            }
+            for features, probability, explanation in rows
+        ]
+
     def predict(self, file_path: str):
-        print("file path: ", file_path)
         import os
         if not os.path.exists(file_path):
             print("File does not exist:", file_path)
             return []
 
         try:
-            df = pd.read_csv(file_path)
-            # print("File contents:", df.head()) # TODO: Remove
-            
-            results = []
-            print("first 5 rows in dataset", df.head(5)) # TODO: Remove
-            
-            # This is important: Let the preprocessor handle the type conversion
-            # Don't convert 'Type' to numeric here - let the OneHotEncoder do it
-            
-            for _, row in df.iterrows():
-                if 'Product ID' not in row or pd.isna(row['Product ID']):
-                    print("Row missing Product ID:", row)
-                    continue
-
-                try:
-                    # Create a DataFrame with just one row for this prediction
-                    # IMPORTANT: Leave Type as string for the OneHotEncoder
-                    single_row_df = pd.DataFrame({
-                        'Product ID': [str(row['Product ID'])],
-                        'Type': [str(row['Type'])],  # Keep as string
-                        'Air temperature [K]': [float(row['Air temperature [K]'])],
-                        'Process temperature [K]': [float(row['Process temperature [K]'])],
-                        'Rotational speed [rpm]': [float(row['Rotational speed [rpm]'])],
-                        'Torque [Nm]': [float(row['Torque [Nm]'])],
-                        'Tool wear [min]': [float(row['Tool wear [min]'])]
-                    })
-                    
-                    # Select only the features used in training
-                    X = single_row_df[self.features]
-                    
-                    # Debug - print types
-                    # print(f"Row {row['Product ID']} types before preprocessing:", X.dtypes) # TODO: Remove
-                    
-                    # Apply preprocessing - this should handle categorical feature encoding
-                    X_preprocessed = self.model['preprocessor'].transform(X)
-                    
-                    # Debug - print shape of preprocessed data
-                    # print(f"Preprocessed shape: {X_preprocessed.shape}") # TODO: Remove
-                    
-                    # Make prediction
-                    proba = self.model['classifier'].predict_proba(X_preprocessed)[0][1]
-                    
-                    results.append({
-                        'product_id': row['Product ID'],
-                        'prediction': 'Failure' if proba >= 0.5 else 'Normal',
-                        'confidence': float(proba),
-                        'features': {
-                            'Product ID': str(row['Product ID']),
-                            'Type': str(row['Type']),  # keep original string
-                            'Air temperature [K]': float(row['Air temperature [K]']),
-                            'Process temperature [K]': float(row['Process temperature [K]']),
-                            'Rotational speed [rpm]': float(row['Rotational speed [rpm]']),
-                            'Torque [Nm]': float(row['Torque [Nm]']),
-                            'Tool wear [min]': float(row['Tool wear [min]'])
-                        }
-                    })
-
-                except Exception as e:
-                    error_message = f"Error processing row: {str(e)}"
-                    print(error_message)
-                    results.append({
-                        'product_id': row.get('Product ID', 'unknown'),
-                        'error': error_message
-                    })
-
-            # print("results from predictor: ", results) # TODO: Remove
-            return results
+            df = self.read(file_path)
+            frame, errors = self.prepare(df)
+            if errors:
+                print(f"Skipped {errors} rows with invalid feature values")
+            return self.results(frame, self.score(frame))
 
         except Exception as e:
             print(f"Exception in predict method: {str(e)}")
-            return [{"error": str(e)}]
\ No newline at end of file
+            return [{"error": str(e)}]
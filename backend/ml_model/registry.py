@@ -0,0 +1,248 @@
+"""
+Registry of the trained models, kept in ``registry.json`` in ``MODEL_DIR``.
+
+Each version (the ``<version>`` of its ``model_<version>.joblib`` and
+``features_<version>.joblib`` files) has an entry with its status
+(candidate, active or retired), metrics, feature schema and the sha256 of
+both files. Exactly one version is active; that is the one
+``PredictiveMaintenancePredictor`` loads, after checking its checksum.
+Other files in the directory are ignored.
+
+``promote`` activates a version and retires the previous one, ``rollback``
+reactivates the version that was active before. The history of both is
+kept in the manifest. Every change of the manifest is a read-modify-write
+under an exclusive lock on ``.registry.lock``, so a nightly registration
+cannot undo a promotion made at the same time. The manifest can also name a shadow version, which
+``ml_model.tasks.shadow_score`` runs on a sample of processed datasets to
+compare with the active model.
+
+``training_stats`` reads the statistics of the training data stored with a
+version from its features file alone, for callers that do not score.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+
+MANIFEST_NAME = 'registry.json'
+LOCK_NAME = '.registry.lock'
+STATUSES = ('candidate', 'active', 'retired')
+
+
+class RegistryError(Exception):
+    pass
+
+
+def _dir(model_dir):
+    return Path(model_dir or settings.MODEL_DIR)
+
+
+def manifest_path(model_dir=None):
+    return _dir(model_dir) / MANIFEST_NAME
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_checksums = {}
+
+
+def _cached_checksum(path):
+    # Every predictor verifies its model, so hash each file once per process
+    # for as long as its size and modification time stay the same
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _checksums:
+        _checksums[key] = checksum(path)
+    return _checksums[key]
+
+
+def model_files(version, model_dir=None):
+    model_dir = _dir(model_dir)
+    return model_dir / f'model_{version}.joblib', model_dir / f'features_{version}.joblib'
+
+
+def load_manifest(model_dir=None):
+    """The manifest, or None if the directory has none yet"""
+    try:
+        with open(manifest_path(model_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(manifest, model_dir=None):
+    # Write and rename, so readers never see a half written manifest
+    fd, tmp = tempfile.mkstemp(dir=_dir(model_dir), prefix='.registry-', suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    # mkstemp creates the file readable by its owner only, but the web and
+    # worker processes may run as other users than the one managing models
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, manifest_path(model_dir))
+
+
+@contextmanager
+def _locked(model_dir=None):
+    """Hold the registry for one read-modify-write of the manifest, waiting for other holders"""
+    with open(_dir(model_dir) / LOCK_NAME, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _empty_manifest():
+    return {'active': None, 'shadow': None, 'models': {}, 'history': []}
+
+
+def _entry(manifest, version):
+    try:
+        return manifest['models'][version]
+    except KeyError:
+        raise RegistryError(f"Model {version} is not registered")
+
+
+def register(version, metrics=None, status='candidate', model_dir=None):
+    """Add a saved model to the registry, as a candidate unless told otherwise"""
+    model_path, features_path = model_files(version, model_dir)
+    if not model_path.exists() or not features_path.exists():
+        raise RegistryError(f"Missing {model_path.name} or {features_path.name}")
+    feature_data = joblib.load(features_path)
+    with _locked(model_dir):
+        manifest = load_manifest(model_dir) or _empty_manifest()
+        if version in manifest['models']:
+            raise RegistryError(f"Model {version} is already registered")
+
+        manifest['models'][version] = {
+            'version': version,
+            'status': 'candidate',
+            'registered_at': _now(),
+            'files': {'model': model_path.name, 'features': features_path.name},
+            'checksums': {'model': checksum(model_path), 'features': checksum(features_path)},
+            'features': feature_data['features'],
+            'feature_types': feature_data.get('feature_types', {}),
+            'metrics': metrics or {},
+        }
+        if status == 'active':
+            _activate(manifest, version, 'promote')
+        save_manifest(manifest, model_dir)
+    return manifest['models'][version]
+
+
+def _activate(manifest, version, action):
+    previous = manifest['active']
+    if previous == version:
+        raise RegistryError(f"Model {version} is already active")
+    entry = _entry(manifest, version)
+    if previous is not None:
+        manifest['models'][previous]['status'] = 'retired'
+        manifest['models'][previous]['retired_at'] = _now()
+    entry['status'] = 'active'
+    entry['activated_at'] = _now()
+    manifest['active'] = version
+    if manifest.get('shadow') and manifest['shadow']['version'] == version:
+        manifest['shadow'] = None
+    manifest['history'].append({'action': action, 'version': version, 'previous': previous, 'at': _now()})
+
+
+def promote(version, model_dir=None):
+    with _locked(model_dir):
+        manifest = load_manifest(model_dir) or _empty_manifest()
+        verify(version, manifest, model_dir)
+        _activate(manifest, version, 'promote')
+        save_manifest(manifest, model_dir)
+    return manifest
+
+
+def rollback(model_dir=None):
+    """Reactivate the version that was active before the current one"""
+    with _locked(model_dir):
+        manifest = load_manifest(model_dir)
+        if manifest is None or manifest['active'] is None:
+            raise RegistryError("No active model to roll back")
+        for event in reversed(manifest['history']):
+            if event['version'] == manifest['active'] and event['previous'] is not None:
+                previous = event['previous']
+                break
+        else:
+            raise RegistryError(f"Model {manifest['active']} has no previous version to roll back to")
+        verify(previous, manifest, model_dir)
+        _activate(manifest, previous, 'rollback')
+        save_manifest(manifest, model_dir)
+    return manifest
+
+
+def verify(version, manifest=None, model_dir=None):
+    """Raise RegistryError unless both files of ``version`` match their registered checksums"""
+    manifest = manifest or load_manifest(model_dir) or _empty_manifest()
+    entry = _entry(manifest, version)
+    for kind, path in zip(('model', 'features'), model_files(version, model_dir)):
+        if not path.exists():
+            raise RegistryError(f"{path.name} is missing")
+        if _cached_checksum(path) != entry['checksums'][kind]:
+            raise RegistryError(f"{path.name} does not match its registered checksum")
+    return entry
+
+
+def set_shadow(version, sample_rate, model_dir=None):
+    """Shadow score ``sample_rate`` of the processed datasets with ``version``; None turns shadowing off"""
+    with _locked(model_dir):
+        manifest = load_manifest(model_dir) or _empty_manifest()
+        if version is None:
+            manifest['shadow'] = None
+        else:
+            if version == manifest['active']:
+                raise RegistryError(f"Model {version} is the active model")
+            verify(version, manifest, model_dir)
+            manifest['shadow'] = {'version': version, 'sample_rate': sample_rate}
+        save_manifest(manifest, model_dir)
+    return manifest
+
+
+_training_stats = {}
+
+
+def training_stats(version=None, model_dir=None):
+    """The ``training_stats`` stored with ``version``, the active model by default; cached per features file"""
+    version = version or active_version(model_dir)
+    if version is None:
+        return None
+    _, features_path = model_files(version, model_dir)
+    try:
+        stat = features_path.stat()
+    except FileNotFoundError:
+        return None
+    key = (str(features_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _training_stats:
+        _training_stats[key] = joblib.load(features_path).get('training_stats')
+    return _training_stats[key]
+
+
+def active_version(model_dir=None):
+    manifest = load_manifest(model_dir)
+    return manifest['active'] if manifest else None
+
+
+def shadow(model_dir=None):
+    """``{'version', 'sample_rate'}`` of the shadow model, or None"""
+    manifest = load_manifest(model_dir)
+    return manifest.get('shadow') if manifest else None
@@ -0,0 +1,43 @@
+"""
+Celery routing of the scoring task, by dataset size.
+
+Datasets up to ``SCORING_INTERACTIVE_MAX_BYTES`` are scored on the
+``interactive-scoring`` queue, bigger ones on ``bulk-scoring``, so one large
+upload never holds up the small ones behind it. Within a queue smaller
+datasets get a higher priority. Scoring the rows appended to a dataset is
+routed the same way, by the size of those rows. The other routes are plain patterns in
+``CELERY_TASK_ROUTES``.
+"""
+import math
+
+from django.conf import settings
+
+from datasets.models import Dataset
+
+INTERACTIVE_QUEUE = 'interactive-scoring'
+BULK_QUEUE = 'bulk-scoring'
+
+# Redis pops priority 0 first and (with the default priority_steps) knows 0 to 9
+MAX_PRIORITY = 9
+
+
+def scoring_priority(size):
+    """0 for datasets up to ``SCORING_PRIORITY_BASE_BYTES``, one step lower per doubling of the size"""
+    doublings = math.log2(max(size, 1) / settings.SCORING_PRIORITY_BASE_BYTES)
+    return min(MAX_PRIORITY, max(0, math.ceil(doublings)))
+
+
+def scoring_route(size):
+    queue = INTERACTIVE_QUEUE if size <= settings.SCORING_INTERACTIVE_MAX_BYTES else BULK_QUEUE
+    return {'queue': queue, 'priority': scoring_priority(size)}
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    if name == 'ml_model.tasks.score_appended_rows':
+        begin, end = args[2:4] if len(args) >= 4 else (kwargs.get('begin'), kwargs.get('end'))
+        return scoring_route(end - begin)
+    if name != 'ml_model.tasks.process_dataset':
+        return None
+    dataset_id = args[0] if args else kwargs.get('dataset_id')
+    size = Dataset.objects.filter(pk=dataset_id).values_list('file_size', flat=True).first()
+    return scoring_route(size or 0)
@@ -1,44 +1,389 @@
 # ml_model/tasks.py
+import logging
+import os
+import random
+import uuid
+from datetime import timedelta
+
+import numpy as np
 from celery import shared_task
+from config.celery import app  # noqa: F401, configures the app shared_task binds to
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import incremental, registry
 from .predictors.predictor import PredictiveMaintenancePredictor
-from datasets.models import Dataset
-from predictions.models import Prediction
-import os
-from config.celery import app
+from datasets.models import Dataset, DatasetProcessing
+from datasets.response_cache import invalidate_dataset
+from datasets.row_index import read_byte_range
+from insights.tasks import generate_dataset_insight
+from monitoring.stages import StageTimer
+from predictions.models import Prediction, ShadowComparison
 
-@shared_task
-def process_dataset(dataset_id):
-    try:
-        dataset = Dataset.objects.get(id=dataset_id)
-        file_path = dataset.file.path
+logger = logging.getLogger(__name__)
+
+# Failures worth another attempt: the database went away or was locked
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class LeaseLost(Exception):
+    """Another run took the dataset over after this run's lease expired"""
+
+
+def _lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.PROCESSING_LEASE_SECONDS)
+
+
+def claim_processing(dataset, task_id, model_version):
+    """
+    Take the processing lock of ``dataset`` for ``task_id``.
+
+    Returns None when the run may go ahead, otherwise why it should not:
+    the predictions of ``model_version`` are already stored, or another run
+    holds a lease that has not expired. The claim is a single conditional
+    UPDATE, so of two runs racing for it exactly one wins. A redelivered
+    task (same id) may always take its own claim back.
+    """
+    DatasetProcessing.objects.get_or_create(dataset=dataset)
+    now = timezone.now()
+    claimable = (
+        Q(status__in=['pending', 'failed'])
+        | Q(status='succeeded') & ~Q(model_version=model_version)
+        | Q(status='running') & (Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True) | Q(task_id=task_id))
+    )
+    claimed = DatasetProcessing.objects.filter(claimable, dataset=dataset).update(
+        status='running',
+        task_id=task_id,
+        model_version=model_version,
+        rows=0,
+        errors=0,
+        bytes_read=0,
+        stages={},
+        error='',
+        started_at=now,
+        finished_at=None,
+        lease_expires_at=_lease_expiry(),
+        attempts=F('attempts') + 1,
+    )
+    if claimed:
+        return None
+    status = DatasetProcessing.objects.filter(dataset=dataset).values_list('status', flat=True).first()
+    return 'up to date' if status == 'succeeded' else 'in progress'
 
-        predictor = PredictiveMaintenancePredictor()
-        results = predictor.predict(file_path)
 
-        # print("results:", results) # TODO: Remove
+def _owned(dataset, task_id):
+    return DatasetProcessing.objects.filter(dataset=dataset, task_id=task_id, status='running')
 
-        # Save predictions to the database
-        for result in results:
 
-            product_id = result.get('product_id')
+def _renew(dataset, task_id):
+    if not _owned(dataset, task_id).update(lease_expires_at=_lease_expiry()):
+        raise LeaseLost(f"Dataset {dataset.pk} was taken over by another run")
 
-            if not product_id:
-                print("Skipping row with missing product_id:", result)
-                continue  # skip invalid row
 
-            Prediction.objects.create(
+def claim_append(dataset, task_id):
+    """
+    Take the processing lock of ``dataset`` for appending rows (see
+    ``datasets.append``), which the scoring of those rows releases. Only a
+    dataset whose predictions are stored can be appended to, so this returns
+    False while it is still being processed, or was never processed.
+    """
+    now = timezone.now()
+    return bool(DatasetProcessing.objects.filter(dataset=dataset, status='succeeded').update(
+        status='running',
+        task_id=task_id,
+        error='',
+        started_at=now,
+        finished_at=None,
+        lease_expires_at=_lease_expiry(),
+    ))
+
+
+def release_append(dataset, task_id, error=''):
+    """Give up an append's claim: back to succeeded when nothing was appended, failed when rows went unscored"""
+    return _owned(dataset, task_id).update(
+        status='failed' if error else 'succeeded',
+        error=error,
+        finished_at=timezone.now(),
+        lease_expires_at=None,
+    )
+
+
+def _create_predictions(dataset, results, model_version, batch_size):
+    for start in range(0, len(results), batch_size):
+        Prediction.objects.bulk_create([
+            Prediction(
                 dataset=dataset,
-                product_id=product_id,
-                prediction=result.get('prediction', 'error'),
-                confidence=result.get('confidence', None),
-                features=result.get('features', {}),
+                product_id=result['product_id'],
+                prediction=result['prediction'],
+                confidence=result['confidence'],
+                features=result['features'],
+                explanation=result.get('explanation'),
+                model_version=model_version,
             )
+            for result in results[start:start + batch_size]
+        ])
+
+
+def _replace_predictions(dataset, results, model_version, batch_size):
+    """Swap the dataset's predictions for ``results`` in one transaction, so readers see one set or the other"""
+    predictions = Prediction.objects.filter(dataset=dataset)
+    predictions._raw_delete(predictions.db)
+    _create_predictions(dataset, results, model_version, batch_size)
+
+
+def _finish(dataset, task_id, timer, status, error=''):
+    summary = timer.as_dict()
+    return _owned(dataset, task_id).update(
+        status=status,
+        error=error,
+        stages=summary['stages'],
+        rows=summary.get('rows', 0),
+        errors=summary.get('errors', 0),
+        bytes_read=summary.get('bytes_read', 0),
+        finished_at=timezone.now(),
+        lease_expires_at=None,
+    )
+
 
-        print("Dataset processed successfully.")
+@shared_task(bind=True, acks_late=True, max_retries=settings.PROCESSING_MAX_RETRIES)
+def process_dataset(self, dataset_id):
+    """
+    Score every row of a dataset and store the predictions.
 
+    Safe to run more than once: the run claims the dataset's
+    ``DatasetProcessing`` lease first, skips when the current model's
+    predictions are already stored or another live run has the lease, and
+    replaces any older predictions in the same transaction that writes the
+    new ones. That makes late acks and retries of transient database errors
+    harmless.
+
+    Once the predictions are stored, the dataset's insight is queued.
+
+    The run is split in stages (load_model, read, preprocess, predict, explain, write)
+    whose timings, together with the rows stored, rows that could not be
+    scored and bytes read, end up on the processing record and in the
+    returned summary, which ``monitoring.task_metrics`` turns into worker
+    metrics.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id)
     except Dataset.DoesNotExist:
-        print(f"Dataset with ID {dataset_id} does not exist.")
+        logger.error("Dataset with ID %s does not exist.", dataset_id)
         raise Exception(f"Dataset with ID {dataset_id} does not exist.")
+
+    task_id = self.request.id or str(uuid.uuid4())
+    timer = StageTimer()
+    with timer.stage('load_model'):
+        predictor = PredictiveMaintenancePredictor()
+    if predictor.model is None:
+        raise Exception(f"Error processing dataset {dataset_id}: No model could be loaded")
+    model_version = predictor.model_version or ''
+
+    skipped = claim_processing(dataset, task_id, model_version)
+    if skipped:
+        logger.info("Skipping dataset %s: %s", dataset_id, skipped)
+        return {'dataset_id': dataset_id, 'model_version': model_version, 'skipped': skipped}
+
+    try:
+        file_path = dataset.file.path
+        with timer.stage('read'):
+            df = predictor.read(file_path)
+        timer.count('bytes_read', os.path.getsize(file_path))
+
+        with timer.stage('preprocess'):
+            frame, errors = predictor.prepare(df)
+        timer.count('errors', errors)
+
+        with timer.stage('predict'):
+            proba = predictor.score(frame)
+        with timer.stage('explain'):
+            explanations = predictor.explain(frame, settings.PREDICTION_EXPLANATION_TOP_K)
+            results = predictor.results(frame, proba, explanations)
+        _renew(dataset, task_id)
+
+        with transaction.atomic():
+            with timer.stage('write'):
+                _replace_predictions(dataset, results, model_version, settings.PREDICTION_WRITE_BATCH_SIZE)
+                dataset.processed_at = timezone.now()
+                dataset.model_version = model_version
+                dataset.save(update_fields=['processed_at', 'model_version'])
+            timer.count('rows', len(results))
+            # Fencing: commit only while the lease is still ours
+            if not _finish(dataset, task_id, timer, 'succeeded'):
+                raise LeaseLost(f"Dataset {dataset.pk} was taken over by another run")
+        # bulk_create sends no signals
+        invalidate_dataset(dataset)
+
+    except LeaseLost as e:
+        logger.warning("%s, dropping this run's results", e)
+        return {'dataset_id': dataset_id, 'model_version': model_version, 'skipped': 'taken over'}
     except Exception as e:
-        print(f"Error processing dataset {dataset_id}: {str(e)}")
-        raise Exception(f"Error processing dataset {dataset_id}: {str(e)}")
\ No newline at end of file
+        logger.exception("Error processing dataset %s", dataset_id)
+        try:
+            _finish(dataset, task_id, timer, 'failed', str(e))
+        except TRANSIENT_ERRORS:
+            pass  # the lease stays with this task id, so the retry can claim it back
+        if isinstance(e, TRANSIENT_ERRORS):
+            raise self.retry(exc=e, countdown=settings.PROCESSING_RETRY_DELAY * 2 ** self.request.retries)
+        raise Exception(f"Error processing dataset {dataset_id}: {str(e)}")
+
+    logger.info("Dataset %s processed: %s", dataset_id, timer.as_dict())
+    _queue_insight(dataset_id)
+    _sample_for_shadow(dataset_id, model_version)
+    return {'dataset_id': dataset_id, 'model_version': model_version, **timer.as_dict()}
+
+
+@shared_task(bind=True, acks_late=True, max_retries=settings.PROCESSING_MAX_RETRIES)
+def score_appended_rows(self, dataset_id, task_id, begin, end):
+    """
+    Score the rows appended to a dataset in bytes ``begin`` to ``end`` of its
+    file, and add their predictions to the stored ones.
+
+    Runs under the processing lease ``datasets.append`` claimed for
+    ``task_id`` and uses the model that scored the rest of the dataset, so
+    its predictions stay one set. Only the new rows are read and scored. If
+    they cannot be, the processing is marked failed and a full run queued,
+    which scores every row again.
+    """
+    dataset = Dataset.objects.get(id=dataset_id)
+    timer = StageTimer()
+    model_version = dataset.model_version
+    try:
+        with timer.stage('load_model'):
+            predictor = PredictiveMaintenancePredictor(version=model_version or None)
+        if predictor.model is None:
+            raise Exception(f"Model {model_version} could not be loaded")
+
+        with timer.stage('read'):
+            df = read_byte_range(dataset.file.path, begin, end)
+        timer.count('bytes_read', end - begin)
+        with timer.stage('preprocess'):
+            frame, errors = predictor.prepare(df)
+        timer.count('errors', errors)
+        with timer.stage('predict'):
+            proba = predictor.score(frame)
+        with timer.stage('explain'):
+            explanations = predictor.explain(frame, settings.PREDICTION_EXPLANATION_TOP_K)
+            results = predictor.results(frame, proba, explanations)
+        _renew(dataset, task_id)
+
+        with transaction.atomic():
+            with timer.stage('write'):
+                _create_predictions(dataset, results, model_version, settings.PREDICTION_WRITE_BATCH_SIZE)
+                dataset.processed_at = timezone.now()
+                dataset.save(update_fields=['processed_at'])
+            timer.count('rows', len(results))
+            # Fencing, as in process_dataset
+            if not _owned(dataset, task_id).update(
+                status='succeeded',
+                rows=F('rows') + len(results),
+                errors=F('errors') + errors,
+                finished_at=timezone.now(),
+                lease_expires_at=None,
+            ):
+                raise LeaseLost(f"Dataset {dataset.pk} was taken over by another run")
+        invalidate_dataset(dataset)
+
+    except LeaseLost as e:
+        logger.warning("%s, dropping the appended rows' predictions", e)
+        return {'dataset_id': dataset_id, 'model_version': model_version, 'skipped': 'taken over'}
+    except Exception as e:
+        if isinstance(e, TRANSIENT_ERRORS) and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=settings.PROCESSING_RETRY_DELAY * 2 ** self.request.retries)
+        logger.exception("Error scoring the rows appended to dataset %s", dataset_id)
+        release_append(dataset, task_id, str(e))
+        process_dataset.delay(dataset_id)
+        raise Exception(f"Error scoring the rows appended to dataset {dataset_id}: {str(e)}")
+
+    logger.info("Rows appended to dataset %s scored: %s", dataset_id, timer.as_dict())
+    return {'dataset_id': dataset_id, 'model_version': model_version, **timer.as_dict()}
+
+
+def _queue_insight(dataset_id):
+    try:
+        generate_dataset_insight.delay(dataset_id)
+    except Exception:
+        # Like shadowing: the predictions are stored either way
+        logger.exception("Could not enqueue the insight of dataset %s", dataset_id)
+
+
+def _sample_for_shadow(dataset_id, model_version):
+    config = registry.shadow()
+    if not config or config['version'] == model_version or random.random() >= config['sample_rate']:
+        return
+    try:
+        shadow_score.delay(dataset_id, config['version'])
+    except Exception:
+        # Shadowing is best effort and must never fail the run that stored the predictions
+        logger.exception("Could not enqueue shadow scoring of dataset %s", dataset_id)
+
+
+@shared_task
+def shadow_score(dataset_id, shadow_version):
+    """
+    Score a processed dataset with the shadow model and record how it
+    compares with the stored predictions, in a ``ShadowComparison``.
+
+    Nothing the active model stored is touched. The rows are those
+    ``process_dataset`` scored, in the same order, so they line up with the
+    predictions by primary key.
+    """
+    dataset = Dataset.objects.get(id=dataset_id)
+    stored = list(
+        Prediction.objects.filter(dataset=dataset).order_by('pk').values_list('prediction', 'confidence', 'model_version')
+    )
+    if not stored:
+        logger.info("Dataset %s has no predictions to compare", dataset_id)
+        return {'dataset_id': dataset_id, 'shadow_version': shadow_version, 'skipped': 'no predictions'}
+
+    timer = StageTimer()
+    with timer.stage('load_model'):
+        predictor = PredictiveMaintenancePredictor(version=shadow_version)
+    if predictor.model is None:
+        raise Exception(f"Shadow model {shadow_version} could not be loaded")
+    with timer.stage('read'):
+        df = predictor.read(dataset.file.path)
+    with timer.stage('preprocess'):
+        frame, _ = predictor.prepare(df)
+    with timer.stage('predict'):
+        proba = predictor.score(frame)
+
+    if len(proba) != len(stored):
+        # The dataset was processed again meanwhile
+        logger.warning("Dataset %s: %s shadow rows for %s predictions", dataset_id, len(proba), len(stored))
+        return {'dataset_id': dataset_id, 'shadow_version': shadow_version, 'skipped': 'rows changed'}
+
+    labels = [label for label, _, _ in stored]
+    active_failure = np.array(labels) == 'Failure'
+    shadow_failure = proba >= 0.5
+    confidence = np.fromiter((value for _, value, _ in stored), dtype=float, count=len(stored))
+    processing = DatasetProcessing.objects.filter(dataset=dataset).values_list('stages', flat=True).first() or {}
+    comparison = ShadowComparison.objects.create(
+        dataset=dataset,
+        model_version=stored[0][2],
+        shadow_version=shadow_version,
+        rows=len(stored),
+        agreement=float((active_failure == shadow_failure).mean()),
+        failures=int(active_failure.sum()),
+        shadow_failures=int(shadow_failure.sum()),
+        mean_confidence_delta=float(np.abs(proba - confidence).mean()),
+        active_seconds=processing.get('predict'),
+        shadow_seconds=timer.stages['predict'],
+    )
+    logger.info("Dataset %s shadow scored by %s: agreement %.4f", dataset_id, shadow_version, comparison.agreement)
+    return {'dataset_id': dataset_id, 'shadow_version': shadow_version, 'agreement': comparison.agreement,
+            **timer.as_dict()}
+
+
+@shared_task
+def retrain_incrementally():
+    """Scheduled cycle of ``ml_model.incremental.retrain``: grow the model on newly uploaded labelled rows"""
+    try:
+        summary = incremental.retrain(log=logger.info)
+    except incremental.StoreBusy as e:
+        logger.info("Skipping incremental retraining: %s", e)
+        return {'skipped': 'in progress'}
+    logger.info("Incremental retraining: %s", summary)
+    return summary
@@ -0,0 +1,250 @@
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from sklearn.tree import DecisionTreeClassifier
+
+from config.celery import app
+from datasets.models import Dataset
+from predictions.models import Prediction, ShadowComparison
+from users.models import GuestSession, User
+
+from . import incremental, registry
+from .predictors.predictor import PredictiveMaintenancePredictor
+from .routing import BULK_QUEUE, INTERACTIVE_QUEUE, scoring_priority
+from .tasks import process_dataset, shadow_score
+from .train_model import DEFAULT_DATA_PATH, RESAMPLING_STRATEGIES, fit_resampled
+from .training_data import load_matrices
+from .zoo import apply_gates, train_zoo
+
+MB = 1024 ** 2
+
+
+# The app reads the Django settings, so this also turns eager mode off
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=False, SCORING_INTERACTIVE_MAX_BYTES=20 * MB, SCORING_PRIORITY_BASE_BYTES=64 * 1024,
+)
+class ScoringRoutingTests(TestCase):
+    def setUp(self):
+        self.session = GuestSession.objects.create()
+        self.connection = app.connection_for_write('memory://')
+        self.addCleanup(self.connection.release)
+
+    def enqueue(self, size):
+        dataset = Dataset.objects.create(session=self.session, file='x.csv', file_size=size)
+        return process_dataset.apply_async(args=[dataset.pk], connection=self.connection).id
+
+    def drain(self, queue):
+        channel = self.connection.default_channel
+        messages = []
+        while (message := channel.basic_get(queue=queue, no_ack=True)) is not None:
+            messages.append((message.headers['id'], message.properties['priority']))
+        return messages
+
+    def test_small_uploads_are_not_queued_behind_large_ones(self):
+        large = [self.enqueue(500 * MB) for _ in range(3)]
+        small = self.enqueue(200 * 1024)
+        medium = self.enqueue(5 * MB)
+
+        interactive = self.drain(INTERACTIVE_QUEUE)
+        self.assertEqual([task_id for task_id, _ in interactive], [small, medium])
+        self.assertLess(interactive[0][1], interactive[1][1])  # Redis serves lower numbers first
+        self.assertEqual([task_id for task_id, _ in self.drain(BULK_QUEUE)], large)
+
+    def test_priority_by_size(self):
+        self.assertEqual(scoring_priority(0), 0)
+        self.assertEqual(scoring_priority(64 * 1024), 0)
+        self.assertEqual(scoring_priority(128 * 1024), 1)
+        self.assertEqual(scoring_priority(10 ** 12), 9)
+
+
+@override_settings(MODEL_PROMOTION_MIN_F1=0.3, MODEL_PROMOTION_MIN_THROUGHPUT=1000)
+class ModelZooTests(TestCase):
+    def test_leaderboard_and_gates(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        report, models = train_zoo(
+            ['decision_tree'], cv=2, n_jobs=1, ratio=0.5, cache_dir=cache_dir, log=lambda line: None,
+        )
+        entry = report['leaderboard'][0]
+        self.assertEqual(entry['candidate'], 'decision_tree')
+        self.assertIn(entry['params']['max_depth'], [5, 8, None])
+        self.assertGreater(entry['test']['roc_auc'], 0.5)
+        self.assertGreater(entry['throughput_rows_per_s'], 0)
+        self.assertTrue(entry['promotable'], entry['gate_failures'])
+        self.assertEqual(set(models['decision_tree']), {'preprocessor', 'classifier'})
+        self.assertEqual(entry['ratio'], 0.5)
+        # The candidates trained on the cached matrices, which a retrain now reuses
+        self.assertTrue(load_matrices(cache_dir=cache_dir).cached)
+
+        with override_settings(MODEL_PROMOTION_MIN_THROUGHPUT=10 ** 12):
+            self.assertFalse(apply_gates(dict(entry), baseline_f1=entry['test']['f1'])['promotable'])
+        gated = apply_gates(dict(entry), baseline_f1=entry['test']['f1'] + 0.1)
+        self.assertIn("below the active model's", gated['gate_failures'][0])
+
+
+class ScratchModelDirMixin:
+    """Copies of the shipped model as v1 (active) and v2 (candidate), in a scratch MODEL_DIR"""
+    versions = ('v1', 'v2')
+
+    def setUp(self):
+        self.model_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        active = registry.load_manifest(settings.MODEL_DIR)['active']
+        for version in self.versions:
+            targets = registry.model_files(version, self.model_dir)
+            for source, target in zip(registry.model_files(active, settings.MODEL_DIR), targets):
+                shutil.copy(source, target)
+        override = override_settings(MODEL_DIR=self.model_dir, MEDIA_ROOT=str(self.model_dir / 'media'))
+        override.enable()
+        self.addCleanup(override.disable)
+        registry.register('v1', metrics={'f1': 0.5}, status='active')
+        for version in self.versions[1:]:
+            registry.register(version)
+
+
+class ModelRegistryTests(ScratchModelDirMixin, TestCase):
+    def test_promote_rollback_and_checksums(self):
+        self.assertEqual(registry.active_version(), 'v1')
+        registry.promote('v2')
+        manifest = registry.load_manifest()
+        self.assertEqual((manifest['active'], manifest['models']['v1']['status']), ('v2', 'retired'))
+        self.assertEqual(registry.rollback()['active'], 'v1')
+        with self.assertRaises(registry.RegistryError):
+            registry.promote('v1')
+
+        with open(registry.model_files('v2')[0], 'ab') as f:
+            f.write(b'tampered')
+        with self.assertRaises(registry.RegistryError):
+            registry.promote('v2')
+        self.assertIsNone(PredictiveMaintenancePredictor(version='v2').model)
+        self.assertEqual(PredictiveMaintenancePredictor().model_version, 'v1')
+
+    def test_concurrent_registrations_are_all_kept(self):
+        versions = [f'v{i}' for i in range(3, 9)]
+        for version in versions:
+            for source, target in zip(registry.model_files('v2'), registry.model_files(version)):
+                shutil.copy(source, target)
+        threads = [threading.Thread(target=registry.register, args=[version]) for version in versions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(registry.load_manifest()['models']), {'v1', 'v2', *versions})
+
+    def test_manifest_is_readable_by_other_users(self):
+        self.assertEqual(registry.manifest_path().stat().st_mode & 0o777, 0o644)
+
+    def test_verification_hashes_unchanged_files_once(self):
+        registry._checksums.clear()
+        registry.verify('v2')
+        hashed = dict(registry._checksums)
+        self.assertEqual(len(hashed), 2)
+        registry.verify('v2')
+        self.assertEqual(registry._checksums, hashed)
+
+    def test_shadow_scoring_leaves_predictions_alone(self):
+        dataset = Dataset(session=GuestSession.objects.create())
+        dataset.file.save('data.csv', ContentFile(
+            b'UDI,Product ID,Type,Air temperature [K],Process temperature [K],Rotational speed [rpm],'
+            b'Torque [Nm],Tool wear [min]\n'
+            b'1,L1,L,300,310,1500,40,10\n2,M2,M,302,311,1400,45,200\n3,H3,H,301,310,1300,70,240\n'
+        ), save=True)
+        registry.set_shadow('v2', 1.0)
+        process_dataset.apply(args=[dataset.pk]).get()
+
+        comparison = ShadowComparison.objects.get(dataset=dataset)
+        self.assertEqual((comparison.model_version, comparison.shadow_version), ('v1', 'v2'))
+        self.assertEqual((comparison.rows, comparison.agreement, comparison.mean_confidence_delta), (3, 1.0, 0.0))
+        self.assertIsNotNone(comparison.active_seconds)
+        self.assertEqual(set(Prediction.objects.filter(dataset=dataset).values_list('model_version', flat=True)), {'v1'})
+
+        Prediction.objects.filter(dataset=dataset).delete()
+        self.assertEqual(shadow_score(dataset.pk, 'v2')['skipped'], 'no predictions')
+
+
+class TrainingDataTests(TestCase):
+    def test_cached_matrices_and_resampling(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        first = load_matrices(cache_dir=cache_dir)
+        again = load_matrices(cache_dir=cache_dir)
+        self.assertEqual((first.cached, again.cached, first.key), (False, True, again.key))
+        self.assertIsInstance(again.X_train, np.memmap)
+        self.assertEqual(again.X_train.dtype, np.float32)
+        np.testing.assert_array_equal(again.y_test, first.y_test)
+        self.assertIn('Torque [Nm]', again.features)
+
+        recall = {}
+        for strategy in RESAMPLING_STRATEGIES:
+            classifier = fit_resampled(
+                DecisionTreeClassifier(max_depth=5, random_state=0), again.X_train, again.y_train, strategy,
+            )
+            recall[strategy] = (classifier.predict(again.X_test)[again.y_test == 1] == 1).mean()
+        # Every way of balancing the classes finds more of the rare failures than none
+        for strategy in ('smote', 'random', 'class_weight'):
+            self.assertGreater(recall[strategy], recall['none'], strategy)
+
+
+@override_settings(
+    INCREMENTAL_MIN_ROWS=1000, INCREMENTAL_TREES_PER_CYCLE=5, INCREMENTAL_MAX_TREES=8, INCREMENTAL_AUTO_PROMOTE=True,
+    MODEL_PROMOTION_MIN_F1=0.1, MODEL_PROMOTION_MIN_THROUGHPUT=1,
+)
+class IncrementalRetrainingTests(ScratchModelDirMixin, TestCase):
+    versions = ('v1',)
+
+    def setUp(self):
+        super().setUp()
+        self.store = incremental.TrainingStore(self.model_dir / 'store')
+        self.data = pd.read_csv(DEFAULT_DATA_PATH)
+        self.user = User.objects.create_user(
+            email='ops@example.com', username='ops', first_name='Op', last_name='S', password='secret-pass',
+        )
+
+    def upload(self, df, content_hash='', **owner):
+        dataset = Dataset(content_hash=content_hash, **(owner or {'user': self.user}))
+        dataset.file.save('data.csv', ContentFile(df.to_csv(index=False).encode()), save=True)
+        return dataset
+
+    def test_cycles_train_on_new_rows_only(self):
+        self.upload(self.data[:5000], content_hash='a')
+        self.upload(self.data[:5000], content_hash='a')  # the same file again
+        self.upload(self.data[5000:6000].drop(columns=incremental.LABEL_COLUMNS))  # unlabelled
+
+        first = incremental.retrain(self.store, log=lambda line: None)
+        self.assertEqual((first['collected_segments'], first['pending_rows']), (1, 5000))
+        self.assertEqual(first['base_version'], 'v1')
+        self.assertTrue(first['promoted'], first['gate_failures'])
+        self.assertEqual(registry.active_version(), first['model_version'])
+
+        self.assertIn('skipped', incremental.retrain(self.store, log=lambda line: None))
+
+        # Renamed columns are recognised too
+        self.upload(self.data[6000:8000].rename(columns={'Torque [Nm]': 'torque', 'Type': 'machine_type'}))
+        second = incremental.retrain(self.store, log=lambda line: None)
+        self.assertEqual((second['pending_rows'], second['base_version']), (2000, first['model_version']))
+        model = PredictiveMaintenancePredictor(version=second['model_version']).model
+        self.assertEqual(len(model['classifier'].estimators_), 8)  # 5 + 5, capped
+        manifest = self.store.load()
+        trained_by = [segment['trained_by'] for segment in manifest['segments']]
+        self.assertEqual(trained_by, [first['model_version'], second['model_version']])
+
+    def test_guest_and_deleted_datasets_leave_the_store(self):
+        self.upload(self.data[:2000], session=GuestSession.objects.create())
+        self.assertEqual(incremental.retrain(self.store, log=lambda line: None)['collected_segments'], 0)
+
+        dataset = self.upload(self.data[2000:4000], content_hash='b')
+        self.assertEqual(incremental.retrain(self.store, log=lambda line: None)['collected_segments'], 1)
+        self.assertTrue((self.store.path / f'segment_{dataset.pk}.npz').exists())
+
+        dataset.delete()
+        summary = incremental.retrain(self.store, log=lambda line: None)
+        self.assertEqual((summary['pruned_segments'], summary['pending_rows']), (1, 0))
+        self.assertFalse((self.store.path / f'segment_{dataset.pk}.npz').exists())
+        self.assertEqual(self.store.load()['content_hashes'], [])
@@ -0,0 +1,142 @@
+"""
+Preprocessed training matrices, cached on disk.
+
+Before a classifier sees any data, a retrain reads the training CSV,
+splits it and fits and applies the preprocessor. On 10M rows that takes
+about 20 seconds, most of it parsing the CSV. ``load_matrices`` does it once per
+training file and configuration and keeps the result in
+``<cache_dir>/<key>/``:
+
+- the train and test matrices as float32 ``.npy`` files, memory mapped on
+  later runs (the tree models train on float32 anyway), and their labels;
+- the fitted preprocessor and the feature metadata ``save_model`` records;
+- the test split as read from the file, for scoring models that bring their
+  own preprocessor and for timing inference the way ``process_dataset`` runs it.
+
+The key is the sha256 of the file's contents together with the split and
+preprocessing settings, so an edited file or other settings miss the cache.
+Old entries are never used again and can be deleted at any time.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import train_test_split
+
+from .train_model import DEFAULT_DATA_PATH, build_preprocessor, detect_features, feature_metadata
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / 'training_cache'
+# Bump when the layout of a cache entry or the preprocessing changes
+CACHE_FORMAT = 2
+TARGET = 'Machine failure'
+
+
+class TrainingMatrices:
+    """Preprocessed train/test split of a training file"""
+
+    def __init__(self, X_train, X_test, y_train, y_test, test_rows, preprocessor, metadata, key=None, cached=False):
+        self.X_train = X_train
+        self.X_test = X_test
+        self.y_train = y_train
+        self.y_test = y_test
+        self.test_rows = test_rows
+        self.preprocessor = preprocessor
+        self.metadata = metadata
+        self.key = key
+        self.cached = cached
+
+    @property
+    def features(self):
+        return self.metadata['features']
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(path, test_size, seed):
+    config = {
+        'data': file_digest(path),
+        'format': CACHE_FORMAT,
+        'sklearn': sklearn.__version__,
+        'target': TARGET,
+        'test_size': test_size,
+        'seed': seed,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def build_matrices(df, test_size=0.2, seed=42):
+    """Split ``df`` stratified on the target, fit the preprocessor on the train split and transform both"""
+    features = detect_features(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[features], df[TARGET], test_size=test_size, random_state=seed, stratify=df[TARGET],
+    )
+    preprocessor = build_preprocessor(df, features)
+    return TrainingMatrices(
+        X_train=preprocessor.fit_transform(X_train).astype(np.float32),
+        X_test=preprocessor.transform(X_test).astype(np.float32),
+        y_train=y_train.to_numpy(dtype=np.int8),
+        y_test=y_test.to_numpy(dtype=np.int8),
+        test_rows=X_test.reset_index(drop=True),
+        preprocessor=preprocessor,
+        metadata=feature_metadata(df, features, TARGET),
+    )
+
+
+def _write(entry, matrices):
+    # Build the entry next to its final place and rename it in, so a crashed
+    # or concurrent run never leaves a half written entry behind
+    tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f'.{entry.name}-'))
+    try:
+        for name in ('X_train', 'X_test', 'y_train', 'y_test'):
+            np.save(tmp / f'{name}.npy', getattr(matrices, name))
+        matrices.test_rows.to_pickle(tmp / 'test_rows.pkl')
+        joblib.dump({'preprocessor': matrices.preprocessor, 'metadata': matrices.metadata}, tmp / 'preprocessing.joblib')
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not entry.exists():
+            raise
+
+
+def _read(entry, key):
+    arrays = {name: np.load(entry / f'{name}.npy', mmap_mode='r') for name in ('X_train', 'X_test', 'y_train', 'y_test')}
+    preprocessing = joblib.load(entry / 'preprocessing.joblib')
+    return TrainingMatrices(
+        **arrays,
+        test_rows=pd.read_pickle(entry / 'test_rows.pkl'),
+        preprocessor=preprocessing['preprocessor'],
+        metadata=preprocessing['metadata'],
+        key=key,
+        cached=True,
+    )
+
+
+def load_matrices(data_path=None, cache_dir=None, test_size=0.2, seed=42, use_cache=True):
+    """The preprocessed split of ``data_path``, from the cache when it has it"""
+    data_path = Path(data_path or DEFAULT_DATA_PATH)
+    if not use_cache:
+        return build_matrices(pd.read_csv(data_path), test_size, seed)
+
+    cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+    key = cache_key(data_path, test_size, seed)
+    entry = cache_dir / key
+    if entry.exists():
+        return _read(entry, key)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _write(entry, build_matrices(pd.read_csv(data_path), test_size, seed))
+    matrices = _read(entry, key)
+    matrices.cached = False
+    return matrices
@@ -0,0 +1,212 @@
+"""
+Model zoo: train several candidate classifiers, rank them and register or promote one.
+
+Every candidate is a grid of hyperparameters searched with stratified
+cross-validation, resampled inside the folds (SMOTE unless another of
+``RESAMPLING_STRATEGIES`` is chosen, up to ``ratio``) as in ``train_model``.
+The search runs ``n_jobs`` fits at a time. All candidates train on the
+preprocessed matrices of ``training_data.load_matrices``, so the file is
+parsed and the preprocessor fitted once, on the whole training split,
+rather than once per fold of every candidate. The best configuration of each
+candidate is then refit on the training split and scored on a held-out
+test split for quality, and timed for inference: throughput on a batch,
+the way ``process_dataset`` scores, and single-row latency.
+
+A candidate may be promoted only if it passes both gates. The quality gate
+needs an F1 of at least ``MODEL_PROMOTION_MIN_F1`` that is not below the
+active model's F1 on the same test split. The throughput gate needs at
+least ``MODEL_PROMOTION_MIN_THROUGHPUT`` rows per second.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from imblearn.pipeline import Pipeline
+from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import average_precision_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.tree import DecisionTreeClassifier
+
+from . import registry
+from .train_model import DEFAULT_DATA_PATH, make_resampler, save_model
+from .training_data import load_matrices
+
+TARGET = 'Machine failure'
+SEED = 42
+
+# name: (classifier, parameter grid)
+CANDIDATES = {
+    'decision_tree': (
+        lambda: DecisionTreeClassifier(random_state=SEED),
+        {'max_depth': [5, 8, None]},
+    ),
+    'random_forest': (
+        lambda: RandomForestClassifier(random_state=SEED),
+        {'n_estimators': [100, 200], 'max_depth': [12, None]},
+    ),
+    'extra_trees': (
+        lambda: ExtraTreesClassifier(random_state=SEED),
+        {'n_estimators': [200], 'max_depth': [12, None]},
+    ),
+    'hist_gradient_boosting': (
+        lambda: HistGradientBoostingClassifier(random_state=SEED),
+        {'learning_rate': [0.05, 0.1], 'max_leaf_nodes': [15, 31], 'max_iter': [200]},
+    ),
+}
+
+
+def load_training_data(path=None, cache_dir=None):
+    """The cached preprocessed split the candidates train and are tested on"""
+    return load_matrices(path, cache_dir=cache_dir, test_size=0.2, seed=SEED)
+
+
+def quality(model, X, y):
+    """Hold-out metrics of a ``{'preprocessor', 'classifier'}`` model"""
+    proba = model['classifier'].predict_proba(model['preprocessor'].transform(X))[:, 1]
+    predicted = (proba >= 0.5).astype(int)
+    return {
+        'f1': f1_score(y, predicted),
+        'precision': precision_score(y, predicted, zero_division=0),
+        'recall': recall_score(y, predicted),
+        'roc_auc': roc_auc_score(y, proba),
+        'average_precision': average_precision_score(y, proba),
+    }
+
+
+def inference_speed(model, X, batch_rows=10000, single_rows=200, repeat=3):
+    """Batch throughput in rows per second and single-row latency percentiles in milliseconds"""
+    batch = X.sample(batch_rows, replace=True, random_state=SEED)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model['classifier'].predict_proba(model['preprocessor'].transform(batch))
+        best = min(best, time.perf_counter() - start)
+
+    latencies = []
+    for i in range(min(single_rows, len(X))):
+        row = X.iloc[[i]]
+        start = time.perf_counter()
+        model['classifier'].predict_proba(model['preprocessor'].transform(row))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'throughput_rows_per_s': batch_rows / best,
+        'latency_ms': {'p50': float(np.percentile(latencies, 50)), 'p95': float(np.percentile(latencies, 95))},
+    }
+
+
+def train_candidate(name, data, cv=5, n_jobs=-1, resampling='smote', ratio=None):
+    """Grid search one candidate on ``data``'s matrices and return its refit model and leaderboard entry"""
+    make_classifier, grid = CANDIDATES[name]
+    classifier = make_classifier()
+    if resampling == 'class_weight':
+        classifier.set_params(class_weight='balanced')
+    pipeline = Pipeline([
+        ('resampler', make_resampler(resampling, ratio, seed=SEED) or 'passthrough'),
+        ('classifier', classifier),
+    ])
+    search = GridSearchCV(
+        pipeline,
+        {f'classifier__{param}': values for param, values in grid.items()},
+        scoring='f1',
+        cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=SEED),
+        n_jobs=n_jobs,
+    )
+    start = time.perf_counter()
+    search.fit(data.X_train, data.y_train)
+    fit_seconds = time.perf_counter() - start
+
+    model = {'preprocessor': data.preprocessor, 'classifier': search.best_estimator_.named_steps['classifier']}
+    entry = {
+        'candidate': name,
+        'resampling': resampling,
+        'ratio': ratio,
+        'params': {param.split('__', 1)[1]: value for param, value in search.best_params_.items()},
+        'cv_f1': {'mean': search.best_score_, 'std': float(search.cv_results_['std_test_score'][search.best_index_])},
+        'search_seconds': fit_seconds,
+        'test': quality(model, data.test_rows, data.y_test),
+        **inference_speed(model, data.test_rows),
+    }
+    return model, entry
+
+
+def apply_gates(entry, baseline_f1=None):
+    """Mark ``entry`` promotable or not, with the reasons it is not"""
+    reasons = []
+    f1 = entry['test']['f1']
+    if f1 < settings.MODEL_PROMOTION_MIN_F1:
+        reasons.append(f"F1 {f1:.3f} below {settings.MODEL_PROMOTION_MIN_F1}")
+    if baseline_f1 is not None and f1 < baseline_f1:
+        reasons.append(f"F1 {f1:.3f} below the active model's {baseline_f1:.3f}")
+    throughput = entry['throughput_rows_per_s']
+    if throughput < settings.MODEL_PROMOTION_MIN_THROUGHPUT:
+        reasons.append(f"{throughput:.0f} rows/s below {settings.MODEL_PROMOTION_MIN_THROUGHPUT}")
+    entry['promotable'] = not reasons
+    entry['gate_failures'] = reasons
+    return entry
+
+
+def train_zoo(names=None, data_path=None, cv=5, n_jobs=-1, baseline=None, resampling='smote', ratio=None,
+              cache_dir=None, log=print):
+    """
+    Train the candidates and return ``(leaderboard, models)``.
+
+    The leaderboard is sorted by test F1, promotable candidates first;
+    ``models`` maps candidate names to their refit models. ``baseline`` is the
+    active model, whose test F1 the quality gate requires matching.
+    """
+    data = load_training_data(data_path, cache_dir)
+    if data.cached:
+        log(f"Using cached training matrices {data.key}")
+    baseline_f1 = None
+    if baseline is not None:
+        try:
+            baseline_f1 = quality(baseline, data.test_rows, data.y_test)['f1']
+        except Exception as e:  # e.g. trained on other features
+            log(f"Active model could not be scored on the test split: {e}")
+
+    leaderboard, models = [], {}
+    for name in names or list(CANDIDATES):
+        model, entry = train_candidate(name, data, cv=cv, n_jobs=n_jobs, resampling=resampling, ratio=ratio)
+        apply_gates(entry, baseline_f1)
+        log(f"{name:<24} F1 {entry['test']['f1']:.3f}  {entry['throughput_rows_per_s']:>10.0f} rows/s  "
+            f"p50 {entry['latency_ms']['p50']:.2f} ms  {'promotable' if entry['promotable'] else 'not promotable'}")
+        leaderboard.append(entry)
+        models[name] = model
+
+    leaderboard.sort(key=lambda e: (not e['promotable'], -e['test']['f1']))
+    return {
+        'data': str(data_path or DEFAULT_DATA_PATH),
+        'features': data.features,
+        'metadata': data.metadata,
+        'resampling': resampling,
+        'ratio': ratio,
+        'baseline_f1': baseline_f1,
+        'gates': {
+            'min_f1': settings.MODEL_PROMOTION_MIN_F1,
+            'min_throughput_rows_per_s': settings.MODEL_PROMOTION_MIN_THROUGHPUT,
+        },
+        'leaderboard': leaderboard,
+    }, models
+
+
+def promote(report, models, model_dir=None, activate=True):
+    """
+    Save the top promotable candidate and register it; returns its version or None.
+
+    With ``activate`` it becomes the active model, otherwise it stays a
+    candidate in the registry, e.g. to be shadow scored first.
+    """
+    promotable = [entry for entry in report['leaderboard'] if entry['promotable']]
+    if not promotable:
+        return None
+    entry = promotable[0]
+    model_dir = model_dir or settings.MODEL_DIR
+    version = save_model(
+        models[entry['candidate']], report['metadata'], model_dir,
+        extra={'leaderboard_entry': entry},
+    )
+    registry.register(
+        version, metrics={'candidate': entry['candidate'], **entry['test']},
+        status='active' if activate else 'candidate', model_dir=model_dir,
+    )
+    return version
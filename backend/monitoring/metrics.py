@@ -0,0 +1,128 @@
+"""
+In-process metrics, exposed in the Prometheus text format by ``monitoring.views.metrics``.
+
+Metrics are created once at import time with ``counter``, ``gauge`` or
+``histogram`` and updated with ``inc``, ``set``, ``set_max`` or ``observe``
+and their label values. Values live in the memory of each worker process;
+scrape every worker (or run one) to get the full picture.
+"""
+import threading
+
+PREFIX = 'machintel_'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    def __init__(self, name, documentation, kind, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_max(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = max(self._values.get(key, value), value)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (value if self.kind != 'histogram' else (list(value[0]), value[1], value[2]))
+                      for key, value in self._values.items()}
+        for key, value in sorted(values.items()):
+            if self.kind != 'histogram':
+                yield self.name, _labels(self.labelnames, key), value
+                continue
+            counts, total, count = value
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield self.name + '_bucket', _labels(self.labelnames, key, [('le', _number(bound))]), bucket_count
+            yield self.name + '_sum', _labels(self.labelnames, key), total
+            yield self.name + '_count', _labels(self.labelnames, key), count
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(name, documentation, kind, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = Metric(name, documentation, kind, labelnames, **kwargs)
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(name, documentation, 'counter', labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(name, documentation, 'gauge', labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(name, documentation, 'histogram', labelnames, buckets=buckets)
+
+
+def exposition(extra=()):
+    """All metrics in the Prometheus text format; ``extra`` adds (name, help, kind, samples) computed on the fly"""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in metric.samples())
+    for name, documentation, kind, samples in extra:
+        lines.append(f'# HELP {PREFIX}{name} {documentation}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        lines.extend(f'{PREFIX}{name}{_labels(names, values)} {_number(value)}' for names, values, value in samples)
+    return '\n'.join(lines) + '\n'
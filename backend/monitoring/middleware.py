@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+from .profiling import Profile, activate, current_profile
+
+REQUESTS = metrics.counter('http_requests_total', 'Requests by route, method and status.', ['route', 'method', 'status'])
+DURATION = metrics.histogram('http_request_duration_seconds', 'Wall time of requests.', ['route'])
+PROFILED = metrics.counter('http_profiled_requests_total', 'Requests sampled for profiling.', ['route'])
+DB_QUERIES = metrics.counter('http_db_queries_total', 'SQL queries run by profiled requests.', ['route'])
+DB_SECONDS = metrics.counter('http_db_seconds_total', 'Time in SQL of profiled requests.', ['route'])
+SPAN_SECONDS = metrics.counter(
+    'http_span_seconds_total', 'Time in the view, serializers and rendering of profiled requests.', ['route', 'span']
+)
+PEAK_MEMORY = metrics.gauge('http_peak_memory_bytes', 'Largest memory peak allocated by a profiled request.', ['route'])
+
+# tracemalloc is process wide, so only one request at a time measures its peak
+_memory_lock = threading.Lock()
+
+
+def _profile_queries(execute, sql, params, many, context):
+    profile = current_profile()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+
+def install_query_wrapper(connection, **kwargs):
+    if _profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_queries)
+
+
+@contextmanager
+def _trace_memory(profile):
+    if not settings.PROFILING_TRACE_MEMORY or tracemalloc.is_tracing() or not _memory_lock.acquire(blocking=False):
+        yield
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        profile.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        _memory_lock.release()
+
+
+def _milliseconds(seconds):
+    return f'{seconds * 1000:.2f}'
+
+
+class ProfilingMiddleware:
+    """
+    Samples ``PROFILING_SAMPLE_RATE`` of the requests and records their wall
+    time, SQL query count and time, time in the view, in serializers (see
+    ``monitoring.serializers``) and in rendering, and their peak allocated
+    memory. Profiled responses carry these in a ``Server-Timing`` header and
+    all of it is aggregated per route at ``/metrics/``. Requests that are not
+    sampled only have their count and wall time recorded.
+
+    Peak memory comes from tracemalloc, which is process wide: it includes
+    whatever other threads allocate meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_wrapper)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.record(request, response, time.perf_counter() - start)
+            return response
+
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        profile = Profile()
+        with activate(profile), _trace_memory(profile):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, profile)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            response = await self.get_response(request)
+            self.record(request, response, time.perf_counter() - start)
+            return response
+
+        profile = Profile()
+        with activate(profile), _trace_memory(profile):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile()
+        if profile is not None:
+            profile.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called between the view returning and the response being rendered
+        profile = current_profile()
+        if profile is not None and profile.view_start is not None:
+            profile.add('view', time.perf_counter() - profile.view_start)
+            profile.render_start = time.perf_counter()
+        return response
+
+    def record(self, request, response, wall, profile=None):
+        match = request.resolver_match
+        route = match.route if match else 'unmatched'
+        REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        DURATION.observe(wall, route=route)
+        if profile is None:
+            return
+
+        if profile.render_start is not None:
+            # Rendering ends when the response comes back through the middleware
+            profile.add('render', time.perf_counter() - profile.render_start)
+        elif profile.view_start is not None:
+            profile.add('view', time.perf_counter() - profile.view_start)
+
+        PROFILED.inc(route=route)
+        DB_QUERIES.inc(profile.db_queries, route=route)
+        DB_SECONDS.inc(profile.db_time, route=route)
+        for name, seconds in profile.spans.items():
+            SPAN_SECONDS.inc(seconds, route=route, span=name)
+
+        timings = [f'total;dur={_milliseconds(wall)}']
+        timings.append(f'db;dur={_milliseconds(profile.db_time)};desc="{profile.db_queries} queries"')
+        timings.extend(f'{name};dur={_milliseconds(seconds)}' for name, seconds in sorted(profile.spans.items()))
+        if profile.peak_memory is not None:
+            PEAK_MEMORY.set_max(profile.peak_memory, route=route)
+            timings.append(f'mem;desc="peak {profile.peak_memory} bytes"')
+        response['Server-Timing'] = ', '.join(timings)
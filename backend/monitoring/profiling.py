@@ -0,0 +1,60 @@
+"""
+Per-request profile of a sampled request.
+
+``ProfilingMiddleware`` makes a ``Profile`` current for the request; code
+that wants its time accounted for wraps itself in ``span(name)``, which is a
+no-op outside a profiled request. SQL is timed with a database execute
+wrapper, so every query is counted without touching the ORM callers.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('monitoring_profile', default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.spans = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.peak_memory = None
+        self.view_start = None
+        self.render_start = None
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+
+def current_profile():
+    return _current.get()
+
+
+@contextmanager
+def activate(profile):
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from .profiling import span
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with span('serializer'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Accounts the time spent producing ``.data`` to the request profile.
+
+    For ``many=True`` set ``Meta.list_serializer_class = TimedListSerializer``.
+    """
+
+    @property
+    def data(self):
+        with span('serializer'):
+            return super().data
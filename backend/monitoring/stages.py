@@ -0,0 +1,24 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Wall time per named stage of a batch job, and counters to go with it"""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()}, **self.counters}
@@ -0,0 +1,89 @@
+"""
+Metrics of Celery tasks, recorded from Celery signals.
+
+Every task gets its count by outcome and its wall time. Tasks that return a
+``StageTimer`` summary (a dict with ``stages``, like
+``ml_model.tasks.process_dataset``) also have their stage timings and
+counters recorded. Set ``WORKER_METRICS_PORT`` to serve these from the
+worker on ``http://<WORKER_METRICS_HOST>:<port>/metrics``. The host defaults
+to 127.0.0.1, since the endpoint has no access control.
+
+Metrics live in the process that runs the task. With the default prefork
+pool that is a child process, so start the worker with ``--pool threads``
+(or ``solo``) to scrape them; the ``DatasetProcessing`` records keep the
+per-run numbers either way.
+"""
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from celery.signals import task_postrun, task_prerun, worker_ready
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TASKS = metrics.counter('celery_tasks_total', 'Finished tasks by name and state.', ['task', 'state'])
+DURATION = metrics.histogram(
+    'celery_task_duration_seconds', 'Wall time of tasks.', ['task'],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+STAGE_SECONDS = metrics.counter('celery_task_stage_seconds_total', 'Time in each stage of a task.', ['task', 'stage'])
+ROWS = metrics.counter('celery_task_rows_total', 'Rows stored by tasks.', ['task'])
+ERRORS = metrics.counter('celery_task_row_errors_total', 'Rows tasks could not process.', ['task'])
+BYTES_READ = metrics.counter('celery_task_bytes_read_total', 'Bytes of input read by tasks.', ['task'])
+
+_started = {}
+_started_lock = threading.Lock()
+
+
+@task_prerun.connect
+def task_started(task_id=None, **kwargs):
+    with _started_lock:
+        _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, retval=None, state=None, **kwargs):
+    with _started_lock:
+        start = _started.pop(task_id, None)
+    name = task.name if task is not None else 'unknown'
+    TASKS.inc(task=name, state=state or 'UNKNOWN')
+    if start is not None:
+        DURATION.observe(time.perf_counter() - start, task=name)
+
+    if not isinstance(retval, dict) or 'stages' not in retval:
+        return
+    for stage, seconds in retval['stages'].items():
+        STAGE_SECONDS.inc(seconds, task=name, stage=stage)
+    ROWS.inc(retval.get('rows', 0), task=name)
+    ERRORS.inc(retval.get('errors', 0), task=name)
+    BYTES_READ.inc(retval.get('bytes_read', 0), task=name)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@worker_ready.connect
+def serve_metrics(**kwargs):
+    if not settings.WORKER_METRICS_PORT:
+        return
+    address = (settings.WORKER_METRICS_HOST, int(settings.WORKER_METRICS_PORT))
+    server = ThreadingHTTPServer(address, MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='worker-metrics', daemon=True).start()
+    logger.info("Serving worker metrics on %s:%s", *address)
@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from datasets.models import Dataset
+from predictions.models import Prediction
+from users.models import GuestSession
+from users.session_cache import clear_local_cache
+
+from . import metrics
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, RESPONSE_CACHE_TTL=0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        self.session = GuestSession.objects.create()
+        dataset = Dataset.objects.create(session=self.session, file='datasets/data.csv')
+        Prediction.objects.create(dataset=dataset, product_id='L1', prediction='Normal', confidence=0.1, features={})
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get('/api/predictions/', HTTP_X_GUEST_SESSION=str(self.session.session_id))
+        timing = response['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'serializer;dur=', 'view;dur=', 'render;dur=', 'mem;desc="peak'):
+            self.assertIn(name, timing)
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('machintel_http_requests_total{route="api/predictions/",method="GET",status="200"} 1', body)
+        self.assertIn('machintel_http_profiled_requests_total{route="api/predictions/"} 1', body)
+        self.assertIn('machintel_response_cache_hits_total', body)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_only_counted(self):
+        response = self.client.get('/api/predictions/', HTTP_X_GUEST_SESSION=str(self.session.session_id))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+    def tearDown(self):
+        for metric in metrics._registry.values():
+            metric.clear()
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from . import metrics
+
+
+def _response_cache_samples():
+    from datasets.response_cache import response_cache_stats
+
+    stats = response_cache_stats()
+    for outcome in ('hits', 'misses'):
+        samples = [(('view',), (view_name,), counts[outcome]) for view_name, counts in stats.items()]
+        yield f'response_cache_{outcome}_total', f'Server-side response cache {outcome}, all workers.', 'counter', samples
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, only answered for ``METRICS_ALLOWED_IPS``"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(extra=_response_cache_samples()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Prediction
+from .models import Prediction, ShadowComparison
 
-admin.site.register(Prediction)
\ No newline at end of file
+admin.site.register(Prediction)
+admin.site.register(ShadowComparison)
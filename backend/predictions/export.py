@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import zlib
+
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_FIELDS = ['id', 'product_id', 'prediction', 'confidence', 'created_at']
+
+
+class CSVRenderer(BaseRenderer):
+    """Lets DRF accept ``?format=csv``, the export itself is streamed by the view"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8') if data is not None else b''
+
+
+class NDJSONRenderer(CSVRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def _records(queryset, batch_size, extra_fields=()):
+    # iterator() fetches through a server-side cursor on PostgreSQL, one batch at a time
+    fields = EXPORT_FIELDS + list(extra_fields)
+    rows = queryset.values_list(*fields, 'features').iterator(chunk_size=batch_size)
+    for *values, features in rows:
+        record = dict(zip(fields, values))
+        record['created_at'] = record['created_at'].isoformat()
+        yield record, features or {}
+
+
+def stream_csv(queryset, batch_size):
+    buffer = io.StringIO()
+    writer = None
+    pending = 0
+    for record, features in _records(queryset, batch_size):
+        if writer is None:
+            # Feature columns come from the first row, the predictor writes the same keys for every row
+            feature_columns = [column for column in features if column not in record]
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS + feature_columns)
+        writer.writerow(list(record.values()) + [features.get(column) for column in feature_columns])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if writer is None:
+        yield ','.join(EXPORT_FIELDS) + '\r\n'
+    elif pending:
+        yield buffer.getvalue()
+
+
+def stream_ndjson(queryset, batch_size):
+    lines = []
+    # The JSON exports also carry each prediction's reasons
+    for record, features in _records(queryset, batch_size, extra_fields=['explanation']):
+        lines.append(json.dumps({**record, 'features': features}))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_json(queryset, batch_size):
+    # A JSON array, written one NDJSON batch at a time
+    separator = '['
+    for chunk in stream_ndjson(queryset, batch_size):
+        yield separator + ','.join(chunk.splitlines())
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
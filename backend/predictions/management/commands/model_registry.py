@@ -0,0 +1,126 @@
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Sum
+from ml_model import registry
+from predictions.models import ShadowComparison
+
+
+class Command(BaseCommand):
+    help = 'Lists, registers, promotes and rolls back models, and controls shadow scoring (see ml_model/registry.py)'
+
+    def add_arguments(self, parser):
+        commands = parser.add_subparsers(dest='action', required=True)
+        commands.add_parser('list', help='Registered models and their status')
+
+        register = commands.add_parser('register', help='Register a saved model as a candidate')
+        register.add_argument('version', help='The <version> of model_<version>.joblib')
+        register.add_argument('--evaluate', action='store_true', help='Record hold-out metrics on the training data')
+        register.add_argument('--activate', action='store_true', help='Make it the active model')
+
+        promote = commands.add_parser('promote', help='Make a registered model the active one')
+        promote.add_argument('version')
+        commands.add_parser('rollback', help='Reactivate the model that was active before')
+        commands.add_parser('verify', help='Check the checksums of every registered model')
+
+        shadow = commands.add_parser('shadow', help='Shadow score a sample of processed datasets with a model')
+        shadow.add_argument('version', nargs='?')
+        shadow.add_argument('--sample-rate', type=float, default=0.1, help='Share of processed datasets')
+        shadow.add_argument('--off', action='store_true', help='Stop shadow scoring')
+
+        report = commands.add_parser('shadow-report', help='Agreement and latency of shadow models')
+        report.add_argument('--version', help='Only this shadow model')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, options['action'].replace('-', '_'))(options)
+        except registry.RegistryError as e:
+            raise CommandError(str(e))
+
+    def list(self, options):
+        manifest = registry.load_manifest()
+        if manifest is None:
+            raise CommandError(f"No registry in {settings.MODEL_DIR}, register a model first")
+        shadow = manifest.get('shadow') or {}
+        for version, entry in sorted(manifest['models'].items()):
+            metrics = entry['metrics']
+            f1 = f"F1 {metrics['f1']:.3f}" if 'f1' in metrics else 'no metrics'
+            mark = f" (shadow, {shadow['sample_rate']:.0%})" if shadow.get('version') == version else ''
+            self.stdout.write(f"{version}  {entry['status']:<9}  {f1}{mark}")
+
+    def register(self, options):
+        metrics = self.evaluate(options['version']) if options['evaluate'] else None
+        status = 'active' if options['activate'] else 'candidate'
+        registry.register(options['version'], metrics=metrics, status=status)
+        self.stdout.write(self.style.SUCCESS(f"Registered model {options['version']} as {status}"))
+
+    def evaluate(self, version):
+        from ml_model.zoo import load_training_data, quality
+
+        model_path, features_path = registry.model_files(version)
+        features = joblib.load(features_path)['features']
+        data = load_training_data()
+        return quality(joblib.load(model_path), data.test_rows[features], data.y_test)
+
+    def promote(self, options):
+        registry.promote(options['version'])
+        self.stdout.write(self.style.SUCCESS(f"Model {options['version']} is now active"))
+
+    def rollback(self, options):
+        manifest = registry.rollback()
+        self.stdout.write(self.style.SUCCESS(f"Rolled back to model {manifest['active']}"))
+
+    def verify(self, options):
+        manifest = registry.load_manifest() or {'models': {}}
+        failures = []
+        for version in sorted(manifest['models']):
+            try:
+                registry.verify(version, manifest)
+            except registry.RegistryError as e:
+                failures.append(str(e))
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{len(manifest['models'])} models match their checksums"))
+
+    def shadow(self, options):
+        if options['off']:
+            registry.set_shadow(None, 0)
+            self.stdout.write(self.style.SUCCESS('Shadow scoring stopped'))
+            return
+        if not options['version']:
+            raise CommandError('Give the version to shadow score with, or --off')
+        if not 0 < options['sample_rate'] <= 1:
+            raise CommandError('--sample-rate must be in (0, 1]')
+        registry.set_shadow(options['version'], options['sample_rate'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Shadow scoring {options['sample_rate']:.0%} of processed datasets with model {options['version']}"
+        ))
+
+    def shadow_report(self, options):
+        comparisons = ShadowComparison.objects.all()
+        if options['version']:
+            comparisons = comparisons.filter(shadow_version=options['version'])
+        rows = (
+            comparisons.values('shadow_version', 'model_version')
+            .annotate(
+                datasets=Count('id'),
+                total_rows=Sum('rows'),
+                agreeing=Sum(F('agreement') * F('rows')),
+                delta=Sum(F('mean_confidence_delta') * F('rows')),
+                failures_total=Sum('failures'),
+                shadow_failures_total=Sum('shadow_failures'),
+                active_total=Sum('active_seconds'),
+                shadow_total=Sum('shadow_seconds'),
+            )
+            .order_by('shadow_version', 'model_version')
+        )
+        if not rows:
+            self.stdout.write('No shadow comparisons yet')
+        for row in rows:
+            n = row['total_rows'] or 1
+            self.stdout.write(
+                f"{row['shadow_version']} vs {row['model_version']}: {row['datasets']} datasets, {row['total_rows']} rows, "
+                f"agreement {row['agreeing'] / n:.2%}, mean confidence delta {row['delta'] / n:.4f}, "
+                f"failures {row['shadow_failures_total']} vs {row['failures_total']}, "
+                f"predict time {row['shadow_total'] or 0:.2f}s vs {row['active_total'] or 0:.2f}s"
+            )
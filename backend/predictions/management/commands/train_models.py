@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ml_model.predictors.predictor import PredictiveMaintenancePredictor
+from ml_model.train_model import RESAMPLING_STRATEGIES
+from ml_model.zoo import CANDIDATES, promote, train_zoo
+
+
+class Command(BaseCommand):
+    help = 'Trains the candidate models, writes a leaderboard and optionally promotes the best one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Training CSV (default: data/ai4i2020.csv)')
+        parser.add_argument('--candidates', help=f"Comma separated subset of: {', '.join(CANDIDATES)}")
+        parser.add_argument('--cv', type=int, default=5, help='Cross-validation folds')
+        parser.add_argument('--jobs', type=int, default=-1, help='Parallel fits (-1: all cores)')
+        parser.add_argument('--resampling', choices=RESAMPLING_STRATEGIES, default='smote')
+        parser.add_argument('--ratio', type=float, help='Minority to majority ratio to resample to (default: 1)')
+        parser.add_argument('--output', default=str(settings.MODEL_DIR / 'leaderboard.json'), help='Leaderboard file')
+        parser.add_argument('--promote', action='store_true', help='Save the best candidate that passes the gates')
+        parser.add_argument(
+            '--candidate', action='store_true',
+            help='With --promote, register the model as a candidate instead of activating it',
+        )
+
+    def handle(self, *args, **options):
+        names = [n for n in (options['candidates'] or '').split(',') if n] or None
+        unknown = [n for n in names or [] if n not in CANDIDATES]
+        if unknown:
+            raise CommandError(f"Unknown candidates: {', '.join(unknown)}")
+
+        active = PredictiveMaintenancePredictor()
+        report, models = train_zoo(
+            names, options['data'], cv=options['cv'], n_jobs=options['jobs'],
+            baseline=active.model, resampling=options['resampling'], ratio=options['ratio'], log=self.stdout.write,
+        )
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        self.stdout.write(f"Leaderboard written to {options['output']}")
+
+        if not options['promote']:
+            return
+        version = promote(report, models, activate=not options['candidate'])
+        if version is None:
+            raise CommandError('No candidate passed the promotion gates')
+        action = 'Registered' if options['candidate'] else 'Promoted'
+        self.stdout.write(self.style.SUCCESS(f"{action} {report['leaderboard'][0]['candidate']} as model {version}"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 16:43
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_dataset_model_version(apps, schema_editor):
+    # Existing predictions were made by the model their dataset records
+    Dataset = apps.get_model('datasets', 'Dataset')
+    Prediction = apps.get_model('predictions', 'Prediction')
+    Prediction.objects.update(
+        model_version=Subquery(Dataset.objects.filter(pk=OuterRef('dataset_id')).values('model_version')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0001_initial'),
+        ('datasets', '0004_dataset_content_hash_processed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(copy_dataset_model_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0007_datasetprocessing_lease'),
+        ('predictions', '0002_prediction_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowComparison',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=50)),
+                ('shadow_version', models.CharField(max_length=50)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('agreement', models.FloatField(null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('shadow_failures', models.PositiveIntegerField(default=0)),
+                ('mean_confidence_delta', models.FloatField(null=True)),
+                ('active_seconds', models.FloatField(null=True)),
+                ('shadow_seconds', models.FloatField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shadow_version', 'created_at'], name='predictions_shadow__d7403a_idx')],
+            },
+        ),
+    ]
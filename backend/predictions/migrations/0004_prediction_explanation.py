@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0003_shadowcomparison'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='explanation',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -7,9 +7,31 @@ class Prediction(models.Model):
     prediction = models.CharField(max_length=20)  # 'Normal'/'Failure'
     confidence = models.FloatField()
     features = models.JSONField()
+    model_version = models.CharField(max_length=50, blank=True, default='')
+    # Top [feature, contribution] pairs behind the confidence, see PredictiveMaintenancePredictor.explain
+    explanation = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['dataset', 'product_id']),
-        ]
\ No newline at end of file
+        ]
+
+class ShadowComparison(models.Model):
+    """How a shadow model's scores of a dataset compared with the stored predictions of the active model"""
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
+    model_version = models.CharField(max_length=50)  # active model, which made the stored predictions
+    shadow_version = models.CharField(max_length=50)
+    rows = models.PositiveIntegerField(default=0)
+    agreement = models.FloatField(null=True)  # share of rows with the same prediction
+    failures = models.PositiveIntegerField(default=0)  # rows the active model predicts to fail
+    shadow_failures = models.PositiveIntegerField(default=0)
+    mean_confidence_delta = models.FloatField(null=True)  # mean |shadow - active| failure probability
+    active_seconds = models.FloatField(null=True)  # predict stage of the run that stored the predictions
+    shadow_seconds = models.FloatField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shadow_version', 'created_at']),
+        ]
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from monitoring.serializers import TimedListSerializer, TimedSerializerMixin
 from .models import Prediction
 
-class PredictionSerializer(serializers.ModelSerializer):
+class PredictionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Prediction
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = TimedListSerializer
\ No newline at end of file
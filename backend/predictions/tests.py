@@ -0,0 +1,104 @@
+import csv
+import gzip
+import io
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import AccessToken
+
+from datasets.models import Dataset
+from users.models import GuestSession, User
+
+from .models import Prediction
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = GuestSession.objects.create()
+        self.user = User.objects.create_user(
+            email='ops@example.com', username='ops', first_name='Op', last_name='S', password='secret-pass',
+        )
+        self.guest_dataset = self.make_dataset(session=self.session)
+        self.user_dataset = self.make_dataset(user=self.user)
+        self.guest = {'HTTP_X_GUEST_SESSION': str(self.session.session_id)}
+        self.jwt = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def make_dataset(self, **owner):
+        dataset = Dataset.objects.create(file='data.csv', **owner)
+        Prediction.objects.bulk_create(
+            Prediction(dataset=dataset, product_id=f'L{i}', prediction='Normal', confidence=0.1 * i,
+                       features={'Torque [Nm]': 40 + i}, explanation=[['Torque [Nm]', 0.01]])
+            for i in range(3)
+        )
+        return dataset
+
+    def export(self, dataset, query='', **headers):
+        return self.client.get(f'/api/datasets/my/{dataset.pk}/predictions/export/{query}', **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_formats(self):
+        response = self.export(self.guest_dataset, **self.guest)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'dataset-{self.guest_dataset.pk}-predictions.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.body(response).decode())))
+        self.assertEqual([row['product_id'] for row in rows], ['L0', 'L1', 'L2'])
+        self.assertEqual(rows[2]['Torque [Nm]'], '42')
+
+        response = self.export(self.user_dataset, '?format=ndjson', **self.jwt)
+        records = [json.loads(line) for line in self.body(response).decode().splitlines()]
+        self.assertEqual([record['features'] for record in records], [{'Torque [Nm]': 40 + i} for i in range(3)])
+        self.assertEqual(records[0]['explanation'], [['Torque [Nm]', 0.01]])
+
+        response = self.export(self.user_dataset, '?format=json&compress=gzip', **self.jwt)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(self.body(response)))), 3)
+
+    def test_only_the_owner_can_export(self):
+        for response, code in [
+            (self.export(self.user_dataset, **self.guest), 404),
+            (self.export(self.guest_dataset, '?format=ndjson', **self.jwt), 404),
+            (self.export(self.guest_dataset), 401),
+        ]:
+            self.assertEqual((response.status_code, response['Content-Type']), (code, 'application/json'))
+            self.assertIn('error' if code == 404 else 'detail', response.json())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = GuestSession.objects.create()
+        self.dataset = Dataset.objects.create(file='data.csv', session=self.session, processed_at=timezone.now())
+        Prediction.objects.create(dataset=self.dataset, product_id='L1', prediction='Normal', confidence=0.1, features={})
+        self.headers = {'HTTP_X_GUEST_SESSION': str(self.session.session_id)}
+
+    def get(self, url, **headers):
+        return self.client.get(url, **self.headers, **headers)
+
+    def test_prediction_list(self):
+        response = self.get('/api/predictions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(self.dataset.processed_at.timestamp()))
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        self.assertEqual(self.get('/api/predictions/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get('/api/predictions/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get('/api/predictions/', HTTP_IF_MATCH='"stale"').status_code, 412)
+        self.assertEqual(self.get('/api/predictions/', HTTP_IF_MATCH=etag).status_code, 200)
+
+        # A new upload changes the list
+        Dataset.objects.create(file='more.csv', session=self.session, processed_at=timezone.now())
+        self.assertEqual(self.get('/api/predictions/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_dataset_detail_changes_when_processed(self):
+        url = f'/api/datasets/my/{self.dataset.pk}/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Dataset.objects.filter(pk=self.dataset.pk).update(processed_at=timezone.now(), model_version='v2')
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
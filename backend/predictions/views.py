@@ -1,13 +1,44 @@
-from rest_framework import generics
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.utils.decorators import method_decorator
+from authentication.authentication import TokenUserAuthentication
+from datasets.conditional import conditional, make_etag
+from datasets.permissions import owned_datasets
+from datasets.response_cache import cache_response
+from .export import CSVRenderer, NDJSONRenderer, gzip_stream, stream_csv, stream_json, stream_ndjson
 from .models import Prediction
 from .serializers import PredictionSerializer
 from permissions.permissions import IsAuthenticatedOrGuestSession
 from rest_framework.exceptions import PermissionDenied
 
 
+def prediction_list_validators(request, *args, **kwargs):
+    # Predictions only change while their dataset is processed or has rows appended, both of which set processed_at
+    datasets = owned_datasets(request)
+    dataset_id = request.GET.get('dataset')
+    if dataset_id:
+        if not dataset_id.isdigit():
+            return None
+        datasets = datasets.filter(pk=dataset_id)
+
+    states = list(datasets.order_by('pk').values_list('pk', 'processed_at', 'model_version'))
+    if not states or any(processed_at is None for _, processed_at, _ in states):
+        return None
+    last_modified = max(processed_at for _, processed_at, _ in states)
+    # Revalidated: the list also changes when datasets are uploaded or deleted
+    return make_etag(request, 'predictions', states), last_modified, False
+
+
+@method_decorator(cache_response('prediction-list'), name='get')
+@method_decorator(conditional(prediction_list_validators), name='get')
 class PredictionList(generics.ListAPIView):
     serializer_class = PredictionSerializer
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticatedOrGuestSession]
     
     def get_queryset(self):
@@ -18,7 +49,7 @@ class PredictionList(generics.ListAPIView):
         # Filter by dataset ownership
         if self.request.user.is_authenticated:
             # Authenticated user: filter by datasets they own
-            queryset = queryset.filter(dataset__user=self.request.user)
+            queryset = queryset.filter(dataset__user_id=self.request.user.pk)
         elif hasattr(self.request, 'guest_session'):
             # Guest session: filter by datasets associated with the session
             queryset = queryset.filter(dataset__session=self.request.guest_session)
@@ -35,6 +66,7 @@ class PredictionList(generics.ListAPIView):
 class PredictionDetail(generics.RetrieveAPIView):
     queryset = Prediction.objects.all()
     serializer_class = PredictionSerializer
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticatedOrGuestSession]
 
     def get_queryset(self):
@@ -42,10 +74,54 @@ class PredictionDetail(generics.RetrieveAPIView):
 
         # Filter by dataset ownership
         if self.request.user.is_authenticated:
-            queryset = queryset.filter(dataset__user=self.request.user)
+            queryset = queryset.filter(dataset__user_id=self.request.user.pk)
         elif hasattr(self.request, 'guest_session'):
             queryset = queryset.filter(dataset__session=self.request.guest_session)
         else:
             raise PermissionDenied("You are not authorized to view this prediction.")
 
-        return queryset
\ No newline at end of file
+        return queryset
+
+class PredictionResultsExport(APIView):
+    """
+    Stream the predictions of a dataset, joined with their input features,
+    from ``/api/datasets/my/<pk>/predictions/export/``.
+
+    ``?format=csv`` (default), ``ndjson`` or ``json``; add ``?compress=gzip``
+    for a gzipped download.
+    """
+    authentication_classes = [TokenUserAuthentication]
+    permission_classes = [IsAuthenticatedOrGuestSession]
+    renderer_classes = [CSVRenderer, NDJSONRenderer, JSONRenderer]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Errors are JSON whichever format the export was asked for in
+        if isinstance(response, Response) and response.status_code >= 400:
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get(self, request, pk):
+        if not owned_datasets(request).filter(pk=pk).exists():
+            return Response({"error": "Dataset not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        queryset = Prediction.objects.filter(dataset_id=pk).order_by('id')
+        batch_size = settings.PREDICTION_EXPORT_BATCH_SIZE
+        if request.accepted_renderer.format == 'ndjson':
+            chunks = stream_ndjson(queryset, batch_size)
+            content_type, extension = NDJSONRenderer.media_type, 'ndjson'
+        elif request.accepted_renderer.format == 'json':
+            chunks = stream_json(queryset, batch_size)
+            content_type, extension = 'application/json', 'json'
+        else:
+            chunks = stream_csv(queryset, batch_size)
+            content_type, extension = CSVRenderer.media_type, 'csv'
+
+        filename = f'dataset-{pk}-predictions.{extension}'
+        if request.query_params.get('compress') == 'gzip':
+            chunks = gzip_stream(chunks)
+            content_type, filename = 'application/gzip', filename + '.gz'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
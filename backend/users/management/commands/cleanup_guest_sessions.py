@@ -1,14 +1,20 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from users.models import GuestSession
+from datasets.cleanup import cleanup_expired_guest_data
 
 
 class Command(BaseCommand):
 
     help = 'Deletes expired guest sessions and their data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, help='Seconds to sleep between batches')
+        parser.add_argument('--max-seconds', type=float, help='Stop after this long, 0 for no limit')
+
     def handle(self, *args, **options):
-        expired_sessions = GuestSession.objects.filter(expires_at__lte=timezone.now())
-        count = expired_sessions.count()
-        expired_sessions.delete() # Triggers the pre_delete signal
-        self.stdout.write(f'Deleted {count} expired sessions')
\ No newline at end of file
+        report = cleanup_expired_guest_data(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_seconds=options['max_seconds'],
+        )
+        self.stdout.write(str(report))
@@ -1,19 +1,33 @@
-from django.utils import timezone
-from .models import GuestSession
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .session_cache import aget_guest_session, get_guest_session
 
 
 class GuestSessionMiddleware:
+    # Runs natively under both WSGI and ASGI, so async views do not go through a thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        session_id = request.headers.get('X-Guest-Session')
+        if session_id:
+            guest_session = get_guest_session(session_id)
+            if guest_session is not None:
+                request.guest_session = guest_session
+        return self.get_response(request)
+
+    async def __acall__(self, request):
         session_id = request.headers.get('X-Guest-Session')
         if session_id:
-            try:
-                request.guest_session = GuestSession.objects.get(
-                    session_id=session_id,
-                    expires_at__gt=timezone.now()
-                )
-            except GuestSession.DoesNotExist:
-                pass
-        return self.get_response(request)
\ No newline at end of file
+            guest_session = await aget_guest_session(session_id)
+            if guest_session is not None:
+                request.guest_session = guest_session
+        return await self.get_response(request)
@@ -0,0 +1,94 @@
+"""
+Guest session lookups for GuestSessionMiddleware without a query per request.
+
+Sessions are kept in a per-process LRU, backed by the Django cache. Entries
+live for at most ``GUEST_SESSION_LOCAL_TTL`` seconds locally and
+``GUEST_SESSION_CACHE_TTL`` in the shared cache, and never past the
+session's ``expires_at``. ``invalidate_guest_sessions`` drops them from both,
+so terminated sessions stop resolving at once in this process and after
+``GUEST_SESSION_LOCAL_TTL`` at most in the others.
+"""
+import threading
+import time
+import uuid
+
+from cachetools import TLRUCache
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import GuestSession
+
+
+def _expiry(key, session, now):
+    return min(now + settings.GUEST_SESSION_LOCAL_TTL, session.expires_at.timestamp())
+
+
+_local = TLRUCache(maxsize=settings.GUEST_SESSION_CACHE_SIZE, ttu=_expiry, timer=time.time)
+_lock = threading.Lock()
+
+
+def _cache_key(session_id):
+    return f'guest-session:{session_id}'
+
+
+def get_guest_session(session_id):
+    """The unexpired GuestSession with this id, or None"""
+    try:
+        session_id = str(uuid.UUID(str(session_id)))
+    except ValueError:
+        return None
+
+    with _lock:
+        session = _local.get(session_id)
+    if session is None:
+        session = cache.get(_cache_key(session_id))
+        if session is None:
+            session = GuestSession.objects.filter(session_id=session_id).first()
+            if session is None:
+                return None
+            timeout = min(settings.GUEST_SESSION_CACHE_TTL, session.expires_at.timestamp() - time.time())
+            if timeout > 0:
+                cache.set(_cache_key(session_id), session, timeout)
+        if session.is_valid:
+            with _lock:
+                _local[session_id] = session
+
+    return session if session.is_valid else None
+
+
+async def aget_guest_session(session_id):
+    """``get_guest_session`` for async code"""
+    try:
+        session_id = str(uuid.UUID(str(session_id)))
+    except ValueError:
+        return None
+
+    with _lock:
+        session = _local.get(session_id)
+    if session is None:
+        session = await cache.aget(_cache_key(session_id))
+        if session is None:
+            session = await GuestSession.objects.filter(session_id=session_id).afirst()
+            if session is None:
+                return None
+            timeout = min(settings.GUEST_SESSION_CACHE_TTL, session.expires_at.timestamp() - time.time())
+            if timeout > 0:
+                await cache.aset(_cache_key(session_id), session, timeout)
+        if session.is_valid:
+            with _lock:
+                _local[session_id] = session
+
+    return session if session.is_valid else None
+
+
+def invalidate_guest_sessions(session_ids):
+    session_ids = [str(session_id) for session_id in session_ids]
+    with _lock:
+        for session_id in session_ids:
+            _local.pop(session_id, None)
+    cache.delete_many([_cache_key(session_id) for session_id in session_ids])
+
+
+def clear_local_cache():
+    with _lock:
+        _local.clear()
@@ -1,11 +1,8 @@
 # users/tasks.py
 from celery import shared_task
-from django.utils import timezone
-from .models import GuestSession
+from datasets.cleanup import cleanup_expired_guest_data
 
 @shared_task
 def cleanup_expired_sessions():
-    expired = GuestSession.objects.filter(expires_at__lte=timezone.now())
-    count = expired.count()
-    expired.delete()
-    return f"Deleted {count} expired sessions"
\ No newline at end of file
+    report = cleanup_expired_guest_data()
+    return str(report)
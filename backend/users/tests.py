@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from .middleware import GuestSessionMiddleware
+from .models import GuestSession
+from .session_cache import clear_local_cache
+from .tasks import cleanup_expired_sessions
+
+
+class GuestSessionMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        self.session = GuestSession.objects.create()
+        self.middleware = GuestSessionMiddleware(lambda request: HttpResponse())
+
+    def resolve(self, session_id):
+        request = RequestFactory().get('/', HTTP_X_GUEST_SESSION=str(session_id))
+        self.middleware(request)
+        return getattr(request, 'guest_session', None)
+
+    def test_warm_session_needs_no_queries(self):
+        self.assertEqual(self.resolve(self.session.session_id), self.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve(self.session.session_id), self.session)
+
+    def test_shared_cache_serves_other_processes(self):
+        self.resolve(self.session.session_id)
+        clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve(self.session.session_id), self.session)
+
+    def test_terminate_invalidates_session(self):
+        self.resolve(self.session.session_id)
+        response = self.client.post(f'/api/users/guest-sessions/{self.session.session_id}/terminate/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.resolve(self.session.session_id))
+
+    def test_cleanup_invalidates_expired_sessions(self):
+        self.resolve(self.session.session_id)
+        GuestSession.objects.filter(pk=self.session.pk).update(expires_at=timezone.now())
+        cleanup_expired_sessions()
+        self.assertFalse(GuestSession.objects.exists())
+        self.assertIsNone(self.resolve(self.session.session_id))
+
+    def test_invalid_and_unknown_ids(self):
+        self.assertIsNone(self.resolve('not-a-uuid'))
+        self.assertIsNone(self.resolve('00000000-0000-0000-0000-000000000000'))
@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from .serializers import UserSerializer, GuestSessionSerializer
 from .models import User, GuestSession
+from datasets.cleanup import delete_guest_sessions
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
@@ -37,7 +38,7 @@ class GuestSessionTerminateView(APIView):
     def post(self, request, session_id):
         try:
             session = GuestSession.objects.get(session_id=session_id)
-            session.delete()
+            delete_guest_sessions(GuestSession.objects.filter(pk=session.pk), pause=0)
             return Response({'status': 'Session and all related data deleted'})
         except GuestSession.DoesNotExist:
             return Response({'status': 'Invalid session'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
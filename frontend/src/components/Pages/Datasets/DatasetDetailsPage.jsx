@@ -51,7 +51,10 @@ const DatasetDetailsPage = () => {
         setIsLoading(true);
         
         // Fetch dataset details
-        const datasetData = await datasetService.getDatasetById(id);
+        const datasetDetails = await datasetService.getDatasetById(id);
+        // The detail endpoint only returns metadata, rows are fetched page by page
+        const rowsData = await datasetService.getDatasetRows(id, { limit: 100 });
+        const datasetData = { ...datasetDetails, csv_data: rowsData.rows, row_count: rowsData.count };
         setDataset(datasetData);
         
         // Fetch predictions for this dataset
@@ -638,7 +641,7 @@ const DatasetDetailsPage = () => {
         </div>
         <div className="info-card">
           <h3>Data Points</h3>
-          <p>{dataset.csv_data ? dataset.csv_data.length : 0}{!fullDataLoaded && '+'}</p>
+          <p>{dataset.row_count || 0}</p>
         </div>
         <div className="info-card">
           <h3>Total Predictions</h3>
@@ -859,7 +862,7 @@ const DatasetDetailsPage = () => {
             </table>
             {dataset.csv_data.length > 10 && (
               <div className="table-note">
-                Showing 10 of {dataset.csv_data.length} rows
+                Showing 10 of {dataset.row_count} rows
               </div>
             )}
           </div>
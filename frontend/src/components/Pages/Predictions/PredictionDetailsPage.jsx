@@ -363,7 +363,7 @@ const PredictionDetailsPage = () => {
       >
         <button 
           className="secondary-btn"
-          onClick={() => predictionService.getPredictionResults(prediction.id, 'csv')}
+          onClick={() => predictionService.getPredictionResults(prediction.dataset, 'csv')}
         >
           Export as CSV
         </button>
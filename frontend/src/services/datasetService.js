@@ -35,6 +35,25 @@ const getDatasetById = async (id) => {
   return response.data;
 };
 
+// Get a page of dataset rows ({ offset, limit, columns, sort })
+const getDatasetRows = async (id, params = {}) => {
+  const response = await axios.get(`${DATASETS_API}/my/${id}/rows/`, {
+    ...getAuthHeader(),
+    params
+  });
+  return response.data;
+};
+
+// Filter, sort and aggregate dataset rows on the server
+// e.g. { torque__gte: 40, type: 'L', sort: '-tool_wear', group_by: 'type', agg: 'count,mean:torque' }
+const queryDataset = async (id, params = {}) => {
+  const response = await axios.get(`${DATASETS_API}/my/${id}/query/`, {
+    ...getAuthHeader(),
+    params
+  });
+  return response.data;
+};
+
 // Upload a new dataset
 const uploadDataset = async (formData, onUploadProgress) => {
   const config = {
@@ -132,6 +151,8 @@ const removeSharedUser = async (datasetId, userId) => {
 const datasetService = {
   getAllDatasets,
   getDatasetById,
+  getDatasetRows,
+  queryDataset,
   uploadDataset,
   downloadDataset,
   deleteDataset,
@@ -62,10 +62,10 @@ const deletePrediction = async (id) => {
   return response.data;
 };
 
-// Get prediction results in various formats
-const getPredictionResults = async (id, format = 'json') => {
+// Get the predictions of a dataset in various formats
+const getPredictionResults = async (datasetId, format = 'json') => {
   const response = await axios.get(
-    `${PREDICTIONS_API}/${id}/results/?format=${format}`,
+    `${API_URL}/datasets/my/${datasetId}/predictions/export/?format=${format}`,
     format === 'csv' 
       ? { ...getAuthHeader(), responseType: 'blob' }
       : getAuthHeader()
@@ -76,7 +76,7 @@ const getPredictionResults = async (id, format = 'json') => {
     const url = window.URL.createObjectURL(new Blob([response.data]));
     const link = document.createElement('a');
     link.href = url;
-    link.setAttribute('download', `prediction-${id}.csv`);
+    link.setAttribute('download', `dataset-${datasetId}-predictions.csv`);
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);